@@ -13,10 +13,12 @@ from __future__ import absolute_import
 
 from gauge.__about__ import __version__  # noqa
 from gauge.constants import CLAMP, ERROR, inf, OK, ONCE
-from gauge.core import Gauge, Momentum
+from gauge.core import (
+    batch, Gauge, Momentum, try_consume_many, warm_pickling)
 
 
-__all__ = ['Gauge', 'Momentum', 'ERROR', 'OK', 'ONCE', 'CLAMP', 'inf']
+__all__ = ['Gauge', 'Momentum', 'batch', 'try_consume_many', 'warm_pickling',
+           'ERROR', 'OK', 'ONCE', 'CLAMP', 'inf']
 
 
 try:
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+   gauge.array
+   ~~~~~~~~~~~
+
+   Struct-of-arrays container for many gauges with constant limits.  It
+   requires NumPy.
+
+   :copyright: (c) 2013-2017 by What! Studio
+   :license: BSD, see LICENSE for more details.
+
+"""
+from __future__ import absolute_import
+
+from time import time as now
+
+import numpy
+
+from gauge.constants import CLAMP, ERROR, inf, OK, ONCE
+from gauge.core import Gauge
+
+
+__all__ = ['GaugeArray']
+
+
+def now_or(at=None):
+    return now() if at is None else float(at)
+
+
+def advance(values, pos, neg, max_, min_, dt):
+    """Moves the values by the sums of positive and negative velocities for
+    the given durations in the same way as :class:`Determination`.
+
+    :returns: ``(values, reached)`` where `reached` is whether each value
+              is in the range at the end.
+    """
+    total = pos + neg
+    above, below = values > max_, values < min_
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        # an out-of-range value is moved only by the velocities toward the
+        # range until it reaches the range.
+        reach_max = numpy.where(neg < 0, (max_ - values) / neg, inf)
+        reach_min = numpy.where(pos > 0, (min_ - values) / pos, inf)
+        reach = numpy.where(above, reach_max,
+                            numpy.where(below, reach_min, 0.))
+    outside = values + numpy.where(above, neg, pos) * dt
+    reached = dt >= reach
+    start = numpy.where(above, max_, numpy.where(below, min_, values))
+    rest = numpy.where(reached, dt - reach, 0.)
+    inside = start + total * rest
+    inside = numpy.where(inside > max_, max_,
+                         numpy.where(inside < min_, min_, inside))
+    return numpy.where(reached, inside, outside), reached
+
+
+class GaugeArray(object):
+    """Many gauges with constant limits in packed NumPy arrays.  Each row
+    behaves like a :class:`Gauge` whose maximum and minimum are numbers.
+
+    :param values: the values of the rows at the base time.
+    :param max: the maximum of the rows.  (a number or an array)
+    :param min: the minimum of the rows.  (default: 0)
+    :param at: the base time.  (default: now)
+
+    """
+
+    def __init__(self, values, max, min=0, at=None):
+        self.base_values = numpy.array(values, dtype=float, ndmin=1)
+        size = len(self.base_values)
+        self.base_times = numpy.full(size, now_or(at))
+        self.max_values = numpy.array(numpy.broadcast_to(max, size), float)
+        self.min_values = numpy.array(numpy.broadcast_to(min, size), float)
+        # packed momenta.
+        self.momentum_rows = numpy.empty(0, dtype=numpy.intp)
+        self.momentum_velocities = numpy.empty(0)
+        self.momentum_sinces = numpy.empty(0)
+        self.momentum_untils = numpy.empty(0)
+        self._events = None
+
+    @classmethod
+    def from_gauges(cls, gauges):
+        """Packs the given gauges.
+
+        :raises TypeError: a gauge is a hyper-gauge.
+        """
+        gauges = list(gauges)
+        for gauge in gauges:
+            if gauge.max_gauge is not None or gauge.min_gauge is not None:
+                raise TypeError('GaugeArray cannot pack a hyper-gauge')
+        array = cls([g.base[1] for g in gauges],
+                    [g.max_value for g in gauges],
+                    [g.min_value for g in gauges])
+        array.base_times = numpy.array([g.base[0] for g in gauges], float)
+        rows = [row for row, g in enumerate(gauges) for m in g.momenta]
+        momenta = [tuple(m)[:3] for g in gauges for m in g.momenta]
+        if momenta:
+            velocities, sinces, untils = zip(*momenta)
+            array.add_momentum(velocities, sinces, untils, rows=rows)
+        return array
+
+    def __len__(self):
+        return len(self.base_values)
+
+    def _rows(self, rows):
+        if rows is None:
+            return numpy.arange(len(self))
+        rows = numpy.asarray(rows)
+        if rows.dtype == bool:
+            return numpy.flatnonzero(rows)
+        return rows.astype(numpy.intp, copy=False)
+
+    def gauge(self, row):
+        """Makes a :class:`Gauge` which is same with the row."""
+        g = Gauge(self.base_values[row], self.max_values[row],
+                  self.min_values[row], at=self.base_times[row])
+        momenta = self.momentum_rows == row
+        for velocity, since, until in zip(self.momentum_velocities[momenta],
+                                          self.momentum_sinces[momenta],
+                                          self.momentum_untils[momenta]):
+            g.add_momentum(velocity, since, until)
+        return g
+
+    def add_momentum(self, velocity, since=None, until=None, rows=None):
+        """Adds a momentum to each of the rows.
+
+        :param velocity: the velocity.  (a number or an array)
+        :param since: the time to start to affect.  (default: ``-inf``)
+        :param until: the time to finish to affect.  (default: ``+inf``)
+        :param rows: indices or a boolean mask of the rows.  (default: all)
+
+        :raises ValueError: `since` later than or same with `until`.
+        """
+        rows = self._rows(rows)
+        size = len(rows)
+        since = -inf if since is None else since
+        until = +inf if until is None else until
+        velocities = numpy.array(numpy.broadcast_to(velocity, size), float)
+        sinces = numpy.array(numpy.broadcast_to(since, size), float)
+        untils = numpy.array(numpy.broadcast_to(until, size), float)
+        if not ((sinces == -inf) | (untils == +inf) | (sinces < untils)).all():
+            raise ValueError("'since' should be earlier than 'until'")
+        self.momentum_rows = numpy.concatenate([self.momentum_rows, rows])
+        self.momentum_velocities = \
+            numpy.concatenate([self.momentum_velocities, velocities])
+        self.momentum_sinces = \
+            numpy.concatenate([self.momentum_sinces, sinces])
+        self.momentum_untils = \
+            numpy.concatenate([self.momentum_untils, untils])
+        self._events = None
+
+    def _event_matrix(self):
+        """Sorts the momentum events of each row into a matrix.  An event
+        changes the sum of positive or negative velocities.
+        """
+        if self._events is not None:
+            return self._events
+        size = len(self)
+        rows = numpy.concatenate([self.momentum_rows, self.momentum_rows])
+        times = numpy.concatenate([self.momentum_sinces, self.momentum_untils])
+        velocities = numpy.concatenate([self.momentum_velocities,
+                                        -self.momentum_velocities])
+        positive = numpy.concatenate([self.momentum_velocities > 0] * 2)
+        order = numpy.lexsort((times, rows))
+        rows, times = rows[order], times[order]
+        velocities, positive = velocities[order], positive[order]
+        counts = numpy.bincount(rows, minlength=size)
+        width = counts.max() if len(rows) else 0
+        columns = numpy.arange(len(rows)) - \
+            numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        matrix_times = numpy.full((size, width), inf)
+        matrix_pos = numpy.zeros((size, width))
+        matrix_neg = numpy.zeros((size, width))
+        matrix_times[rows, columns] = times
+        matrix_pos[rows, columns] = numpy.where(positive, velocities, 0.)
+        matrix_neg[rows, columns] = numpy.where(positive, 0., velocities)
+        self._events = (matrix_times, matrix_pos, matrix_neg)
+        return self._events
+
+    def _predict(self, at):
+        """Predicts the values, velocities and whether in the range at the
+        given time for all rows.
+        """
+        times, pos_deltas, neg_deltas = self._event_matrix()
+        values = self.base_values.copy()
+        max_, min_ = self.max_values, self.min_values
+        pos = numpy.zeros(len(self))
+        neg = numpy.zeros(len(self))
+        since = self.base_times.copy()
+        in_range = (min_ <= values) & (values <= max_)
+        for x in range(times.shape[1]):
+            until = numpy.maximum(since, numpy.minimum(times[:, x], at))
+            values, reached = advance(values, pos, neg, max_, min_,
+                                      until - since)
+            in_range |= reached
+            effective = times[:, x] <= at
+            pos += numpy.where(effective, pos_deltas[:, x], 0.)
+            neg += numpy.where(effective, neg_deltas[:, x], 0.)
+            since = until
+        until = numpy.maximum(since, at)
+        values, reached = advance(values, pos, neg, max_, min_, until - since)
+        in_range |= reached
+        total = pos + neg
+        velocities = numpy.where(values > max_, neg,
+                                 numpy.where(values < min_, pos, total))
+        # stop at the limits.
+        stopped = (values >= max_) & (velocities > 0)
+        stopped |= (values <= min_) & (velocities < 0)
+        velocities[stopped] = 0.
+        future = self.base_times <= at
+        return values, numpy.where(future, velocities, 0.), in_range & future
+
+    def get(self, at=None):
+        """Predicts the values of all rows."""
+        values, velocities, in_range = self._predict(now_or(at))
+        return values
+
+    def velocity(self, at=None):
+        """Predicts the velocities of all rows."""
+        values, velocities, in_range = self._predict(now_or(at))
+        return velocities
+
+    def in_range(self, at=None):
+        """Whether each row is between the range at the given time."""
+        values, velocities, in_range = self._predict(now_or(at))
+        return in_range
+
+    def incr(self, delta, outbound=ERROR, at=None, rows=None):
+        """Increases the values of the rows by the given deltas immediately.
+        The rows are rebased at the time.
+
+        :param delta: the value to increase.  (a number or an array)
+        :param outbound: the strategy to control modification to out of the
+                         range.  (default: ERROR)
+        :param at: the time to increase.  (default: now)
+        :param rows: indices or a boolean mask of the rows.  (default: all)
+
+        :returns: the new values of the rows.
+
+        :raises ValueError: a value is out of the range.  No row is changed.
+        """
+        at = now_or(at)
+        rows = self._rows(rows)
+        values, velocities, in_range = self._predict(at)
+        prev_values = values[rows]
+        delta = numpy.array(numpy.broadcast_to(delta, len(rows)), float)
+        new_values = prev_values + delta
+        max_, min_ = self.max_values[rows], self.min_values[rows]
+        over = (delta > 0) & (new_values > max_)
+        under = (delta < 0) & (new_values < min_)
+        if outbound == ONCE:
+            error = ~in_range[rows]
+        else:
+            error = numpy.full(len(rows), outbound == ERROR)
+        if outbound != OK:
+            if (error & over).any():
+                raise ValueError('the value to set is bigger than the maximum')
+            if (error & under).any():
+                raise ValueError('the value to set is smaller than the '
+                                 'minimum')
+        if outbound == CLAMP:
+            new_values = numpy.where(over, numpy.maximum(prev_values, max_),
+                                     new_values)
+            new_values = numpy.where(under, numpy.minimum(prev_values, min_),
+                                     new_values)
+        self._rebase(rows, new_values, at)
+        return new_values
+
+    def decr(self, delta, outbound=ERROR, at=None, rows=None):
+        """Decreases the values of the rows by the given deltas immediately.
+        See :meth:`incr`.
+        """
+        return self.incr(-numpy.asarray(delta, float), outbound, at, rows)
+
+    def set(self, value, outbound=ERROR, at=None, rows=None):
+        """Sets the values of the rows immediately.  See :meth:`incr`."""
+        at = now_or(at)
+        delta = value - self.get(at)[self._rows(rows)]
+        return self.incr(delta, outbound, at, rows)
+
+    def _rebase(self, rows, values, at):
+        """Sets the base of the rows and forgets the momenta which don't affect
+        anymore.
+        """
+        self.base_times[rows] = at
+        self.base_values[rows] = values
+        rebased = numpy.zeros(len(self), dtype=bool)
+        rebased[rows] = True
+        keep = ~(rebased[self.momentum_rows] & (self.momentum_untils < at))
+        if not keep.all():
+            self.momentum_rows = self.momentum_rows[keep]
+            self.momentum_velocities = self.momentum_velocities[keep]
+            self.momentum_sinces = self.momentum_sinces[keep]
+            self.momentum_untils = self.momentum_untils[keep]
+            self._events = None
+
+    def __repr__(self):
+        return '<{0} of {1} gauges>'.format(type(self).__name__, len(self))
@@ -4,6 +4,34 @@ from __future__ import absolute_import
 from gauge.deterministic cimport Determination
 
 
+ctypedef struct Rebase:
+    # the end of the points of the determination until the rebase.
+    Py_ssize_t end
+    double value
+    double at
+
+
+cdef class RebaseLog:
+
+    cdef:
+        #: The points of the determinations of the limit gauge until each
+        #: rebase.
+        double* _times
+        double* _values
+        Py_ssize_t _length
+        Py_ssize_t _capacity
+        #: The rebases in order.
+        Rebase* _rebases
+        Py_ssize_t _num_rebases
+        Py_ssize_t _rebases_capacity
+        #: The next chunk of the log.  ``None`` if this is the last one.
+        RebaseLog _next
+
+    cdef void _append(self, Determination determination, double until,
+                      double value, double at) except *
+    cdef list _since(self, Py_ssize_t x)
+
+
 cdef class Gauge:
 
     cdef:
@@ -23,17 +51,112 @@ cdef class Gauge:
         public momenta
         #: The cached determination.
         public Determination _determination
+        #: The earliest time from which the cached determination is stale.
+        double _invalidated_since
+        #: Increased whenever the cached determination is invalidated.
+        long _version
+        #: The versions of the limit gauges which the cached determination
+        #: has been determined with.  A negative version pins the cached
+        #: determination.
+        long _max_version
+        long _min_version
+        #: The number of the changes.  See :attr:`Gauge.changes`.
+        long _changes
+        #: Whether the limited gauges apply the rebases of this gauge lazily.
+        public bint lazy_rebase
 
     # internal attributes:
     cdef:
-        _events
+        #: The sorted momentum events between the sentinels.  See
+        #: :meth:`momentum_events`.
+        list _events
+        #: Whether a determination shares the momentum events.
+        bint _events_shared
+        #: Whether the limits have been changed since the cached
+        #: determination.  A rebase doesn't resume the determination then.
+        bint _limits_reset
         _limited_gauges
+        #: A weak set of the schedulers which watch this gauge.  ``None`` if
+        #: not watched.  See :mod:`gauge.scheduler`.
+        _watchers
+        #: The lock which makes :meth:`try_consume` atomic.  ``None`` until
+        #: the gauge is consumed first.
+        _consume_lock
         __weakref__
+        #: Whether a rebase by a limit gauge is deferred by a batch.
+        bint _rebase_pending
+        #: The time and value of the deferred rebase.
+        double _pending_at
+        double _pending_value
+        #: The last chunk of the rebases which the lazy limited gauges apply
+        #: later.
+        RebaseLog _rebase_log
+        #: The latest base time which a follower of the log may have when it
+        #: applies the next rebase.
+        double _lazy_horizon
+        #: The limited gauges which follow the log and the others which are
+        #: rebased right away.  ``None`` if they should be sorted again.
+        _followers
+        _eager_gauges
+        #: The limit gauge whose rebase log this gauge follows, the chunk of
+        #: the log and the position of the next rebase to apply in the chunk.
+        Gauge _lazy_source
+        RebaseLog _lazy_log
+        Py_ssize_t _lazy_position
 
-    cdef (double, double) _predict(self, double at)
-    cdef double _clamp(self, double value, double at)
+    cdef Determination _determine(self)
+    cdef bint _limits_changed(self) except -1
+    cdef (bint, double) _linear_velocity(self)
+    cdef (double, double) _linear_goal(self, double velocity)
+    cdef (double, double) _predict(self, double at) except *
+    cdef (double, bint) _observe(self, double at) except *
+    cdef (double, double) _predict_segment(self, Determination determination,
+                                           Py_ssize_t x, double at) except *
+    cdef double _get_max(self, double at) except *
+    cdef double _get_min(self, double at) except *
+    cdef double _clamp(self, double value, double at) except *
+    cdef tuple _try_consume(self, double amount, double at)
+    cdef double _incr(self, double delta, int outbound, double at,
+                      bint absolute) except *
+    cdef double _forget_past(self, double value, double at) except *
+    cdef void _settle(self) except *
+    cdef void _apply_rebases(self, Gauge limit_gauge,
+                             list rebases) except *
+    cdef void _sort_limited_gauges(self) except *
+    cdef void _rebase_lazily(self, double value, double at) except *
+    cdef void _settle_followers(self) except *
+    cdef void _settle_pending_rebase(self) except *
+    cdef void _reset_base(self, double value, double at,
+                          remove_momenta_before) except *
 
+    cdef void _load_momenta(self, list momenta) except *
     cpdef list momentum_events(self)
+    cdef list _writable_events(self)
+
+
+cdef class Batch:
+
+    cdef:
+        #: The gauges which have deferred rebases.
+        list _rebased
+        #: The limit gauges whose followers apply the logged rebases when
+        #: the batch finishes.
+        set _logged
+
+
+cdef class Reader:
+
+    cdef:
+        #: The gauge to observe.
+        readonly Gauge gauge
+        #: The determination which the cursor points.
+        Determination _determination
+        #: The number of the points not later than the last time.
+        Py_ssize_t _index
+        #: The last time observed.
+        double _at
+
+    cdef (double, double) _predict(self, double at) except *
 
 
 cdef class Momentum:
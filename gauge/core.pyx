@@ -1,18 +1,28 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
-from bisect import bisect_right
+from bisect import bisect_left, insort
 from collections import namedtuple
+from contextlib import contextmanager
 import gc
 import operator
+from struct import pack, Struct, unpack_from
+from threading import local, Lock
 from time import time as now
 try:
     from weakref import WeakSet
 except ImportError:
     from weakrefset import WeakSet
+from zlib import crc32
 
-from six.moves import zip
-from sortedcontainers import SortedList, SortedListWithKey
+from cpython.mem cimport PyMem_Free, PyMem_Malloc, PyMem_Realloc
+from libc.math cimport floor, isnan, NAN
+from libc.string cimport memcpy
+from sortedcontainers import SortedListWithKey
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from gauge.__about__ import __version__  # noqa
 from gauge.constants cimport (
@@ -21,15 +31,149 @@ from gauge.constants cimport (
 from gauge.deterministic cimport Determination, SEGMENT_VALUE, SEGMENT_VELOCITY
 
 
-__all__ = ['Gauge', 'Momentum']
+__all__ = ['Gauge', 'Momentum', 'batch', 'try_consume_many', 'warm_pickling']
 
 
 # indices:
 DEF TIME = 0
 DEF VALUE = 1
 
+# binary format:
+DEF FORMAT_VERSION = 1
+DEF FL_MAX_GAUGE = 1
+DEF FL_MIN_GAUGE = 2
+DEF FL_COMPACT_TIMES = 4
+DEF FL_REFERRED_LIMITS = 8
+DEF FL_SHARED_MAX_GAUGE = 16
+DEF FL_SHARED_MIN_GAUGE = 32
+DEF COMPACT_MIN = -2147483647
+DEF COMPACT_MAX = 2147483646
+DEF COMPACT_NEG_INF = -2147483648
+DEF COMPACT_POS_INF = 2147483647
+
+# rebase log:
+DEF LOG_CHUNK_LENGTH = 64
+
 
 cdef by_until = operator.itemgetter(2)
+#: The header of the binary format: magic, version, flags, the number of
+#: momenta, base time, base value, max value and min value.  See
+#: :meth:`Gauge.to_bytes`.
+cdef object HEADER = Struct('<2sBBIdddd')
+cdef object LENGTH = Struct('<I')
+#: The mutating methods which :meth:`Gauge.apply` calls with `at`.
+cdef frozenset TIMED_OPERATIONS = frozenset([
+    'incr', 'decr', 'set', 'clamp', 'set_max', 'set_min', 'set_range',
+    'clear_momenta', 'forget_past'])
+#: The mutating methods which :meth:`Gauge.apply` calls without `at`.
+cdef frozenset MOMENTUM_OPERATIONS = frozenset([
+    'add_momentum', 'remove_momentum'])
+
+
+class ThreadState(local):
+    """The contexts which are active in the current thread."""
+
+    #: The active batch.  See :func:`batch`.
+    batch = None
+    #: The depth of :func:`warm_pickling` contexts.
+    warm_pickling = 0
+
+
+cdef object STATE = ThreadState()
+
+
+cdef inline Batch BATCH():
+    """The batch which is active in the current thread."""
+    return STATE.batch
+
+
+cdef inline tuple DETERMINATION_ARRAYS(Determination determination):
+    """Copies the times and values of a determination into NumPy arrays."""
+    cdef Py_ssize_t length = determination._length
+    if numpy is None:
+        raise ImportError('NumPy is required')
+    if not length:
+        return numpy.empty(0), numpy.empty(0)
+    return (numpy.array(<double[:length]>determination._times),
+            numpy.array(<double[:length]>determination._values))
+
+
+cdef inline void REMOVE_EVENTS(list events, Momentum momentum) except *:
+    """Removes the events of a momentum from sorted momentum events."""
+    cdef tuple event = (momentum.since, EV_ADD, momentum)
+    del events[bisect_left(events, event, 1, len(events) - 1)]
+    if momentum.until != +INF:
+        event = (momentum.until, EV_REMOVE, momentum)
+        del events[bisect_left(events, event, 1, len(events) - 1)]
+
+
+cdef inline Py_ssize_t BISECT(double* array, Py_ssize_t lo, Py_ssize_t hi,
+                              double value, bint right):
+    """Finds the insertion point in a sorted array like :func:`bisect_left` or
+    :func:`bisect_right`.
+    """
+    cdef Py_ssize_t mid
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if array[mid] < value or (right and array[mid] == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+cdef inline Py_ssize_t NEXT_UNRESOLVED(Py_ssize_t* skip, Py_ssize_t x):
+    """Finds the first unresolved goal from the given index.  `skip` links
+    each resolved goal to a later one.
+    """
+    while skip[x] != x:
+        skip[x] = skip[skip[x]]
+        x = skip[x]
+    return x
+
+
+cdef inline Py_ssize_t RESOLVE_STRETCH(
+        double* times, double* values, Py_ssize_t start, Py_ssize_t stop,
+        bint increasing, double* goals, Py_ssize_t* skip,
+        Py_ssize_t num_goals, double* found):
+    """Finds when the sorted goals are reached first in a monotonic stretch of
+    points.  Each time is found by binary search in the stretch.
+
+    :returns: the number of the resolved goals.
+    """
+    cdef:
+        double goal
+        double ratio
+        Py_ssize_t lo
+        Py_ssize_t hi
+        Py_ssize_t mid
+        Py_ssize_t x
+        Py_ssize_t count = 0
+    # the goals in (value1, value2] or [value2, value1).
+    if increasing:
+        x = BISECT(goals, 0, num_goals, values[start], True)
+        hi = BISECT(goals, x, num_goals, values[stop], True)
+    else:
+        x = BISECT(goals, 0, num_goals, values[stop], False)
+        hi = BISECT(goals, x, num_goals, values[start], False)
+    x = NEXT_UNRESOLVED(skip, x)
+    while x < hi:
+        goal = goals[x]
+        # the first point which reaches the goal.
+        lo, mid = start + 1, stop
+        while lo < mid:
+            if (values[(lo + mid) // 2] >= goal if increasing else
+                    values[(lo + mid) // 2] <= goal):
+                mid = (lo + mid) // 2
+            else:
+                lo = (lo + mid) // 2 + 1
+        # the same as :meth:`Gauge.whenever`.
+        ratio = (goal - values[lo - 1]) / (values[lo] - values[lo - 1])
+        found[x] = times[lo - 1] + (times[lo] - times[lo - 1]) * ratio
+        skip[x] = x + 1
+        count += 1
+        x = NEXT_UNRESOLVED(skip, x + 1)
+    return count
 
 
 cdef inline double NOW_OR(time):
@@ -37,26 +181,193 @@ cdef inline double NOW_OR(time):
     return now() if time is None else float(time)
 
 
+cdef inline double BOUNDARY_AT(Gauge limit_gauge, double limit_value,
+                               double at) except *:
+    """The boundary which a limit makes for the limited gauge at the time as a
+    determination sees.  Unlike a prediction, the value of the limit gauge is
+    not clamped by its own limits.
+    """
+    cdef:
+        Determination determination
+        Py_ssize_t x
+    if limit_gauge is None:
+        return limit_value
+    determination = limit_gauge._determine()
+    determination._extend(at)
+    x = determination._bisect(at)
+    if x == 0:
+        return determination._values[0]
+    elif x == determination._length:
+        return determination._values[x - 1]
+    return SEGMENT_VALUE(at,
+                         determination._times[x - 1], determination._times[x],
+                         determination._values[x - 1], determination._values[x])
+
+
+cdef inline bint LIMITS_RESETTING(Gauge gauge):
+    """Whether the gauge or one of its limit gauges is being rebased for new
+    limits.  The prediction of the gauge doesn't follow its determination then
+    because it is clamped by the new limits.
+    """
+    if gauge is None:
+        return False
+    return (gauge._limits_reset or LIMITS_RESETTING(gauge._max_gauge) or
+            LIMITS_RESETTING(gauge._min_gauge))
+
+
+cdef inline bint LAGGING(Gauge gauge):
+    """Whether the gauge has not applied some rebases in the log which it
+    follows.
+    """
+    cdef Gauge limit_gauge = gauge._lazy_source
+    if limit_gauge is None:
+        return False
+    return (gauge._lazy_log is not limit_gauge._rebase_log or
+            gauge._lazy_position < gauge._lazy_log._num_rebases)
+
+
+cdef inline void LINK(Gauge limit_gauge, Gauge gauge) except *:
+    """Registers the gauge as a limited gauge of the limit gauge."""
+    limit_gauge._limited_gauges.add(gauge)
+    RESORT(limit_gauge)
+
+
+cdef inline void UNLINK(Gauge limit_gauge, Gauge gauge) except *:
+    """Unregisters the gauge from the limited gauges of the limit gauge."""
+    if gauge._lazy_source is limit_gauge:
+        gauge._settle()
+        gauge._lazy_source, gauge._lazy_log = None, None
+    limit_gauge._limited_gauges.discard(gauge)
+    RESORT(limit_gauge)
+
+
+cdef inline void RESORT(Gauge gauge):
+    """Lets the limit gauges of the gauge and the gauge itself sort their
+    limited gauges again.  Whether a limited gauge can follow the rebase log
+    depends on its limits and its limited gauges.
+    """
+    gauge._eager_gauges = None
+    if gauge._max_gauge is not None:
+        gauge._max_gauge._eager_gauges = None
+    if gauge._min_gauge is not None:
+        gauge._min_gauge._eager_gauges = None
+
+
+cdef inline void FILL_SORTED(sorted_list, list values, list keys) except *:
+    """Fills an empty sorted list with the values in the order of their keys
+    without sorting them again.
+    """
+    cdef Py_ssize_t load, length = len(values), x
+    try:
+        load = sorted_list._load
+        lists = sorted_list._lists
+        key_lists = sorted_list._keys
+        maxes = sorted_list._maxes
+    except AttributeError:
+        # unknown internals of sortedcontainers.
+        sorted_list.update(values)
+        return
+    for x in range(0, length, load):
+        lists.append(values[x:x + load])
+        key_lists.append(keys[x:x + load])
+        maxes.append(keys[min(x + load, length) - 1])
+    sorted_list._len = length
+    del sorted_list._index[:]
+
+
 cdef inline void RESTORE_INTO(Gauge gauge, (double, double) base, list momenta,
                               double max_value, Gauge max_gauge,
-                              double min_value, Gauge min_gauge):
+                              double min_value, Gauge min_gauge) except *:
     gauge._base_time, gauge._base_value = base
     gauge._max_value, gauge._max_gauge = max_value, max_gauge
     gauge._min_value, gauge._min_gauge = min_value, min_gauge
     if max_gauge is not None:
-        max_gauge._limited_gauges.add(gauge)
+        LINK(max_gauge, gauge)
     if min_gauge is not None:
-        min_gauge._limited_gauges.add(gauge)
-    if momenta:
-        gauge.add_momenta([gauge._make_momentum(*m) for m in momenta])
+        LINK(min_gauge, gauge)
+    if not momenta:
+        return
+    # the momenta have been dumped in order and validated already.
+    if type(gauge)._make_momentum is Gauge._make_momentum:
+        momenta = [Momentum(*m) for m in momenta]
+    else:
+        momenta = [gauge._make_momentum(*m) for m in momenta]
+    gauge._load_momenta(momenta)
+
+
+cdef inline object CHECKSUM(Gauge gauge):
+    """The checksum of the inputs of the determination of a gauge except the
+    limit gauges.
+    """
+    cdef:
+        Momentum m
+        list numbers = [gauge._base_time, gauge._base_value,
+                        gauge._max_value, gauge._min_value]
+    for m in gauge.momenta:
+        numbers.extend((m.velocity, m.since, m.until))
+    # hash() of a str is seeded for each process.  The checksum should be
+    # same in any process.
+    data = __version__.encode('ascii') + pack('<%dd' % len(numbers), *numbers)
+    return crc32(data) & 0xffffffff
+
+
+cdef inline tuple DUMP_CACHE(Gauge gauge):
+    """Dumps the cached determination of a gauge with the checksum of the
+    inputs.
+    """
+    cdef:
+        Determination determination = gauge._determine()
+        Py_ssize_t length
+    determination._extend(+INF)
+    length = determination._length
+    return (CHECKSUM(gauge),
+            pack('<%dd' % length, *(<double[:length]>determination._times))
+            if length else b'',
+            pack('<%dd' % length, *(<double[:length]>determination._values))
+            if length else b'',
+            determination.in_range_since)
+
+
+cdef inline void RESTORE_CACHE(Gauge gauge, tuple cache) except *:
+    """Restores the cached determination of a gauge.  It is discarded if the
+    inputs of the determination are different or the cache of a limit gauge
+    has been discarded.
+    """
+    cdef:
+        Determination determination
+        Py_ssize_t x
+    checksum, times, values, in_range_since = cache
+    if gauge._max_gauge is not None and gauge._max_gauge._determination is None:
+        return
+    if gauge._min_gauge is not None and gauge._min_gauge._determination is None:
+        return
+    if checksum != CHECKSUM(gauge):
+        return
+    times = unpack_from('<%dd' % (len(times) // 8), times)
+    values = unpack_from('<%dd' % (len(values) // 8), values)
+    determination = Determination.__new__(Determination)
+    determination._reserve(len(times))
+    for x in range(len(times)):
+        determination._append(times[x], values[x])
+    if in_range_since is not None:
+        determination._in_range = True
+        determination._in_range_since = in_range_since
+    gauge._determination = determination
+    gauge._invalidated_since = +INF
+    if gauge._max_gauge is not None:
+        gauge._max_version = gauge._max_gauge._version
+    if gauge._min_gauge is not None:
+        gauge._min_version = gauge._min_gauge._version
 
 
 def restore_gauge(gauge_class, base, momenta, max_value,
-                  max_gauge, min_value, min_gauge):
+                  max_gauge, min_value, min_gauge, cache=None):
     """Restores a gauge from the arguments.  It is used for Pickling."""
     gauge = gauge_class.__new__(gauge_class)
     RESTORE_INTO(gauge, base, momenta, max_value,
                  max_gauge, min_value, min_gauge)
+    if cache is not None:
+        RESTORE_CACHE(gauge, cache)
     return gauge
 
 
@@ -67,39 +378,51 @@ cdef class Gauge:
 
     property base:
         def __get__(self):
+            self._settle()
             return (self._base_time, self._base_value)
         def __set__(self, (double, double) base):
             self._base_time, self._base_value = base
+            self._changes += 1
 
     property max_value:
         def __get__(self):
             if self._max_gauge is None:
                 return self._max_value
         def __set__(self, double value):
+            RESORT(self)
             self._max_value = value
             self._max_gauge = None
+            self._changes += 1
 
     property max_gauge:
         def __get__(self):
             if self._max_gauge is not None:
                 return self._max_gauge
         def __set__(self, Gauge gauge):
+            RESORT(self)
             self._max_gauge = gauge
+            RESORT(self)
+            self._changes += 1
 
     property min_value:
         def __get__(self):
             if self._min_gauge is None:
                 return self._min_value
         def __set__(self, double value):
+            RESORT(self)
             self._min_value = value
             self._min_gauge = None
+            self._changes += 1
 
     property min_gauge:
         def __get__(self):
             if self._min_gauge is not None:
                 return self._min_gauge
         def __set__(self, Gauge gauge):
+            RESORT(self)
             self._min_gauge = gauge
+            RESORT(self)
+            self._changes += 1
 
     def __init__(self, double value, max, min=0, at=None):
         at = NOW_OR(at)
@@ -110,9 +433,21 @@ cdef class Gauge:
         self._max_gauge = self._min_gauge = None
         self.momenta = SortedListWithKey(key=by_until)
         self._determination = None
-        self._events = SortedList()
+        self._invalidated_since = +INF
+        self._events = [(0., EV_NONE, None), (+INF, EV_NONE, None)]
+        self._events_shared = False
         # a weak set of gauges that refer the gauge as a limit gauge.
         self._limited_gauges = WeakSet()
+        self._watchers = None
+
+    @property
+    def changes(self):
+        """The number of the changes of the gauge.  It increases whenever the
+        gauge is changed.  A collector remembers the number which it has seen
+        to find the gauges changed since then.
+        """
+        self._settle()
+        return self._changes
 
     @property
     def determination(self):
@@ -122,28 +457,73 @@ cdef class Gauge:
         A determination is a sorted list of 2-dimensional points which take
         times as x-values, gauge values as y-values.
         """
+        return self._determine()
+
+    cdef Determination _determine(self):
+        self._settle()
+        if self._determination is not None and self._limits_changed():
+            self.invalidate()
         if self._determination is None:
             # redetermine and cache.
             self._determination = Determination(self)
+            # the limit gauges have been determined by the determination.
+            if self._max_gauge is not None:
+                self._max_version = self._max_gauge._version
+            if self._min_gauge is not None:
+                self._min_version = self._min_gauge._version
+        elif self._invalidated_since != +INF:
+            # redetermine only after the invalidated time.
+            self._determination = \
+                self._determination._redetermine(self, self._invalidated_since)
+        self._invalidated_since = +INF
         return self._determination
 
-    def invalidate(self):
+    cdef bint _limits_changed(self) except -1:
+        """Whether one of the limit gauges has been invalidated since the
+        cached determination is determined.  The limit gauges are validated
+        first so that a change of a deeper limit gauge is also detected.
+        """
+        if self._max_gauge is not None and self._max_version >= 0:
+            self._max_gauge._determine()
+            if self._max_gauge._version != self._max_version:
+                return True
+        if self._min_gauge is not None and self._min_version >= 0:
+            self._min_gauge._determine()
+            if self._min_gauge._version != self._min_version:
+                return True
+        return False
+
+    def invalidate(self, since=None):
         """Invalidates the cached determination.  If you touches the
         determination at the next first time, that will be redetermined.
 
         You don't need to call this method because all mutating methods such as
         :meth:`incr` or :meth:`add_momentum` calls it.
 
+        The limited gauges are not invalidated together.  They find out the
+        change by the version of this gauge when they are observed.
+
+        :param since: the earliest time of changed momentum events.  The
+                      determination before the time will be kept to be reused
+                      by the next redetermination.  (default: invalidates the
+                      whole determination)
+
         :returns: whether the gauge is invalidated actually.
         """
+        if self._watchers:
+            # the crossing times may be changed.
+            for scheduler in list(self._watchers):
+                scheduler.gauge_invalidated(self)
         if self._determination is None:
             return False
-        # remove the cached determination.
-        self._determination = None
-        # invalidate limited gauges together.
-        cdef Gauge gauge
-        for gauge in self._limited_gauges:
-            gauge._limit_gauge_invalidated(self)
+        if since is None:
+            # remove the cached determination.
+            self._determination = None
+            self._invalidated_since = +INF
+        else:
+            # remember where to redetermine from.
+            self._invalidated_since = min(self._invalidated_since, since)
+        self._version += 1
         return True
 
     def get_max(self, at=None):
@@ -160,6 +540,20 @@ cdef class Gauge:
         else:
             return self._min_gauge.get(at)
 
+    cdef double _get_max(self, double at) except *:
+        cdef double value, velocity
+        if self._max_gauge is None:
+            return self._max_value
+        value, velocity = self._max_gauge._predict(at)
+        return value
+
+    cdef double _get_min(self, double at) except *:
+        cdef double value, velocity
+        if self._min_gauge is None:
+            return self._min_value
+        value, velocity = self._min_gauge._predict(at)
+        return value
+
     #: The alias of :meth:`get_max`.
     max = get_max
 
@@ -170,7 +564,6 @@ cdef class Gauge:
         at = NOW_OR(at)
         cdef:
             double forget_until = at
-            double in_range_since
             Gauge limit_gauge
         # _incomplete=True when __init__() calls it.
         if not _incomplete:
@@ -179,12 +572,13 @@ cdef class Gauge:
         # set max.
         if max_ is not None:
             if self._max_gauge is not None:
-                self._max_gauge._limited_gauges.discard(self)
+                UNLINK(self._max_gauge, self)
             if isinstance(max_, Gauge):
                 limit_gauge = max_
-                limit_gauge._limited_gauges.add(self)
+                LINK(limit_gauge, self)
                 self._max_gauge = limit_gauge
                 self._max_value = limit_gauge.get(at)
+                self._max_version = limit_gauge._version
                 forget_until = min(forget_until, limit_gauge._base_time)
             else:
                 self._max_gauge = None
@@ -196,12 +590,13 @@ cdef class Gauge:
         # set min.  (copied from above)
         if min_ is not None:
             if self._min_gauge is not None:
-                self._min_gauge._limited_gauges.discard(self)
+                UNLINK(self._min_gauge, self)
             if isinstance(min_, Gauge):
                 limit_gauge = min_
-                limit_gauge._limited_gauges.add(self)
+                LINK(limit_gauge, self)
                 self._min_gauge = limit_gauge
                 self._min_value = limit_gauge.get(at)
+                self._min_version = limit_gauge._version
                 forget_until = min(forget_until, limit_gauge._base_time)
             else:
                 self._min_gauge = None
@@ -210,10 +605,22 @@ cdef class Gauge:
                 pass
             elif in_range_since <= at:
                 value = max(value, self._min_value)
+        RESORT(self)
+        self._changes += 1
         # maybe modify value.
         if _incomplete:
             return
-        return self.forget_past(value, at=forget_until)
+        # the determination has been made under the previous limits.  It is
+        # still observed by the limited gauges during the rebase.
+        self._limits_reset = True
+        try:
+            return self.forget_past(value, at=forget_until)
+        except BaseException:
+            # don't keep the determination of the previous limits even if the
+            # rebase fails.
+            self._limits_reset = False
+            self.invalidate()
+            raise
 
     def set_max(self, max, at=None):
         """Changes the maximum.
@@ -240,39 +647,140 @@ cdef class Gauge:
         """
         return self._set_range(max, min, at=at)
 
-    cdef (double, double) _predict(self, double at):
+    cdef (bint, double) _linear_velocity(self):
+        """Checks whether the gauge moves along a straight line until it meets
+        a limit.  A gauge in the range with constant limits and no momentum
+        or only one momentum which affects since the base forever is linear.
+        A linear gauge is predicted without any determination.
+
+        :returns: (ok, velocity)
+        """
+        cdef Momentum momentum
+        if self._determination is not None:
+            return (False, 0)
+        if self._max_gauge is not None or self._min_gauge is not None:
+            return (False, 0)
+        if not self._min_value <= self._base_value <= self._max_value:
+            return (False, 0)
+        if not self.momenta:
+            return (True, 0)
+        elif len(self.momenta) != 1:
+            return (False, 0)
+        momentum = self.momenta[0]
+        if momentum.since > self._base_time or momentum.until != +INF:
+            return (False, 0)
+        return (True, momentum.velocity)
+
+    cdef (double, double) _linear_goal(self, double velocity):
+        """Finds the point where a linear gauge meets a limit.  It is the
+        intersection which :class:`Determination` would find.
+
+        :returns: (time, value).  The base if the gauge doesn't move.
+        """
+        cdef:
+            double limit
+            double time
+        if velocity > 0:
+            limit = self._max_value
+        elif velocity < 0:
+            limit = self._min_value
+        else:
+            return (self._base_time, self._base_value)
+        time = ((self._base_value - velocity * self._base_time) - limit) / \
+            (0 - velocity)
+        if time > self._base_time:
+            return (time, limit)
+        return (self._base_time, self._base_value)
+
+    cdef (double, double) _predict(self, double at) except *:
         """Predicts the current value and velocity.
 
         :param at: the time to observe.  (default: now)
         """
         cdef:
-            Determination determination = self.determination
+            Determination determination
+            Py_ssize_t x
+            bint linear
+            double velocity
+            double time
+            double value
+        linear, velocity = self._linear_velocity()
+        if linear:
+            time, value = self._linear_goal(velocity)
+            if at < self._base_time or time == self._base_time:
+                return (self._base_value, 0.)
+            elif at >= time:
+                return (value, 0.)
+            velocity = SEGMENT_VELOCITY(self._base_time, time,
+                                        self._base_value, value)
+            value = SEGMENT_VALUE(at, self._base_time, time,
+                                  self._base_value, value)
+            return (self._clamp(value, at=at), velocity)
+        determination = self.determination
+        determination._extend(at)
+        if determination._length == 1:
+            # skip bisecting because there's only one point.
+            x = 0
+        else:
+            x = determination._bisect(at)
+        return self._predict_segment(determination, x, at)
+
+    cdef (double, bint) _observe(self, double at) except *:
+        """Predicts the value and whether the gauge is in the range at once.
+        It is :meth:`get` and :meth:`in_range` in a single pass for the
+        mutating methods.
+
+        :returns: (value, in_range)
+        """
+        cdef:
+            Determination determination
+            double value
+            double velocity
+            bint linear
+        linear, velocity = self._linear_velocity()
+        if linear:
+            # a linear gauge is in the range since the base.
+            value, velocity = self._predict(at)
+            return (value, self._base_time <= at)
+        determination = self.determination
+        determination._extend(at)
+        value, velocity = self._predict_segment(
+            determination, determination._bisect(at), at)
+        return (value, determination._in_range and
+                determination._in_range_since <= at)
+
+    cdef (double, double) _predict_segment(self, Determination determination,
+                                           Py_ssize_t x, double at) except *:
+        """Predicts the value and velocity on the segment which ends at the
+        `x`-th point of the determination.
+        """
+        cdef:
             double time1
             double time2
             double value
             double value1
             double value2
             double velocity
-        if len(determination) == 1:
-            # skip bisect_right() because it is expensive
-            x = 0
-        else:
-            x = bisect_right(determination, (at, +INF))
         if x == 0:
-            return (determination[0][VALUE], 0.)
-        try:
-            time2, value2 = determination[x]
-        except IndexError:
-            return (determination[-1][VALUE], 0.)
-        time1, value1 = determination[x - 1]
+            return (determination._values[0], 0.)
+        elif x == determination._length:
+            return (determination._values[x - 1], 0.)
+        time1, value1 = determination._times[x - 1], determination._values[x - 1]
+        time2, value2 = determination._times[x], determination._values[x]
         value = SEGMENT_VALUE(at, time1, time2, value1, value2)
         velocity = SEGMENT_VELOCITY(time1, time2, value1, value2)
-        if determination.in_range_since is None:
+        if not determination._in_range:
             pass
-        elif determination.in_range_since <= time1:
+        elif determination._in_range_since <= time1:
             value = self._clamp(value, at=at)
         return (value, velocity)
 
+    def reader(self):
+        """Makes a :class:`Reader` to observe the gauge at non-decreasing
+        times quickly.
+        """
+        return Reader(self)
+
     def get(self, at=None):
         """Predicts the current value.
 
@@ -289,9 +797,83 @@ cdef class Gauge:
         value, velocity = self._predict(NOW_OR(at))
         return velocity
 
+    def _predict_many(self, times):
+        """Predicts the values and velocities at the given times at once.  It
+        is the vectorized version of :meth:`_predict`.
+        """
+        times = numpy.asarray(times, dtype=float)
+        cdef:
+            Determination determination = self.determination
+            Py_ssize_t length
+        if times.size:
+            determination._extend(times.max())
+        length = determination._length
+        points_times, points_values = DETERMINATION_ARRAYS(determination)
+        x = numpy.searchsorted(points_times, times, side='right')
+        between = (x > 0) & (x < length)
+        x2 = numpy.minimum(x, length - 1)
+        x1 = numpy.maximum(x - 1, 0)
+        time1, time2 = points_times[x1], points_times[x2]
+        value1, value2 = points_values[x1], points_values[x2]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rate = (times - time1) / (time2 - time1)
+            velocities = (value2 - value1) / (time2 - time1)
+            values = numpy.where(times == time2, value2,
+                                 value1 + rate * (value2 - value1))
+        values = numpy.where(between & (times != time1), values,
+                             numpy.where(x == 0, points_values[0], value1))
+        velocities = numpy.where(between, velocities, 0.)
+        if determination._in_range:
+            clamp = between & (determination._in_range_since <= time1)
+            if clamp.any():
+                max_ = self._get_max_many(times)
+                min_ = self._get_min_many(times)
+                values = numpy.where(
+                    clamp & (values > max_), max_,
+                    numpy.where(clamp & (values < min_), min_, values))
+        return values, velocities
+
+    def _get_max_many(self, times):
+        if self._max_gauge is None:
+            return numpy.full(numpy.shape(times), self._max_value)
+        return self._max_gauge.get_many(times)
+
+    def _get_min_many(self, times):
+        if self._min_gauge is None:
+            return numpy.full(numpy.shape(times), self._min_value)
+        return self._min_gauge.get_many(times)
+
+    def get_many(self, times):
+        """Predicts the values at the given times at once.  The times don't
+        need to be sorted.  It requires NumPy.
+
+        :param times: an array of the times to observe.
+
+        :returns: a NumPy array of the values.
+        """
+        values, velocities = self._predict_many(times)
+        return values
+
+    def velocity_many(self, times):
+        """Predicts the velocities at the given times at once.  The times don't
+        need to be sorted.  It requires NumPy.
+
+        :param times: an array of the times to observe.
+
+        :returns: a NumPy array of the velocities.
+        """
+        values, velocities = self._predict_many(times)
+        return velocities
+
     def goal(self):
         """Predicts the final value."""
-        return self.determination[-1][VALUE]
+        linear, velocity = self._linear_velocity()
+        if linear:
+            time, value = self._linear_goal(velocity)
+            return value
+        cdef Determination determination = self.determination
+        determination._extend(+INF)
+        return determination._values[determination._length - 1]
 
     def incr(self, double delta, int outbound=LI_ERROR, at=None):
         """Increases the value by the given delta immediately.  The
@@ -304,35 +886,7 @@ cdef class Gauge:
 
         :raises ValueError: the value is out of the range.
         """
-        at = NOW_OR(at)
-        cdef:
-            double limit
-            double prev_value = self.get(at=at)
-            double value = prev_value + delta
-        if outbound == LI_ONCE:
-            outbound = LI_OK if self.in_range(at) else LI_ERROR
-        if outbound != LI_OK:
-            if delta > 0:
-                limit = self.get_max(at)
-                if value <= limit:
-                    pass
-                elif outbound == LI_CLAMP:
-                    value = max(prev_value, limit)
-                elif outbound == LI_ERROR:
-                    raise ValueError('the value to set is bigger '
-                                     'than the maximum ({0} > {1})'
-                                     ''.format(value, limit))
-            elif delta < 0:
-                limit = self.get_min(at)
-                if value >= limit:
-                    pass
-                elif outbound == LI_CLAMP:
-                    value = min(prev_value, limit)
-                elif outbound == LI_ERROR:
-                    raise ValueError('the value to set is smaller '
-                                     'than the minimum ({0} < {1})'
-                                     ''.format(value, limit))
-        return self.forget_past(value, at=at)
+        return self._incr(delta, outbound, NOW_OR(at), False)
 
     def decr(self, double delta, int outbound=LI_ERROR, at=None):
         """Decreases the value by the given delta immediately.  The
@@ -345,7 +899,7 @@ cdef class Gauge:
 
         :raises ValueError: the value is out of the range.
         """
-        return self.incr(-delta, outbound=outbound, at=at)
+        return self._incr(-delta, outbound, NOW_OR(at), False)
 
     def set(self, double value, int outbound=LI_ERROR, at=None):
         """Sets the current value immediately.  The determination would be
@@ -358,17 +912,56 @@ cdef class Gauge:
 
         :raises ValueError: the value is out of the range.
         """
-        at = NOW_OR(at)
-        cdef double delta = value - self.get(at=at)
-        return self.incr(delta, outbound=outbound, at=at)
-
-    cdef double _clamp(self, double value, double at):
-        max_ = self.get_max(at)
-        if value > max_:
-            return max_
-        min_ = self.get_min(at)
-        if value < min_:
-            return min_
+        return self._incr(value, outbound, NOW_OR(at), True)
+
+    cdef double _incr(self, double delta, int outbound, double at,
+                      bint absolute) except *:
+        """Increases the value in a single pass.  The current value, whether
+        it is in the range and the limit are evaluated once at the time.
+
+        :param absolute: whether `delta` is the value to set.
+        """
+        cdef:
+            double limit
+            double prev_value
+            double value
+            bint in_range
+        prev_value, in_range = self._observe(at)
+        if absolute:
+            delta = delta - prev_value
+        value = prev_value + delta
+        if outbound == LI_ONCE:
+            outbound = LI_OK if in_range else LI_ERROR
+        if outbound != LI_OK:
+            if delta > 0:
+                limit = self._get_max(at)
+                if value <= limit:
+                    pass
+                elif outbound == LI_CLAMP:
+                    value = max(prev_value, limit)
+                elif outbound == LI_ERROR:
+                    raise ValueError('the value to set is bigger '
+                                     'than the maximum ({0} > {1})'
+                                     ''.format(value, limit))
+            elif delta < 0:
+                limit = self._get_min(at)
+                if value >= limit:
+                    pass
+                elif outbound == LI_CLAMP:
+                    value = min(prev_value, limit)
+                elif outbound == LI_ERROR:
+                    raise ValueError('the value to set is smaller '
+                                     'than the minimum ({0} < {1})'
+                                     ''.format(value, limit))
+        return self._forget_past(value, at)
+
+    cdef double _clamp(self, double value, double at) except *:
+        cdef double limit = self._get_max(at)
+        if value > limit:
+            return limit
+        limit = self._get_min(at)
+        if value < limit:
+            return limit
         return value
 
     def clamp(self, at=None):
@@ -377,6 +970,51 @@ cdef class Gauge:
         value = self._clamp(self.get(at), at=at)
         return self.set(value, outbound=LI_OK, at=at)
 
+    def try_consume(self, double amount, at=None):
+        """Decreases the value by the given amount only if it doesn't go
+        below the minimum.  It is useful for a regenerating rate limiter::
+
+           ok, when = bucket.try_consume(1)
+           if not ok:
+              retry_after = when - time.time()
+
+        The value and the minimum are evaluated once at the time.  Concurrent
+        calls on the same gauge from other threads wait for each other, so
+        that they never consume the same value twice.  Other modifications
+        are not guarded.
+
+        :param amount: the value to consume.
+        :param at: the time to consume.  (default: now)
+
+        :returns: a tuple of whether the amount has been consumed and when the
+                  gauge has the amount.  The time is ``None`` if the gauge
+                  will not have the amount.
+        """
+        return self._try_consume(amount, NOW_OR(at))
+
+    cdef tuple _try_consume(self, double amount, double at):
+        cdef:
+            double goal
+            double value
+        lock = self._consume_lock
+        if lock is None:
+            # no Python code runs between the check and the assignment, so a
+            # racing thread keeps the lock which has been assigned first.
+            lock = Lock()
+            if self._consume_lock is None:
+                self._consume_lock = lock
+            lock = self._consume_lock
+        with lock:
+            value = self._observe(at)[0]
+            goal = self._get_min(at) + amount
+            if value >= goal:
+                self._forget_past(value - amount, at)
+                return (True, at)
+        for time in self.whenever(goal):
+            if time >= at:
+                return (False, time)
+        return (False, None)
+
     def when(self, double value, double after=0):
         """When the gauge reaches to the goal value.
 
@@ -398,29 +1036,197 @@ cdef class Gauge:
 
         :param value: the goal value.
         """
-        if not self.determination:
+        cdef:
+            Determination determination
+            double time1
+            double time2
+            double value1
+            double value2
+            Py_ssize_t x
+        linear, velocity = self._linear_velocity()
+        if linear:
+            time1, value1 = self._base_time, self._base_value
+            time2, value2 = self._linear_goal(velocity)
+            if value1 == value:
+                yield time1
+            if value1 < value <= value2 or value1 > value >= value2:
+                ratio = (value - value1) / float(value2 - value1)
+                yield (time1 + (time2 - time1) * ratio)
             return
         determination = self.determination
-        first_time, first_value = determination[0]
-        if first_value == value:
-            yield first_time
-        zipped_determination = zip(determination[:-1], determination[1:])
-        for (time1, value1), (time2, value2) in zipped_determination:
+        determination._extend(-INF)
+        if not determination._length:
+            return
+        if determination._values[0] == value:
+            yield determination._times[0]
+        x = 1
+        while True:
+            if x == determination._length:
+                if determination._complete:
+                    break
+                # determine more.
+                determination._extend(determination._times[x - 1])
+                continue
+            time1 = determination._times[x - 1]
+            time2 = determination._times[x]
+            value1 = determination._values[x - 1]
+            value2 = determination._values[x]
+            x += 1
             if not (value1 < value <= value2 or value1 > value >= value2):
                 continue
             ratio = (value - value1) / float(value2 - value1)
             yield (time1 + (time2 - time1) * ratio)
 
+    def _add_watcher(self, scheduler):
+        """Lets the scheduler know when this gauge is invalidated."""
+        if self._watchers is None:
+            self._watchers = WeakSet()
+        self._watchers.add(scheduler)
+
+    def _discard_watcher(self, scheduler):
+        if self._watchers is not None:
+            self._watchers.discard(scheduler)
+
+    def wait_until(self, value, loop=None):
+        """Makes a future which is done when the gauge reaches the given
+        value::
+
+           at = await stamina.wait_until(stamina.get_max())
+
+        The result of the future is the time.  Any change of the gauge
+        reschedules it.  It requires :mod:`asyncio`.
+
+        :param value: the goal value.
+        :param loop: the event loop.  (default: the current event loop)
+        """
+        from gauge.scheduler import wait_until
+        return wait_until(self, value, loop=loop)
+
+    def when_many(self, values):
+        """When the gauge reaches each of the goal values.  It is the same as
+        :meth:`when` for each value but walks the determination only once.
+        The sorted goals are matched with each monotonic stretch of the
+        determination by binary search.
+
+        :param values: the goal values.  If it is a NumPy array, the result
+                       is also a NumPy array.
+
+        :returns: a list of the times.  ``None``, or ``nan`` in a NumPy
+                  array, for a value which the gauge will not reach.
+        """
+        cdef:
+            Determination determination = None
+            double* times
+            double* points
+            Py_ssize_t length
+            double linear_times[2]
+            double linear_values[2]
+            double* goals = NULL
+            Py_ssize_t* skip = NULL
+            double* found = NULL
+            Py_ssize_t num_goals
+            Py_ssize_t num_unresolved
+            Py_ssize_t start
+            Py_ssize_t stop
+            Py_ssize_t x
+            int direction
+            double delta
+        as_array = numpy is not None and isinstance(values, numpy.ndarray)
+        if as_array:
+            order = numpy.argsort(values, kind='mergesort')
+            sorted_values = values[order].astype(float)
+        else:
+            values = list(values)
+            order = sorted(range(len(values)), key=values.__getitem__)
+            sorted_values = [values[x] for x in order]
+        num_goals = len(sorted_values)
+        if not num_goals:
+            return numpy.empty(0) if as_array else []
+        goals = <double*>PyMem_Malloc(num_goals * sizeof(double))
+        skip = <Py_ssize_t*>PyMem_Malloc((num_goals + 1) * sizeof(Py_ssize_t))
+        found = <double*>PyMem_Malloc(num_goals * sizeof(double))
+        try:
+            if goals is NULL or skip is NULL or found is NULL:
+                raise MemoryError
+            for x in range(num_goals):
+                goals[x] = sorted_values[x]
+                skip[x] = x
+                found[x] = NAN
+            skip[num_goals] = num_goals
+            num_unresolved = num_goals
+            linear, velocity = self._linear_velocity()
+            if linear:
+                linear_times[0] = self._base_time
+                linear_values[0] = self._base_value
+                linear_times[1], linear_values[1] = \
+                    self._linear_goal(velocity)
+                times, points, length = linear_times, linear_values, 2
+            else:
+                determination = self.determination
+                determination._extend(-INF)
+                times = determination._times
+                points = determination._values
+                length = determination._length
+            if length:
+                # the goals at the first point.
+                x = BISECT(goals, 0, num_goals, points[0], False)
+                while x < num_goals and goals[x] == points[0]:
+                    found[x] = times[0]
+                    skip[x] = x + 1
+                    num_unresolved -= 1
+                    x += 1
+            start = 0
+            while num_unresolved:
+                # find the end of the monotonic stretch.
+                stop, direction = start, 0
+                while True:
+                    if stop + 1 == length:
+                        if determination is None or determination._complete:
+                            break
+                        # determine more.
+                        determination._extend(times[stop])
+                        times = determination._times
+                        points = determination._values
+                        length = determination._length
+                        continue
+                    delta = points[stop + 1] - points[stop]
+                    if delta > 0:
+                        if direction < 0:
+                            break
+                        direction = +1
+                    elif delta < 0:
+                        if direction > 0:
+                            break
+                        direction = -1
+                    stop += 1
+                if stop == start:
+                    break
+                if direction:
+                    num_unresolved -= RESOLVE_STRETCH(
+                        times, points, start, stop, direction > 0,
+                        goals, skip, num_goals, found)
+                start = stop
+            if as_array:
+                results = numpy.empty(num_goals)
+                results[order] = numpy.array(<double[:num_goals]>found)
+                return results
+            results = [None] * num_goals
+            for x in range(num_goals):
+                if not isnan(found[x]):
+                    results[order[x]] = found[x]
+            return results
+        finally:
+            PyMem_Free(goals)
+            PyMem_Free(skip)
+            PyMem_Free(found)
+
     def in_range(self, at=None):
         """Whether the gauge is between the range at the given time.
 
         :param at: the time to check.  (default: now)
         """
-        in_range_since = self.determination.in_range_since
-        if in_range_since is None:
-            return False
-        at = NOW_OR(at)
-        return in_range_since <= at
+        value, in_range = self._observe(NOW_OR(at))
+        return in_range
 
     @staticmethod
     def _make_momentum(velocity_or_momentum, since=None, until=None):
@@ -460,27 +1266,45 @@ cdef class Gauge:
         return momentum
 
     def add_momenta(self, momenta):
-        """Adds multiple momenta."""
-        cdef Momentum momentum
+        """Adds multiple momenta.  The determination before the earliest
+        `since` of them will be reused.
+        """
+        cdef:
+            Momentum momentum
+            double since = +INF
+            list events
+        self._settle()
+        events = self._writable_events()
         for momentum in momenta:
             self.momenta.add(momentum)
-            self._events.add((momentum.since, EV_ADD, momentum))
+            insort(events, (momentum.since, EV_ADD, momentum),
+                   1, len(events) - 1)
             if momentum.until != +INF:
-                self._events.add((momentum.until, EV_REMOVE, momentum))
-        self.invalidate()
+                insort(events, (momentum.until, EV_REMOVE, momentum),
+                       1, len(events) - 1)
+            since = min(since, momentum.since)
+        self._changes += 1
+        self.invalidate(since)
 
     def remove_momenta(self, momenta):
-        """Removes multiple momenta."""
-        cdef Momentum momentum
+        """Removes multiple momenta.  The determination before the earliest
+        `since` of them will be reused.
+        """
+        cdef:
+            Momentum momentum
+            double since = +INF
+            list events
+        self._settle()
+        events = self._writable_events()
         for momentum in momenta:
             try:
                 self.momenta.remove(momentum)
             except ValueError:
                 raise ValueError('{0} not in the gauge'.format(momentum))
-            self._events.remove((momentum.since, EV_ADD, momentum))
-            if momentum.until != +INF:
-                self._events.remove((momentum.until, EV_REMOVE, momentum))
-        self.invalidate()
+            REMOVE_EVENTS(events, momentum)
+            since = min(since, momentum.since)
+        self._changes += 1
+        self.invalidate(since)
 
     def add_momentum(self, *args, **kwargs):
         """Adds a momentum.  A momentum includes the velocity and the times to
@@ -510,27 +1334,32 @@ cdef class Gauge:
         return momentum
 
     cpdef list momentum_events(self):
-        """Yields momentum adding and removing events.  An event is a tuple of
-        ``(time, EV_ADD|EV_REMOVE, momentum)``.
+        """The momentum adding and removing events in order.  An event is a
+        tuple of ``(time, EV_ADD|EV_REMOVE, momentum)``.  The first and last
+        events are ``(base time, EV_NONE, None)`` and
+        ``(+inf, EV_NONE, None)``.
+
+        The events are maintained by the mutating methods and the list is
+        shared with the determinations.  Don't modify it.
         """
         cdef:
-            list events = []
-            list remove = []
-            Momentum momentum
-            double time
-            int method
-        events.append((self._base_time, EV_NONE, None))
-        momentum_ids = set([id(momentum) for momentum in self.momenta])
-        for time, method, momentum in self._events:
-            if id(momentum) not in momentum_ids:
-                remove.append((time, method, momentum))
-                continue
-            events.append((time, method, momentum))
-        for time, method, momentum in remove:
-            self._events.remove((time, method, momentum))
-        events.append((+INF, EV_NONE, None))
+            list events = self._events
+            tuple first = events[0]
+        if first[TIME] != self._base_time:
+            events = self._writable_events()
+            events[0] = (self._base_time, EV_NONE, None)
+        self._events_shared = True
         return events
 
+    cdef list _writable_events(self):
+        """Returns the momentum events to modify.  They are copied first if a
+        determination shares them.
+        """
+        if self._events_shared:
+            self._events = list(self._events)
+            self._events_shared = False
+        return self._events
+
     def _rebase(self, value=None, at=None, remove_momenta_before=None):
         """Sets the base and removes momenta between indexes of ``start`` and
         ``stop``.
@@ -541,15 +1370,232 @@ cdef class Gauge:
         :param remove_momenta_before: the stopping index of momentum removal.
                                       (default: the last)
         """
+        cdef Gauge gauge
+        self._settle()
         at = NOW_OR(at)
         if value is None:
             value = self.get(at=at)
+        # iterating even an empty weak set is not cheap.  A rebase while new
+        # limits are set is not logged because the limited gauges observe the
+        # determination of the previous limits clamped by the new limits.
+        if not self._limited_gauges:
+            pass
+        elif (self.lazy_rebase or BATCH() is not None) and \
+                not LIMITS_RESETTING(self):
+            self._rebase_lazily(value, at)
+        else:
+            for gauge in self._limited_gauges:
+                gauge._limit_gauge_rebased(self, value, at=at)
+        self._reset_base(value, at, remove_momenta_before)
+        return value
+
+    cdef void _sort_limited_gauges(self) except *:
+        """Sorts the limited gauges into the followers of the rebase log and
+        the others.  Only a leaf gauge whose other limit is constant can
+        observe a snapshot later without seeing any change after the rebase.
+        """
+        cdef Gauge gauge
+        if self._rebase_log is None:
+            self._rebase_log = RebaseLog()
+            self._lazy_horizon = -INF
+        followers, eager_gauges = WeakSet(), WeakSet()
         for gauge in self._limited_gauges:
+            if not gauge._limited_gauges and \
+               (gauge._max_gauge is None or gauge._min_gauge is None):
+                if gauge._lazy_source is not self:
+                    gauge._settle()
+                    gauge._lazy_source = self
+                    gauge._lazy_log = self._rebase_log
+                    gauge._lazy_position = self._rebase_log._num_rebases
+                    self._lazy_horizon = \
+                        max(self._lazy_horizon, gauge._base_time)
+                followers.add(gauge)
+            else:
+                if gauge._lazy_source is self:
+                    gauge._settle()
+                    gauge._lazy_source, gauge._lazy_log = None, None
+                eager_gauges.add(gauge)
+        self._followers, self._eager_gauges = followers, eager_gauges
+
+    cdef void _rebase_lazily(self, double value, double at) except *:
+        """Appends a rebase to the log which the followers apply at their
+        next access.  Only the other limited gauges are rebased right away.
+        A rebase costs constant time however many followers there are.
+
+        In a batch, the followers of a gauge which is not :attr:`lazy_rebase`
+        apply the logged rebases when the batch finishes.
+        """
+        cdef Gauge gauge
+        if self._eager_gauges is None:
+            self._sort_limited_gauges()
+        if self._followers:
+            if not self.lazy_rebase:
+                BATCH()._logged.add(self)
+            if self._rebase_log._num_rebases == LOG_CHUNK_LENGTH:
+                # the followers move to the next chunk.  A chunk is released
+                # when all of them have applied it.
+                self._rebase_log._next = RebaseLog()
+                self._rebase_log = self._rebase_log._next
+            # a follower observes this gauge from its base time.
+            self._rebase_log._append(self._determine(),
+                                     max(at, self._lazy_horizon), value, at)
+            self._lazy_horizon = max(self._lazy_horizon, at)
+        for gauge in self._eager_gauges:
             gauge._limit_gauge_rebased(self, value, at=at)
+
+    cdef void _settle_followers(self) except *:
+        """Applies the logged rebases to all the followers and starts a new
+        log so that the applied rebases are released.
+        """
+        cdef:
+            Gauge gauge
+            RebaseLog chunk = None
+            Py_ssize_t position = 0
+            list rebases = None
+        if self._eager_gauges is None:
+            self._sort_limited_gauges()
+        self._rebase_log = RebaseLog()
+        for gauge in self._followers:
+            if gauge._rebase_pending or not LAGGING(gauge):
+                gauge._settle()
+                continue
+            # the followers at the same position share the snapshots.
+            if gauge._lazy_log is not chunk or \
+               gauge._lazy_position != position:
+                chunk, position = gauge._lazy_log, gauge._lazy_position
+                rebases = chunk._since(position)
+            gauge._lazy_log, gauge._lazy_position = self._rebase_log, 0
+            if rebases:
+                gauge._apply_rebases(self, rebases)
+
+    cdef void _reset_base(self, double value, double at,
+                          remove_momenta_before) except *:
+        cdef:
+            list events
+            Momentum momentum
+            Determination determination = self._determination
+        if remove_momenta_before is None or self._limits_reset or \
+           self._invalidated_since != +INF:
+            determination = None
+        self._limits_reset = False
         self._base_time, self._base_value = at, value
-        del self.momenta[:remove_momenta_before]
+        if self._lazy_source is not None:
+            # the rebases logged later are observed from the new base.
+            self._lazy_source._lazy_horizon = \
+                max(self._lazy_source._lazy_horizon, at)
+        if remove_momenta_before is None:
+            self._events = [(at, EV_NONE, None), (+INF, EV_NONE, None)]
+            self._events_shared = False
+            self.momenta.clear()
+        elif remove_momenta_before:
+            events = self._writable_events()
+            for momentum in self.momenta[:remove_momenta_before]:
+                REMOVE_EVENTS(events, momentum)
+            del self.momenta[:remove_momenta_before]
+        if determination is not None:
+            # only the expired momenta have been removed.  Resume the sweep of
+            # the current determination from the new base.
+            determination = determination._rebase(self, at, value)
+        self._changes += 1
         self.invalidate()
-        return value
+        self._determination = determination
+
+    cdef void _settle(self) except *:
+        """Applies the work deferred by a batch or lazy rebases which this
+        gauge depends on.
+        """
+        cdef:
+            Gauge limit_gauge = self._lazy_source
+            RebaseLog log
+            list rebases
+        if self._rebase_pending:
+            # the deferred rebase is earlier than the unapplied lazy rebases.
+            self._settle_pending_rebase()
+        if LAGGING(self):
+            rebases = self._lazy_log._since(self._lazy_position)
+            log = limit_gauge._rebase_log
+            self._lazy_log, self._lazy_position = log, log._num_rebases
+            if rebases:
+                self._apply_rebases(limit_gauge, rebases)
+        if self._rebase_pending:
+            self._settle_pending_rebase()
+
+    cdef void _apply_rebases(self, Gauge limit_gauge,
+                             list rebases) except *:
+        """Applies the logged rebases of the limit gauge in a single sweep.
+        The gauge is determined once and the determination is resumed at each
+        rebase under the snapshot of the limit gauge until the next rebase.
+        """
+        cdef:
+            Gauge snapshot = Gauge.__new__(Gauge)
+            Determination determination = self._determination
+            Determination limit_determination
+            bint ceil = self._max_gauge is limit_gauge
+            bint in_range
+            double limit_value
+            double value = self._base_value
+            double at = self._base_time
+            double velocity
+        if self._invalidated_since != +INF:
+            determination = None
+        # the snapshot keeps the determination of the limit gauge until each
+        # rebase.
+        snapshot._max_value, snapshot._min_value = +INF, -INF
+        if ceil:
+            self._max_gauge = snapshot
+        else:
+            self._min_gauge = snapshot
+        try:
+            for limit_determination, limit_value, at in rebases:
+                snapshot._determination = limit_determination
+                snapshot._base_time = limit_determination._times[0]
+                snapshot._base_value = limit_determination._values[0]
+                # observe the snapshot as the limit gauge as it was at the
+                # rebase.
+                if determination is None:
+                    determination = Determination(self)
+                else:
+                    determination = determination._rebase(
+                        self, self._base_time, self._base_value, True)
+                if at < self._base_time:
+                    # the limit gauge is rebased earlier than the base time.
+                    at = self._base_time
+                    limit_value, velocity = snapshot._predict(at)
+                determination._extend(at)
+                value, velocity = self._predict_segment(
+                    determination, determination._bisect(at), at)
+                in_range = determination._in_range and \
+                    determination._in_range_since <= at
+                if in_range:
+                    if ceil:
+                        value = min(value, limit_value)
+                    else:
+                        value = max(value, limit_value)
+                self._base_time, self._base_value = at, value
+            # remove the momenta expired until the last rebase.
+            self._determination = determination
+            self._invalidated_since = +INF
+            self._forget_past(value, at)
+        finally:
+            if ceil:
+                self._max_gauge = limit_gauge
+            else:
+                self._min_gauge = limit_gauge
+        if self._determination is None:
+            return
+        # resume the sweep under the limit gauge as it is now.
+        self._determination = \
+            self._determination._rebase(self, at, value, True)
+        if ceil:
+            self._max_version = limit_gauge._version
+        else:
+            self._min_version = limit_gauge._version
+
+    cdef void _settle_pending_rebase(self) except *:
+        """Applies the rebase deferred by a batch."""
+        self._rebase_pending = False
+        x = self.momenta.bisect_left((-INF, -INF, self._pending_at))
+        self._reset_base(self._pending_value, self._pending_at, x)
 
     def clear_momenta(self, value=None, at=None):
         """Removes all momenta.  The value is set as the current value.  The
@@ -568,33 +1614,100 @@ cdef class Gauge:
 
         :raises ValueError: the given time is earlier than the base time.
         """
+        self._settle()
         at = NOW_OR(at)
+        if value is None:
+            value = self.get(at)
+        return self._forget_past(value, at)
+
+    cdef double _forget_past(self, double value, double at) except *:
         if at < self._base_time:
             raise ValueError("'at' should not be earlier than base time")
         x = self.momenta.bisect_left((-INF, -INF, at))
         return self._rebase(value, at=at, remove_momenta_before=x)
 
+    def apply(self, operations):
+        """Applies timed operations in order::
+
+           results = gauge.apply([
+              (10, 'incr', (5,)),
+              (15, 'add_momentum', (+1,)),
+              (20, 'set', (0, CLAMP)),
+           ])
+
+        An operation is a tuple of ``(at, name, args)``.  `name` is the name of
+        a mutating method such as ``'incr'`` or ``'set_max'`` and `args` are
+        the positional arguments except `at`.  A momentum added by
+        ``'add_momentum'`` starts at `at` unless `since` is given.
+
+        Each operation continues the determination of the previous one from
+        its time rather than walking all the momentum events again.
+
+        :returns: a list of the results of the operations.  The result of a
+                  failed operation is the :exc:`ValueError` it raised.  It
+                  doesn't stop the later operations.
+
+        :raises ValueError: the times are not in order or an operation is
+                            unknown.
+        """
+        cdef:
+            list results = []
+            double prev_at = -INF
+            double at
+        operations = list(operations)
+        for operation in operations:
+            at, name = operation[0], operation[1]
+            if at < prev_at:
+                raise ValueError('operations should be in time order')
+            if name not in TIMED_OPERATIONS and \
+               name not in MOMENTUM_OPERATIONS:
+                raise ValueError('unknown operation: {0!r}'.format(name))
+            prev_at = at
+        for operation in operations:
+            at, name = operation[0], operation[1]
+            args = tuple(operation[2]) if len(operation) > 2 else ()
+            method = getattr(self, name)
+            try:
+                if name in TIMED_OPERATIONS:
+                    result = method(*args, at=at)
+                elif name == 'add_momentum' and len(args) == 1 and \
+                        not isinstance(args[0], Momentum):
+                    result = method(*args, since=at)
+                else:
+                    result = method(*args)
+            except ValueError as exc:
+                result = exc
+            results.append(result)
+        return results
+
     def limited_gauges(self):
         gc.collect()
         return set(self._limited_gauges)
 
-    def _limit_gauge_invalidated(self, limit_gauge):
-        """The callback function which will be called at a limit gauge is
-        invalidated.
-        """
-        self.invalidate()
-
     def _limit_gauge_rebased(self, limit_gauge, limit_value, at=None):
         """The callback function which will be called at a limit gauge is
-        rebased.
+        rebased.  In a batch, the rebase is deferred and merged with the other
+        rebases at the same time.
         """
+        cdef Batch active_batch = BATCH()
         at = NOW_OR(at)
+        if active_batch is not None and self._rebase_pending and \
+           at == self._pending_at and not LAGGING(self):
+            # merge with the deferred rebase as if it has been applied.
+            value = self._pending_value
+            if BOUNDARY_AT(self._min_gauge, self._min_value, at) <= value <= \
+               BOUNDARY_AT(self._max_gauge, self._max_value, at):
+                clamp = {self._max_gauge: min, self._min_gauge: max}[limit_gauge]
+                value = clamp(value, limit_value)
+            self._defer_rebase(value, at)
+            return
+        self._settle()
         if at < self._base_time:
             # `limit_gauge` is rebased earlier than the base time.
             at = self._base_time
             limit_value = None
-        value = self.get(at)
-        if self.in_range(at):
+        value, in_range = self._observe(at)
+        if in_range:
             if limit_value is None:
                 # when `limit_gauge` is rebased earlier than the base time, get
                 # the limit value at the base time because `at` has been
@@ -602,17 +1715,280 @@ cdef class Gauge:
                 limit_value = limit_gauge.get(at)
             clamp = {self._max_gauge: min, self._min_gauge: max}[limit_gauge]
             value = clamp(value, limit_value)
-        self.forget_past(value, at=at)
+        if active_batch is None:
+            self._forget_past(value, at)
+        else:
+            self._defer_rebase(value, at)
+
+    def _defer_rebase(self, double value, double at):
+        """Defers a rebase until the batch finishes.  The limited gauges are
+        notified right now because they need to observe this gauge before the
+        rebase.
+        """
+        cdef Gauge gauge
+        for gauge in self._limited_gauges:
+            gauge._limit_gauge_rebased(self, value, at=at)
+        if not self._rebase_pending:
+            self._rebase_pending = True
+            BATCH()._rebased.append(self)
+        self._pending_at, self._pending_value = at, value
+        self._changes += 1
 
     def __reduce__(self):
         cdef Momentum m
-        return restore_gauge, (
+        self._settle()
+        args = (
             self.__class__,
             (self._base_time, self._base_value),
             [m._as_tuple() for m in self.momenta],
             self._max_value, self._max_gauge,
             self._min_value, self._min_gauge
         )
+        if STATE.warm_pickling:
+            args += (DUMP_CACHE(self),)
+        return restore_gauge, args
+
+    def to_bytes(self, bint limit_gauges=True, dict _encoded=None):
+        """Encodes the gauge in a compact binary format.  Use
+        :meth:`from_buffer` to decode.
+
+        The format is a little-endian fixed layout: a header, the velocities
+        of the momenta, their `since` times, their `until` times, and then the
+        limit gauges in the same format prefixed by their lengths.  The times
+        are stored as 32-bit integer deltas from the base time if all of them
+        are integers close enough to the base time.  Otherwise, they are
+        64-bit floats.  A limit gauge which appears again in the encoded
+        gauges is encoded once and then referred to by the order in which it
+        has been encoded.
+
+        :param limit_gauges: whether to encode the limit gauges.  If it is
+                             ``False``, the limit gauges should be given to
+                             :meth:`from_buffer` to decode.  (default: True)
+        """
+        cdef:
+            Momentum momentum
+            Py_ssize_t length
+            int flags = 0
+            double base_time
+            double time
+            list velocities = []
+            list sinces = []
+            list untils = []
+            list compact_times = []
+            bint compact
+            Gauge limit_gauge
+        self._settle()
+        base_time = self._base_time
+        compact = base_time == floor(base_time)
+        for momentum in self.momenta:
+            velocities.append(momentum.velocity)
+            sinces.append(momentum.since)
+            untils.append(momentum.until)
+        if compact:
+            for time in sinces + untils:
+                if time == -INF:
+                    compact_times.append(COMPACT_NEG_INF)
+                elif time == +INF:
+                    compact_times.append(COMPACT_POS_INF)
+                elif (COMPACT_MIN <= time - base_time <= COMPACT_MAX and
+                      time == floor(time)):
+                    compact_times.append(<long long>(time - base_time))
+                else:
+                    compact = False
+                    break
+        length = len(velocities)
+        if self._max_gauge is not None:
+            flags |= FL_MAX_GAUGE
+        if self._min_gauge is not None:
+            flags |= FL_MIN_GAUGE
+        if compact:
+            flags |= FL_COMPACT_TIMES
+        if not limit_gauges:
+            flags |= FL_REFERRED_LIMITS
+        # _encoded maps the gauges encoded so far to the order in which they
+        # have been finished.
+        if _encoded is None:
+            _encoded = {}
+        limit_chunks = []
+        if limit_gauges:
+            for flag, limit_gauge in [(FL_SHARED_MAX_GAUGE, self._max_gauge),
+                                      (FL_SHARED_MIN_GAUGE, self._min_gauge)]:
+                if limit_gauge is None:
+                    continue
+                try:
+                    order = _encoded[id(limit_gauge)]
+                except KeyError:
+                    data = limit_gauge.to_bytes(_encoded=_encoded)
+                    limit_chunks.append(LENGTH.pack(len(data)))
+                    limit_chunks.append(data)
+                else:
+                    flags |= flag
+                    limit_chunks.append(LENGTH.pack(order))
+        _encoded[id(self)] = len(_encoded)
+        chunks = [
+            HEADER.pack(b'GA', FORMAT_VERSION, flags, length, base_time,
+                        self._base_value, self._max_value, self._min_value),
+            pack('<%dd' % length, *velocities),
+        ]
+        if compact:
+            chunks.append(pack('<%di' % (length * 2), *compact_times))
+        else:
+            chunks.append(pack('<%dd' % (length * 2), *(sinces + untils)))
+        chunks.extend(limit_chunks)
+        return b''.join(chunks)
+
+    @classmethod
+    def from_buffer(cls, buffer, Gauge max_gauge=None, Gauge min_gauge=None,
+                    list _decoded=None):
+        """Decodes a gauge encoded by :meth:`to_bytes` from a bytes-like
+        object such as a :class:`memoryview`.  The momenta are read directly
+        from the buffer and the sorted indexes are built at once.
+
+        :param max_gauge: the max gauge if it has not been encoded.
+        :param min_gauge: the min gauge if it has not been encoded.
+
+        :raises ValueError: the buffer is not in the format or a limit gauge
+                            which has not been encoded is not given.
+        """
+        cdef:
+            Gauge gauge
+            Gauge limit_gauge
+            Py_ssize_t length
+            Py_ssize_t offset
+            Py_ssize_t x
+            int flags
+            double base_time
+            list momenta
+        buffer = memoryview(buffer)
+        try:
+            magic, version, flags, length, base_time, base_value, \
+                max_value, min_value = HEADER.unpack_from(buffer)
+        except Exception:
+            raise ValueError('not a gauge')
+        if magic != b'GA':
+            raise ValueError('not a gauge')
+        if version != FORMAT_VERSION:
+            raise ValueError('unknown version: {0}'.format(version))
+        offset = HEADER.size
+        try:
+            velocities = unpack_from('<%dd' % length, buffer, offset)
+            offset += length * 8
+            if flags & FL_COMPACT_TIMES:
+                times = unpack_from('<%di' % (length * 2), buffer, offset)
+                offset += length * 8
+                times = [-INF if time == COMPACT_NEG_INF else
+                         +INF if time == COMPACT_POS_INF else
+                         time + base_time for time in times]
+            else:
+                times = unpack_from('<%dd' % (length * 2), buffer, offset)
+                offset += length * 16
+        except Exception:
+            raise ValueError('truncated gauge')
+        gauge = cls.__new__(cls)
+        gauge._base_time, gauge._base_value = base_time, base_value
+        gauge._max_value, gauge._min_value = max_value, min_value
+        # _decoded lists the gauges decoded so far in the order in which
+        # they have been finished.
+        if _decoded is None:
+            _decoded = []
+        for flag, shared_flag in [(FL_MAX_GAUGE, FL_SHARED_MAX_GAUGE),
+                                  (FL_MIN_GAUGE, FL_SHARED_MIN_GAUGE)]:
+            if not flags & flag:
+                continue
+            if flags & FL_REFERRED_LIMITS:
+                limit_gauge = max_gauge if flag == FL_MAX_GAUGE else min_gauge
+                if limit_gauge is None:
+                    raise ValueError('the {0} gauge is required'.format(
+                        'max' if flag == FL_MAX_GAUGE else 'min'))
+            else:
+                try:
+                    size, = LENGTH.unpack_from(buffer, offset)
+                except Exception:
+                    raise ValueError('truncated gauge')
+                offset += LENGTH.size
+                if not flags & shared_flag:
+                    limit_gauge = Gauge.from_buffer(
+                        buffer[offset:offset + size], _decoded=_decoded)
+                    offset += size
+                elif size < len(_decoded):
+                    # the order of the limit gauge which has been decoded.
+                    limit_gauge = _decoded[size]
+                else:
+                    raise ValueError('unknown limit gauge')
+            if flag == FL_MAX_GAUGE:
+                gauge._max_gauge = limit_gauge
+            else:
+                gauge._min_gauge = limit_gauge
+            LINK(limit_gauge, gauge)
+        _decoded.append(gauge)
+        if not length:
+            return gauge
+        if cls._make_momentum is Gauge._make_momentum:
+            momenta = [Momentum(velocities[x], times[x], times[length + x])
+                       for x in range(length)]
+        else:
+            momenta = [gauge._make_momentum(velocities[x], times[x],
+                                            times[length + x])
+                       for x in range(length)]
+        gauge._load_momenta(momenta)
+        return gauge
+
+    cdef void _load_momenta(self, list momenta) except *:
+        """Replaces the momenta with the given momenta sorted by `until`.  The
+        order is checked in one pass which collects the removing events in
+        order.  The sorted list is filled as it is, and only the adding events
+        are sorted to be merged with the removing events.
+        """
+        cdef:
+            Momentum momentum
+            list keys = []
+            list adding
+            list removing = []
+            list events
+            tuple event
+            double until = NAN
+            bint tied = False
+            Py_ssize_t x = 0
+            Py_ssize_t y = 0
+        # the events are decorated with the fields of the momenta not to
+        # compare the momenta on a tie.
+        for momentum in momenta:
+            if momentum.until < until:
+                # not in order.
+                self._load_momenta(sorted(momenta, key=by_until))
+                return
+            elif momentum.until == until:
+                tied = True
+            until = momentum.until
+            keys.append(until)
+            if until != +INF:
+                removing.append((until, EV_REMOVE, momentum.velocity,
+                                 momentum.since, until, momentum))
+        if tied:
+            # the momenta of the same `until` are in the order of insertion.
+            removing.sort()
+        adding = [(momentum.since, EV_ADD, momentum.velocity, momentum.since,
+                   momentum.until, momentum) for momentum in momenta]
+        adding.sort()
+        events = [(self._base_time, EV_NONE, None)]
+        while x < len(adding) and y < len(removing):
+            if removing[y] < adding[x]:
+                event = removing[y]
+                y += 1
+            else:
+                event = adding[x]
+                x += 1
+            events.append((event[0], event[1], event[5]))
+        events.extend([(event[0], event[1], event[5]) for event in adding[x:]])
+        events.extend([(event[0], event[1], event[5])
+                       for event in removing[y:]])
+        events.append((+INF, EV_NONE, None))
+        self.momenta.clear()
+        FILL_SORTED(self.momenta, momenta, keys)
+        self._events = events
+        self._events_shared = False
+        self._changes += 1
+        self.invalidate()
 
     def _repr(self, at=None):
         """Example strings:
@@ -646,6 +2022,237 @@ cdef class Gauge:
         return self._repr()
 
 
+cdef class Batch:
+    """Defers the rebases which are propagated to the limited gauges until it
+    finishes.  Use :func:`batch` to make one.
+    """
+
+    def __cinit__(self):
+        self._rebased = []
+        self._logged = set()
+
+    def __enter__(self):
+        if STATE.batch is None:
+            STATE.batch = self
+        return self
+
+    def __exit__(self, *exc_info):
+        cdef Gauge gauge
+        if STATE.batch is not self:
+            # nested in another batch.
+            return
+        STATE.batch = None
+        for gauge in self._logged:
+            gauge._settle_followers()
+        self._logged.clear()
+        for gauge in self._rebased:
+            gauge._settle()
+        del self._rebased[:]
+
+
+cdef class RebaseLog:
+    """A chunk of the rebases of a limit gauge which the lazy limited gauges
+    apply at their next access.  A rebase keeps only the part of the
+    determination of the limit gauge which the limited gauges observe.  The
+    chunks are linked in order and a chunk is released when all the limited
+    gauges have applied it.
+    """
+
+    def __cinit__(self):
+        self._times = self._values = NULL
+        self._length = self._capacity = 0
+        self._rebases = NULL
+        self._num_rebases = self._rebases_capacity = 0
+
+    def __dealloc__(self):
+        PyMem_Free(self._times)
+        PyMem_Free(self._values)
+        PyMem_Free(self._rebases)
+
+    cdef void _append(self, Determination determination, double until,
+                      double value, double at) except *:
+        """Appends a rebase with the points of the determination until the
+        second one not earlier than `until`.
+        """
+        cdef:
+            Py_ssize_t length
+            Py_ssize_t capacity
+            double* times
+            double* values
+            Rebase* rebases
+        determination._extend(until)
+        length = determination._bisect(until)
+        if length < determination._length:
+            # a limited gauge may meet the boundary on the line after the next
+            # one.
+            determination._extend(determination._times[length])
+        length = min(length + 2, determination._length)
+        if self._length + length > self._capacity:
+            capacity = max(self._capacity * 2, self._length + length)
+            times = <double*>PyMem_Realloc(self._times,
+                                           capacity * sizeof(double))
+            if times is NULL:
+                raise MemoryError
+            self._times = times
+            values = <double*>PyMem_Realloc(self._values,
+                                            capacity * sizeof(double))
+            if values is NULL:
+                raise MemoryError
+            self._values = values
+            self._capacity = capacity
+        if self._num_rebases == self._rebases_capacity:
+            capacity = max(self._rebases_capacity * 2, 2)
+            rebases = <Rebase*>PyMem_Realloc(self._rebases,
+                                             capacity * sizeof(Rebase))
+            if rebases is NULL:
+                raise MemoryError
+            self._rebases = rebases
+            self._rebases_capacity = capacity
+        memcpy(self._times + self._length, determination._times,
+               length * sizeof(double))
+        memcpy(self._values + self._length, determination._values,
+               length * sizeof(double))
+        self._length += length
+        self._rebases[self._num_rebases] = Rebase(self._length, value, at)
+        self._num_rebases += 1
+
+    cdef list _since(self, Py_ssize_t x):
+        """The rebases from the `x`-th one in this chunk to the last one in
+        the last chunk.  The items are ``(determination, value, at)``.
+        """
+        cdef:
+            RebaseLog log = self
+            Determination determination
+            Rebase rebase
+            Py_ssize_t start
+            list rebases = []
+        while log is not None:
+            for x in range(x, log._num_rebases):
+                rebase = log._rebases[x]
+                start = 0 if x == 0 else log._rebases[x - 1].end
+                determination = Determination.__new__(Determination)
+                determination._reserve(rebase.end - start)
+                memcpy(determination._times, log._times + start,
+                       (rebase.end - start) * sizeof(double))
+                memcpy(determination._values, log._values + start,
+                       (rebase.end - start) * sizeof(double))
+                determination._length = rebase.end - start
+                rebases.append((determination, rebase.value, rebase.at))
+            log, x = log._next, 0
+        return rebases
+
+    def __sizeof__(self):
+        return (object.__sizeof__(self) +
+                self._capacity * 2 * sizeof(double) +
+                self._rebases_capacity * sizeof(Rebase))
+
+
+def batch():
+    """Makes a context in which the rebases of limit gauges are merged and
+    applied to the limited gauges at once when it finishes::
+
+       with gauge.batch():
+          max_stamina.incr(10)
+          max_stamina.add_momentum(+1, since=now, until=now + 60)
+
+    Observing a hyper-gauge in the context applies the deferred work which it
+    depends on.  A nested context joins the outer one.  The context is active
+    only in the current thread.
+    """
+    return Batch()
+
+
+@contextmanager
+def warm_pickling():
+    """Makes a context in which the pickled gauges carry their determinations
+    so that the unpickled gauges don't need to determine again::
+
+       with gauge.warm_pickling():
+          data = pickle.dumps(stamina)
+
+    A determination is discarded when unpickled if the inputs of the
+    determination, such as the momenta or the limit gauges, are different.
+    The context is active only in the current thread.
+    """
+    STATE.warm_pickling += 1
+    try:
+        yield
+    finally:
+        STATE.warm_pickling -= 1
+
+
+def try_consume_many(consumptions, at=None):
+    """Consumes from many gauges at the same time.  See
+    :meth:`Gauge.try_consume`::
+
+       results = gauge.try_consume_many([(bucket1, 1), (bucket2, 3)])
+
+    :param consumptions: pairs of a gauge and the amount to consume.
+    :param at: the time to consume.  (default: now)
+
+    :returns: a list of the results of :meth:`Gauge.try_consume`.
+    """
+    cdef:
+        Gauge gauge
+        double time = NOW_OR(at)
+        list results = []
+    for gauge, amount in consumptions:
+        results.append(gauge._try_consume(amount, time))
+    return results
+
+
+cdef class Reader:
+    """A cursor to observe a gauge at non-decreasing times such as the ticks
+    of a simulation loop.  It remembers the last segment of the determination
+    so that it walks forward from there instead of bisecting the whole
+    determination.
+
+    When the determination of the gauge is changed or the time goes back, it
+    bisects again.
+    """
+
+    def __cinit__(self, Gauge gauge):
+        self.gauge = gauge
+        self._determination = None
+        self._index = 0
+        self._at = -INF
+
+    cdef (double, double) _predict(self, double at) except *:
+        cdef:
+            Determination determination = self.gauge.determination
+            Py_ssize_t x
+        determination._extend(at)
+        if determination is not self._determination or at < self._at:
+            x = determination._bisect(at)
+            self._determination = determination
+        else:
+            x = self._index
+            while x < determination._length and determination._times[x] <= at:
+                x += 1
+        self._index = x
+        self._at = at
+        return self.gauge._predict_segment(determination, x, at)
+
+    def get(self, at=None):
+        """Predicts the value of the gauge.
+
+        :param at: the time to observe.  (default: now)
+        """
+        value, velocity = self._predict(NOW_OR(at))
+        return value
+
+    def velocity(self, at=None):
+        """Predicts the velocity of the gauge.
+
+        :param at: the time to observe.  (default: now)
+        """
+        value, velocity = self._predict(NOW_OR(at))
+        return velocity
+
+    def __repr__(self):
+        return '<{0} of {1!r}>'.format(CLASS_NAME(self), self.gauge)
+
+
 cdef class Momentum:
     """A power of which increases or decreases the gauge continually between a
     specific period.
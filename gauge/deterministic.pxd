@@ -1,14 +1,181 @@
 # -*- coding: utf-8 -*-
+from libc.math cimport fabs
 
 
-cdef class Determination(list):
+cdef enum:
+    # line types:
+    LN_HORIZON = 1
+    LN_RAY = 2
+    LN_SEGMENT = 3
+
+
+ctypedef enum Direction:
+    # a ceil bounds a gauge from above, a floor from below.
+    CEIL = 0
+    FLOOR = 1
+
+
+ctypedef struct LineData:
+    # LN_HORIZON, LN_RAY or LN_SEGMENT.
+    int type
+    double since
+    double until
+    double value
+    # the velocity of a ray or the final value of a segment.
+    double extra
+
+
+ctypedef struct Edge:
+    # a cursor on the lines of a boundary.
+    Direction direction
+    # the shared lines.  NULL for a constant boundary.
+    LineData* lines
+    Py_ssize_t length
+    # the line from the base time of the gauge to the shared lines.
+    LineData head
+    # the index of the current line.  -1 if it is the head.
+    Py_ssize_t index
+    LineData line
+
+
+ctypedef struct RunningSum:
+    # a compensated sum of the velocities of one sign.
+    double sum
+    double compensation
+    # the number of the velocities in the sum.
+    Py_ssize_t count
+
+
+ctypedef struct Checkpoint:
+    # the number of points determined before the event.
+    Py_ssize_t length
+    double since
+    double value
+    double velocity
+    # -1 if not bounded, 0 if bounded by the ceil, 1 if by the floor.
+    int bound_index
+    bint bounded
+    bint overlapped
+    Py_ssize_t ceil_index
+    Py_ssize_t floor_index
+    bint in_range
+    double in_range_since
+    # the sums of the positive and negative velocities of the momenta which
+    # are affecting.
+    RunningSum positive
+    RunningSum negative
+
+
+ctypedef struct Sweep:
+    # the state to resume the sweep.
+    Checkpoint state
+    # the cursors on the boundaries.
+    Edge ceil
+    Edge floor
+
+
+cdef class Lines:
 
     cdef:
+        LineData* _lines
+        Py_ssize_t _length
+        Py_ssize_t _capacity
+
+    cdef void _append(self, int type, double since, double until,
+                      double value, double extra=?) except *
+
+
+cdef class Determination:
+
+    cdef:
+        #: The times of the points.
+        double* _times
+        #: The values of the points.
+        double* _values
+        #: The number of the points.
+        Py_ssize_t _length
+        #: The allocated number of the points.
+        Py_ssize_t _capacity
         #: The time when the gauge starts to be in_range of the limits.
         double _in_range_since
         bint _in_range
+        #: The momentum events which have been walked.
+        list _events
+        #: The sweeping states at the beginning of every
+        #: ``CHECKPOINT_INTERVAL`` events after the first event.
+        Checkpoint* _checkpoints
+        #: The index of the first event to walk.  It is not zero if the
+        #: determination has been rebased from another one.
+        Py_ssize_t _first
+        Py_ssize_t _num_checkpoints
+        Py_ssize_t _checkpoints_capacity
+        #: The shared lines of the limit gauges.  ``None`` for constant
+        #: limits.
+        Lines _ceil_lines
+        Lines _floor_lines
+        #: The cached lines of this determination as a boundary of the
+        #: limited gauges.
+        Lines _lines
+        #: Whether all events have been walked.
+        bint _complete
+        #: The sweeping state to resume.  It is released when the
+        #: determination is complete.
+        double _base_time
+        Py_ssize_t _next
+        Sweep* _sweep
+
+    cdef void _reserve(self, Py_ssize_t length) except *
+    cdef void _reserve_checkpoints(self, Py_ssize_t length) except *
+    cdef void _append(self, double time, double value) except *
+    cdef void _determine(self, double time, double value,
+                         bint in_range=?) except *
+    cdef void _compact(self) except *
+    cdef void _limit(self, gauge) except *
+    cdef void _start(self, gauge) except *
+    cdef void _checkpoint(self, Checkpoint checkpoint) except *
+    cdef Py_ssize_t _bisect(self, double at)
+    cdef Determination _redetermine(self, gauge, double time)
+    cdef Determination _rebase(self, gauge, double at, double value,
+                               bint relimit=?)
+    cdef void _extend(self, double at) except *
+    cdef Lines _boundary_lines(self)
+
+
+cdef inline void ACCUMULATE(RunningSum* running_sum, double velocity,
+                            Py_ssize_t count):
+    """Adds a velocity to a running sum by Kahan-Babuska summation.  Pass
+    the negated velocity and -1 as `count` to subtract.
+    """
+    cdef double total = running_sum.sum + velocity
+    if fabs(running_sum.sum) >= fabs(velocity):
+        running_sum.compensation += (running_sum.sum - total) + velocity
+    else:
+        running_sum.compensation += (velocity - total) + running_sum.sum
+    running_sum.sum = total
+    running_sum.count += count
+    if running_sum.count == 0:
+        # drop the rounding error left by the subtractions.
+        running_sum.sum = running_sum.compensation = 0
+
+
+cdef inline double TOTAL(RunningSum running_sum):
+    return running_sum.sum + running_sum.compensation
+
+
+cdef inline void ADD_VELOCITY(RunningSum* positive, RunningSum* negative,
+                              double velocity):
+    if velocity > 0:
+        ACCUMULATE(positive, velocity, +1)
+    elif velocity < 0:
+        ACCUMULATE(negative, velocity, +1)
+
 
-    cdef void _determine(self, double time, double value, bint in_range=?)
+cdef inline void REMOVE_VELOCITY(RunningSum* positive, RunningSum* negative,
+                                 double velocity):
+    if velocity > 0:
+        ACCUMULATE(positive, -velocity, -1)
+    elif velocity < 0:
+        ACCUMULATE(negative, -velocity, -1)
 
 
 cdef inline double SEGMENT_VALUE(double at,
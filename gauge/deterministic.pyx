@@ -11,12 +11,19 @@
 """
 from __future__ import absolute_import
 
-import math
+from bisect import bisect_left
 import operator
 
+from cpython.mem cimport PyMem_Free, PyMem_Malloc, PyMem_Realloc
+from libc.math cimport isinf
+from libc.string cimport memcpy
+
 from gauge.constants cimport CLASS_NAME, EV_ADD, EV_REMOVE, INF
 from gauge.core cimport Gauge, Momentum
-from gauge.deterministic cimport SEGMENT_VALUE, SEGMENT_VELOCITY
+from gauge.deterministic cimport (
+    ADD_VELOCITY, CEIL, Direction, Edge, FLOOR, LineData, LN_HORIZON, LN_RAY,
+    LN_SEGMENT, REMOVE_VELOCITY, RunningSum, SEGMENT_VALUE, SEGMENT_VELOCITY,
+    Sweep, TOTAL)
 
 
 __all__ = ['Determination', 'Line', 'Horizon', 'Ray', 'Segment', 'Boundary']
@@ -26,114 +33,710 @@ __all__ = ['Determination', 'Line', 'Horizon', 'Ray', 'Segment', 'Boundary']
 DEF TIME = 0
 DEF VALUE = 1
 
+#: The number of the events between the checkpoints of a sweep.
+DEF CHECKPOINT_INTERVAL = 8
+
 
 # line types:
-DEF LN_HORIZON = 1
-DEF LN_RAY = 2
-DEF LN_SEGMENT = 3
 HORIZON = LN_HORIZON
 RAY = LN_RAY
 SEGMENT = LN_SEGMENT
 
 
-cdef inline list VALUE_LINES(Gauge gauge, double value):
-    return [Line(LN_HORIZON, gauge._base_time, +INF, value)]
+cdef inline LineData LINE(int type, double since, double until, double value,
+                          double extra=0):
+    cdef LineData line
+    line.type = type
+    line.since = since
+    line.until = until
+    line.value = value
+    line.extra = extra
+    return line
+
+
+cdef inline (bint, double) LINE_GET(LineData* line, double at):
+    """Returns the value of a line at the given time.
+
+    :returns: (ok, value).  Not ok if the time is out of the time range.
+
+    """
+    if not line.since <= at <= line.until:
+        return False, 0
+    if line.type == LN_HORIZON:
+        return True, line.value
+    elif line.type == LN_RAY:
+        return True, line.value + line.extra * (at - line.since)
+    else:
+        return True, SEGMENT_VALUE(at, line.since, line.until,
+                                   line.value, line.extra)
+
+
+cdef inline (bint, double) LINE_GUESS(LineData* line, double at):
+    """Returns the value of a line at the given time even the time is out of
+    the time range.
+    """
+    if at < line.since:
+        return True, line.value
+    elif at <= line.until:
+        return LINE_GET(line, at)
+    elif line.type == LN_HORIZON:
+        return True, line.value
+    elif line.type == LN_RAY:
+        return LINE_GET(line, line.until)
+    else:
+        return True, line.extra
+
+
+cdef inline double LINE_VELOCITY(LineData* line):
+    if line.type == LN_HORIZON:
+        return 0
+    elif line.type == LN_RAY:
+        return line.extra
+    else:
+        return SEGMENT_VELOCITY(line.since, line.until, line.value, line.extra)
+
 
+cdef inline double LINE_INTERCEPT(LineData* line):
+    """Returns the value-intercept. (Y-intercept)"""
+    return line.value - LINE_VELOCITY(line) * line.since
 
-cdef inline list GAUGE_LINES(Gauge gauge, Gauge other_gauge):
+
+cdef inline (bint, (double, double)) LINE_INTERSECT(LineData* line1,
+                                                   LineData* line2):
+    """Finds the intersection of 2 lines.
+
+    :returns: (ok, (time, value))
+
+    """
     cdef:
-        Line line
-        list lines = []
-        Determination determination = other_gauge.determination
-    first, last = determination[0], determination[-1]
-    if gauge._base_time < first[TIME]:
-        line = Line(LN_HORIZON, gauge._base_time, first[TIME], first[VALUE])
-        lines.append(line)
-    zipped_determination = zip(determination[:-1], determination[1:])
-    for (time1, value1), (time2, value2) in zipped_determination:
-        line = Line(LN_SEGMENT, time1, time2, value1, value2)
-        lines.append(line)
-    line = Line(LN_HORIZON, last[TIME], +INF, last[VALUE])
-    lines.append(line)
-    return lines
-
-
-cdef class Determination(list):
-    """Determination of a gauge is a list of `(time, value)` pairs.
-
-    :param determining: a :meth:`Gauge.determine` iterator.
+        double time
+        double value
+        double since
+        double until
+        double velocity_delta
+        double intercept_delta
+        bint ok
+        LineData* left
+        LineData* right
+    # right is more reliable.
+    if line1.type < line2.type:
+        left, right = line1, line2
+    else:
+        left, right = line2, line1
+    if isinf(LINE_VELOCITY(right)):
+        # right is almost vertical.
+        time = (right.since + right.until) / 2
+    else:
+        velocity_delta = LINE_VELOCITY(left) - LINE_VELOCITY(right)
+        if velocity_delta == 0:
+            # parallel line given.
+            return (False, (0, 0))
+        intercept_delta = LINE_INTERCEPT(right) - LINE_INTERCEPT(left)
+        time = intercept_delta / velocity_delta
+    since = max(left.since, right.since)
+    until = min(left.until, right.until)
+    if not since <= time <= until:
+        # intersection not in the time range.
+        return (False, (0, 0))
+    ok, value = LINE_GET(left, time)
+    if not ok:
+        return (False, (0, 0))
+    return (True, (time, value))
+
+
+cdef inline void EDGE_SEEK(Edge* edge, Py_ssize_t index):
+    edge.index = index
+    edge.line = edge.head if index == -1 else edge.lines[index]
+
+
+cdef inline Edge VALUE_EDGE(Gauge gauge, double value, Direction direction):
+    """Makes a constant boundary.  It has only the head."""
+    cdef Edge edge
+    edge.direction = direction
+    edge.lines, edge.length = NULL, 0
+    edge.head = LINE(LN_HORIZON, gauge._base_time, +INF, value)
+    EDGE_SEEK(&edge, -1)
+    return edge
+
+
+cdef inline Edge GAUGE_EDGE(Gauge gauge, Lines lines, Direction direction):
+    """Makes a boundary on the shared lines of a limit gauge.  The head is
+    the horizon from the base time of the gauge to the first line.
+    """
+    cdef:
+        Edge edge
+        LineData* first = lines._lines
+    edge.direction = direction
+    edge.lines, edge.length = lines._lines, lines._length
+    edge.head = LINE(LN_HORIZON, gauge._base_time, first.since, first.value)
+    EDGE_SEEK(&edge, -1 if gauge._base_time < first.since else 0)
+    return edge
+
+
+cdef inline void EDGE_WALK(Edge* edge):
+    """Chooses the next line.  The last line of a boundary lasts forever so
+    the sweep never walks past it.
+    """
+    edge.index += 1
+    edge.line = edge.lines[edge.index]
+
 
+cdef inline bint CMP(Direction direction, double x, double y):
+    """Whether `x` is inside `y` of a boundary in the direction.  It is
+    :func:`operator.lt` for the ceil or :func:`operator.gt` for the floor.
     """
+    if direction == CEIL:
+        return x < y
+    else:
+        return x > y
+
+
+cdef inline bint CMP_EQ(Direction direction, double x, double y):
+    return x == y or CMP(direction, x, y)
+
+
+cdef inline double BEST(Direction direction, double x, double y):
+    """Chooses the inner value like :func:`min` for the ceil or :func:`max`
+    for the floor.
+    """
+    return y if CMP(direction, y, x) else x
+
+
+cdef class Lines:
+    """The lines of a boundary in a contiguous C array.  A determination
+    makes them once as a boundary and the determinations of all its limited
+    gauges share them without copying.
+    """
+
+    def __cinit__(self, Py_ssize_t capacity):
+        self._lines = <LineData*>PyMem_Malloc(capacity * sizeof(LineData))
+        if self._lines is NULL:
+            raise MemoryError
+        self._length = 0
+        self._capacity = capacity
+
+    def __dealloc__(self):
+        PyMem_Free(self._lines)
+
+    cdef void _append(self, int type, double since, double until,
+                      double value, double extra=0) except *:
+        assert self._length < self._capacity
+        self._lines[self._length] = LINE(type, since, until, value, extra)
+        self._length += 1
+
+    def __len__(self):
+        return self._length
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self._capacity * sizeof(LineData)
+
+
+cdef class Determination:
+    """Determination of a gauge is a sequence of `(time, value)` points.  The
+    times and values are stored in contiguous C arrays.
+
+    :param gauge: the gauge to determine.
+
+    """
+
+    def __cinit__(self, *args, **kwargs):
+        self._times = self._values = NULL
+        self._length = self._capacity = 0
+        self._checkpoints = NULL
+        self._first = self._num_checkpoints = self._checkpoints_capacity = 0
+        self._sweep = NULL
+        self._in_range = False
+        # a determination made by hand is complete.
+        self._complete = True
+
+    def __dealloc__(self):
+        PyMem_Free(self._times)
+        PyMem_Free(self._values)
+        PyMem_Free(self._checkpoints)
+        PyMem_Free(self._sweep)
+
+    @property
+    def complete(self):
+        """Whether all momentum events have been walked.  A determination is
+        resolved lazily as far as the latest time requested by the gauge.
+        """
+        return self._complete
 
     @property
     def in_range_since(self):
+        self._extend(+INF)
         if self._in_range:
             return self._in_range_since
 
-    cdef void _determine(self, double time, double value, bint in_range=True):
-        if self and self[-1][TIME] == time:
+    cdef void _reserve(self, Py_ssize_t length) except *:
+        """Allocates the arrays to keep the given number of points."""
+        cdef:
+            Py_ssize_t capacity = max(2, self._capacity)
+            double* times
+            double* values
+        if length <= self._capacity:
+            return
+        while capacity < length:
+            capacity *= 2
+        times = <double*>PyMem_Realloc(self._times, capacity * sizeof(double))
+        if times is NULL:
+            raise MemoryError
+        self._times = times
+        values = <double*>PyMem_Realloc(self._values,
+                                        capacity * sizeof(double))
+        if values is NULL:
+            raise MemoryError
+        self._values = values
+        self._capacity = capacity
+
+    cdef void _append(self, double time, double value) except *:
+        if self._length == self._capacity:
+            self._reserve(self._length + 1)
+        self._times[self._length] = time
+        self._values[self._length] = value
+        self._length += 1
+
+    cdef void _determine(self, double time, double value,
+                         bint in_range=True) except *:
+        if self._length and self._times[self._length - 1] == time:
             return
         if in_range and not self._in_range:
             self._in_range = True
             self._in_range_since = time
-        self.append((time, value))
+        self._append(time, value)
+
+    cdef void _reserve_checkpoints(self, Py_ssize_t length) except *:
+        """Allocates the array to keep the given number of checkpoints."""
+        cdef:
+            Py_ssize_t capacity = max(2, self._checkpoints_capacity)
+            Checkpoint* checkpoints
+        if length <= self._checkpoints_capacity:
+            return
+        while capacity < length:
+            capacity *= 2
+        checkpoints = <Checkpoint*>PyMem_Realloc(
+            self._checkpoints, capacity * sizeof(Checkpoint))
+        if checkpoints is NULL:
+            raise MemoryError
+        self._checkpoints = checkpoints
+        self._checkpoints_capacity = capacity
+
+    cdef void _compact(self) except *:
+        """Releases the unused capacity of the arrays."""
+        cdef:
+            double* times
+            double* values
+            Checkpoint* checkpoints
+        if self._length < self._capacity:
+            times = <double*>PyMem_Realloc(
+                self._times, max(1, self._length) * sizeof(double))
+            if times is NULL:
+                raise MemoryError
+            self._times = times
+            values = <double*>PyMem_Realloc(
+                self._values, max(1, self._length) * sizeof(double))
+            if values is NULL:
+                raise MemoryError
+            self._values = values
+            self._capacity = max(1, self._length)
+        if not self._num_checkpoints:
+            PyMem_Free(self._checkpoints)
+            self._checkpoints = NULL
+            self._checkpoints_capacity = 0
+        elif self._num_checkpoints < self._checkpoints_capacity:
+            checkpoints = <Checkpoint*>PyMem_Realloc(
+                self._checkpoints, self._num_checkpoints * sizeof(Checkpoint))
+            if checkpoints is NULL:
+                raise MemoryError
+            self._checkpoints = checkpoints
+            self._checkpoints_capacity = self._num_checkpoints
+
+    cdef void _limit(self, gauge) except *:
+        """Shares the lines of the limit gauges of the gauge as the
+        boundaries.
+        """
+        if (<Gauge>gauge)._max_gauge is not None:
+            self._ceil_lines = \
+                (<Gauge>gauge)._max_gauge._determine()._boundary_lines()
+        if (<Gauge>gauge)._min_gauge is not None:
+            self._floor_lines = \
+                (<Gauge>gauge)._min_gauge._determine()._boundary_lines()
+
+    cdef void _start(self, gauge) except *:
+        """Allocates the sweeping state.  The boundaries are made on the
+        lines of the limit gauges or the constant limits of the gauge.
+        """
+        self._sweep = <Sweep*>PyMem_Malloc(sizeof(Sweep))
+        if self._sweep is NULL:
+            raise MemoryError
+        if self._ceil_lines is None:
+            self._sweep.ceil = VALUE_EDGE(gauge, (<Gauge>gauge)._max_value,
+                                          CEIL)
+        else:
+            self._sweep.ceil = GAUGE_EDGE(gauge, self._ceil_lines, CEIL)
+        if self._floor_lines is None:
+            self._sweep.floor = VALUE_EDGE(gauge, (<Gauge>gauge)._min_value,
+                                           FLOOR)
+        else:
+            self._sweep.floor = GAUGE_EDGE(gauge, self._floor_lines, FLOOR)
+
+    cdef void _checkpoint(self, Checkpoint checkpoint) except *:
+        if self._num_checkpoints == self._checkpoints_capacity:
+            self._reserve_checkpoints(self._num_checkpoints + 1)
+        self._checkpoints[self._num_checkpoints] = checkpoint
+        self._num_checkpoints += 1
+
+    cdef Py_ssize_t _bisect(self, double at):
+        """Finds the number of the points not later than the given time."""
+        cdef:
+            Py_ssize_t lo = 0
+            Py_ssize_t hi = self._length
+            Py_ssize_t mid
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if at < self._times[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def append(self, point):
+        """Appends a `(time, value)` point."""
+        time, value = point
+        self._append(time, value)
+
+    def extend(self, points):
+        """Appends `(time, value)` points."""
+        for time, value in points:
+            self._append(time, value)
+
+    def __len__(self):
+        self._extend(+INF)
+        return self._length
+
+    def __getitem__(self, index):
+        cdef Py_ssize_t x
+        self._extend(+INF)
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(self._length))]
+        x = index
+        if x < 0:
+            x += self._length
+        if not 0 <= x < self._length:
+            raise IndexError('determination index out of range')
+        return (self._times[x], self._values[x])
+
+    def __iter__(self):
+        cdef Py_ssize_t x
+        self._extend(+INF)
+        for x in range(self._length):
+            yield (self._times[x], self._values[x])
+
+    def __richcmp__(self, other, int op):
+        cdef:
+            Determination that
+            Py_ssize_t x
+            bint equal
+        if op not in (2, 3):
+            return NotImplemented
+        self._extend(+INF)
+        if isinstance(other, Determination):
+            that = other
+            that._extend(+INF)
+            equal = self._length == that._length
+            for x in range(self._length if equal else 0):
+                if (self._times[x] != that._times[x] or
+                        self._values[x] != that._values[x]):
+                    equal = False
+                    break
+        else:
+            try:
+                equal = list(self) == list(other)
+            except TypeError:
+                return NotImplemented
+        return equal if op == 2 else not equal
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __sizeof__(self):
+        return (object.__sizeof__(self) +
+                self._capacity * 2 * sizeof(double) +
+                self._checkpoints_capacity * sizeof(Checkpoint) +
+                (0 if self._sweep is NULL else sizeof(Sweep)))
 
     def __init__(self, Gauge gauge):
-        """Determines the transformations from the time when the value set to
-        the farthest future.
+        """Prepares to determine the transformations from the time when the
+        value set to the farthest future.  The determination is resolved
+        lazily, only as far as the requested time.
         """
         cdef:
             double since
-            double until
-            double time
             double value
-            double velocity = 0
-            list velocities = []
-            Boundary boundary
-            Boundary bound
-            Boundary b
             double boundary_value
-            double value_at_bound
-            double bound_until
-            bint again
             bint ok
+            Edge* edges[2]
+            Edge* edge
+            int bound_index = -1
+            Py_ssize_t x
+        since, value = gauge._base_time, gauge._base_value
+        self._limit(gauge)
+        self._start(gauge)
+        edges[0], edges[1] = &self._sweep.ceil, &self._sweep.floor
+        for x in range(2):
+            edge = edges[x]
+            # skip past boundaries.
+            while edge.line.until <= since:
+                EDGE_WALK(edge)
+            # check overflowing.
+            if bound_index != -1:
+                continue
+            ok, boundary_value = LINE_GUESS(&edge.line, since)
+            assert ok
+            if CMP(edge.direction, boundary_value, value):
+                bound_index = x
+        self._events = gauge.momentum_events()
+        self._base_time = gauge._base_time
+        self._sweep.state.since = since
+        self._sweep.state.value = value
+        self._sweep.state.velocity = 0
+        self._sweep.state.bound_index = bound_index
+        self._sweep.state.bounded = bound_index != -1
+        self._sweep.state.overlapped = False
+        self._sweep.state.positive = self._sweep.state.negative = \
+            RunningSum(0, 0, 0)
+        self._next = 0
+        self._complete = False
+
+    cdef Determination _redetermine(self, gauge, double time):
+        """Makes a new determination which shares the prefix of this
+        determination before the given time.  Only the events after the time
+        will be walked again.
+
+        :param time: the earliest time of changed momentum events.
+        """
+        cdef:
+            Determination determination
+            list events = self._events
+            Checkpoint checkpoint
+            Py_ssize_t x
+            Py_ssize_t num_checkpoints
+            Py_ssize_t length
+        if events is None:
+            return Determination(gauge)
+        # the events before `x` have not been changed.
+        x = bisect_left(events, (time,), 1, len(events) - 1)
+        if x >= self._next:
+            # the sweep has not reached the changed events yet.  Continue from
+            # the current state.
+            x = self._next
+            num_checkpoints = self._num_checkpoints
+            checkpoint = self._sweep.state
+            checkpoint.length = self._length
+            checkpoint.in_range = self._in_range
+            checkpoint.in_range_since = self._in_range_since
+            checkpoint.ceil_index = self._sweep.ceil.index
+            checkpoint.floor_index = self._sweep.floor.index
+        elif x < self._first + CHECKPOINT_INTERVAL:
+            # rebased after the changed events or no checkpoint before them.
+            return Determination(gauge)
+        else:
+            # restore the sweeping state at the last checkpoint before the
+            # changed events.  It includes the sums of the velocities.
+            num_checkpoints = (x - self._first) // CHECKPOINT_INTERVAL - 1
+            checkpoint = self._checkpoints[num_checkpoints]
+            x = self._first + (num_checkpoints + 1) * CHECKPOINT_INTERVAL
+        length = checkpoint.length
+        determination = Determination.__new__(Determination)
+        determination._reserve(length)
+        memcpy(determination._times, self._times, length * sizeof(double))
+        memcpy(determination._values, self._values, length * sizeof(double))
+        determination._length = length
+        determination._reserve_checkpoints(num_checkpoints)
+        memcpy(determination._checkpoints, self._checkpoints,
+               num_checkpoints * sizeof(Checkpoint))
+        determination._first = self._first
+        determination._num_checkpoints = num_checkpoints
+        determination._in_range = checkpoint.in_range
+        determination._in_range_since = checkpoint.in_range_since
+        determination._ceil_lines = self._ceil_lines
+        determination._floor_lines = self._floor_lines
+        determination._events = gauge.momentum_events()
+        determination._base_time = (<Gauge>gauge)._base_time
+        determination._start(gauge)
+        determination._sweep.state = checkpoint
+        EDGE_SEEK(&determination._sweep.ceil, checkpoint.ceil_index)
+        EDGE_SEEK(&determination._sweep.floor, checkpoint.floor_index)
+        determination._next = x
+        determination._complete = False
+        return determination
+
+    cdef Determination _rebase(self, gauge, double at, double value,
+                               bint relimit=False):
+        """Makes a new determination of the gauge rebased at the given time.
+        It resumes the sweep of this determination from the time instead of
+        walking the momentum events from the beginning.  Only the expired
+        momenta may have been removed from the gauge since this determination.
+
+        With `relimit`, the new determination is bounded by the current limit
+        gauges of the gauge instead of the boundaries of this determination.
+        The base of the gauge should be the given time and value then.
+        """
+        cdef:
+            Determination determination
+            list events
+            Checkpoint checkpoint
+            Edge* edges[2]
+            Edge* edge
+            int bound_index = -1
+            double boundary_value
+            bint ok
+            Py_ssize_t x
+            Py_ssize_t y
             int method
             Momentum momentum
-            list walked_boundaries
-            Line line
-            (double, double) intersection
-        since, value = gauge._base_time, gauge._base_value
-        self._in_range = False
-        # boundaries.
-        cdef list ceil_lines, floor_lines
-        if gauge._max_gauge is None:
-            ceil_lines = VALUE_LINES(gauge, gauge._max_value)
+        if self._events is None:
+            return Determination(gauge)
+        self._extend(at)
+        # the state after the events until the time.
+        x = bisect_left(self._events, (at, +INF), 1, len(self._events) - 1)
+        if x == self._next and not self._complete:
+            checkpoint = self._sweep.state
+            checkpoint.ceil_index = self._sweep.ceil.index
+            checkpoint.floor_index = self._sweep.floor.index
+        elif x < self._first + CHECKPOINT_INTERVAL:
+            # no checkpoint before the time.
+            return Determination(gauge)
         else:
-            ceil_lines = GAUGE_LINES(gauge, gauge._max_gauge)
-        if gauge._min_gauge is None:
-            floor_lines = VALUE_LINES(gauge, gauge._min_value)
+            # the last checkpoint before the time and the sums of the
+            # velocities of the events after it.
+            y = (x - self._first) // CHECKPOINT_INTERVAL - 1
+            checkpoint = self._checkpoints[y]
+            for y in range(self._first + (y + 1) * CHECKPOINT_INTERVAL, x):
+                __, method, momentum = self._events[y]
+                if method == EV_ADD:
+                    ADD_VELOCITY(&checkpoint.positive, &checkpoint.negative,
+                                 momentum.velocity)
+                elif method == EV_REMOVE:
+                    REMOVE_VELOCITY(&checkpoint.positive,
+                                    &checkpoint.negative, momentum.velocity)
+        determination = Determination.__new__(Determination)
+        if relimit:
+            # the edges start from the base of the gauge.
+            determination._limit(gauge)
+            determination._start(gauge)
         else:
-            floor_lines = GAUGE_LINES(gauge, gauge._min_gauge)
-        cdef:
-            ceil = Boundary(ceil_lines, operator.lt)
-            floor = Boundary(floor_lines, operator.gt)
-            list boundaries = [ceil, floor]
-            bint bounded = False
-            bint overlapped = False
-        for boundary in boundaries:
+            determination._ceil_lines = self._ceil_lines
+            determination._floor_lines = self._floor_lines
+            determination._start(gauge)
+            EDGE_SEEK(&determination._sweep.ceil, checkpoint.ceil_index)
+            EDGE_SEEK(&determination._sweep.floor, checkpoint.floor_index)
+        edges[0], edges[1] = \
+            &determination._sweep.ceil, &determination._sweep.floor
+        for x in range(2):
+            edge = edges[x]
             # skip past boundaries.
-            while boundary.line.until <= since:
-                boundary.walk()
+            while edge.line.until <= at:
+                EDGE_WALK(edge)
             # check overflowing.
-            if bounded:
+            if bound_index != -1:
                 continue
-            ok, boundary_value = boundary.line._guess(since)
+            ok, boundary_value = LINE_GUESS(&edge.line, at)
             assert ok
-            if boundary.cmp(boundary_value, value):
-                bound, bounded, overlapped = boundary, True, False
-        for time, method, momentum in gauge.momentum_events():
+            if CMP(edge.direction, boundary_value, value):
+                bound_index = x
+        # share the momentum events of the gauge.  The base event is not
+        # walked again.
+        events = (<Gauge>gauge)._events
+        (<Gauge>gauge)._events_shared = True
+        x = bisect_left(events, (at, +INF), 1, len(events) - 1)
+        determination._events = events
+        determination._first = determination._next = x
+        determination._base_time = at
+        determination._sweep.state = checkpoint
+        determination._sweep.state.since = at
+        determination._sweep.state.value = value
+        determination._sweep.state.velocity = 0
+        determination._sweep.state.bound_index = bound_index
+        determination._sweep.state.bounded = bound_index != -1
+        determination._sweep.state.overlapped = False
+        determination._determine(at, value, in_range=bound_index == -1)
+        determination._complete = False
+        return determination
+
+    cdef void _extend(self, double at) except *:
+        """Walks the momentum events until a point later than the given time
+        is determined.  The state at the beginning of every
+        ``CHECKPOINT_INTERVAL`` events is kept as a checkpoint to determine
+        again from the middle.
+
+        The momentum events and the breakpoints of both boundaries are merged
+        in one sweep.  The lines are C structs and the boundaries are cursors
+        on C arrays so that the sweep is linear in the total number of the
+        events and the breakpoints.
+        """
+        if self._complete:
+            return
+        if self._length and self._times[self._length - 1] > at:
+            return
+        cdef:
+            double base_time = self._base_time
+            Checkpoint* state = &self._sweep.state
+            double since = state.since
+            double value = state.value
+            double velocity = state.velocity
+            bint bounded = state.bounded
+            bint overlapped = state.overlapped
+            double until
+            double time
+            double boundary_value
+            double value_at_bound
+            double bound_until
+            bint again
+            bint ok
+            int method
+            Py_ssize_t x
+            Py_ssize_t y
+            Momentum momentum
+            Edge* walked[2]
+            Py_ssize_t num_walked = 0
+            RunningSum positive = state.positive
+            RunningSum negative = state.negative
+            Edge* ceil = &self._sweep.ceil
+            Edge* floor = &self._sweep.floor
+            Edge* boundary
+            Edge* bound = NULL
+            list events = self._events
+            LineData line
+            (double, double) intersection
+        if state.bound_index == 0:
+            bound = ceil
+        elif state.bound_index == 1:
+            bound = floor
+        for x in range(self._next, len(events)):
+            if self._length and self._times[self._length - 1] > at:
+                # pause here.
+                self._next = x
+                state.since = since
+                state.value = value
+                state.velocity = velocity
+                state.bound_index = \
+                    (0 if bound == ceil else 1) if bounded else -1
+                state.bounded = bounded
+                state.overlapped = overlapped
+                state.positive = positive
+                state.negative = negative
+                return
+            time, method, momentum = events[x]
+            if x != self._first and \
+               (x - self._first) % CHECKPOINT_INTERVAL == 0:
+                self._checkpoint(Checkpoint(
+                    self._length, since, value, velocity,
+                    (0 if bound == ceil else 1) if bounded else -1,
+                    bounded, overlapped, ceil.index, floor.index,
+                    self._in_range, self._in_range_since, positive, negative))
             # normalize time.
-            until = max(time, gauge._base_time)
+            until = max(time, base_time)
             # if True, An iteration doesn't choose next boundaries.  The first
             # iteration doesn't require to choose next boundaries.
             again = True
@@ -141,51 +744,54 @@ cdef class Determination(list):
                 if again:
                     again = False
                     if bounded:
-                        walked_boundaries = [bound]
+                        walked[0], num_walked = bound, 1
                     else:
-                        walked_boundaries = boundaries
+                        walked[0], walked[1], num_walked = ceil, floor, 2
                 else:
                     # stop the loop if all boundaries have been proceeded.
-                    for b in boundaries:
-                        if b.line.until < until:
-                            break
-                    else:
+                    if ceil.line.until >= until and floor.line.until >= until:
                         break
                     # choose the next boundary.
-                    boundary = boundaries[0]
-                    for b in boundaries:
-                        if b.line.until < boundary.line.until:
-                            boundary = b
-                    boundary.walk()
-                    walked_boundaries = [boundary]
+                    if floor.line.until < ceil.line.until:
+                        boundary = floor
+                    else:
+                        boundary = ceil
+                    EDGE_WALK(boundary)
+                    walked[0], num_walked = boundary, 1
                 # calculate velocity.
                 if not bounded:
-                    velocity = sum(velocities)
+                    velocity = TOTAL(positive) + TOTAL(negative)
                 elif overlapped:
-                    velocity = bound.best(sum(velocities),
-                                          bound.line.velocity())
+                    velocity = BEST(bound.direction,
+                                    TOTAL(positive) + TOTAL(negative),
+                                    LINE_VELOCITY(&bound.line))
+                elif bound == ceil:
+                    # only the velocities toward the range.
+                    velocity = TOTAL(negative)
                 else:
-                    velocity = sum(v for v in velocities if bound.cmp(v, 0))
+                    velocity = TOTAL(positive)
                 # is still bound?
-                if overlapped and bound.cmp(velocity, bound.line.velocity()):
+                if overlapped and CMP(bound.direction, velocity,
+                                      LINE_VELOCITY(&bound.line)):
                     bounded, overlapped = False, False
                     again = True
                     continue
                 # current value line.
-                line = Line(LN_RAY, since, until, value, velocity)
+                line = LINE(LN_RAY, since, until, value, velocity)
                 if overlapped:
                     bound_until = min(bound.line.until, until)
                     if bound_until == +INF:
                         break
                     # released from the boundary.
                     since = bound_until
-                    ok, value = bound.line._get(bound_until)
+                    ok, value = LINE_GET(&bound.line, bound_until)
                     assert ok
                     self._determine(since, value)
                     continue
-                for boundary in walked_boundaries:
+                for y in range(num_walked):
+                    boundary = walked[y]
                     # find the intersection with a boundary.
-                    ok, intersection = line._intersect(boundary.line)
+                    ok, intersection = LINE_INTERSECT(&line, &boundary.line)
                     if not ok:
                         continue
                     if intersection[TIME] == since:
@@ -194,24 +800,26 @@ cdef class Determination(list):
                     bound, bounded, overlapped = boundary, True, True
                     since, value = intersection
                     # clamp by the boundary.
-                    ok, boundary_value = boundary.line._guess(since)
+                    ok, boundary_value = LINE_GUESS(&boundary.line, since)
                     assert ok
-                    value = boundary.best(value, boundary_value)
+                    value = BEST(boundary.direction, value, boundary_value)
                     self._determine(since, value)
                     break
                 if bounded:
                     continue  # the intersection was found.
-                for boundary in walked_boundaries:
+                for y in range(num_walked):
+                    boundary = walked[y]
                     # find missing intersection caused by floating-point
                     # inaccuracy.
                     bound_until = min(boundary.line.until, until)
                     if bound_until == +INF or bound_until < since:
                         continue
-                    ok, boundary_value = boundary.line._get(bound_until)
+                    ok, boundary_value = LINE_GET(&boundary.line, bound_until)
                     assert ok
-                    ok, value_at_bound = line._get(bound_until)
+                    ok, value_at_bound = LINE_GET(&line, bound_until)
                     assert ok
-                    if boundary.cmp_eq(value_at_bound, boundary_value):
+                    if CMP_EQ(boundary.direction,
+                              value_at_bound, boundary_value):
                         continue
                     bound, bounded, overlapped = boundary, True, True
                     since, value = bound_until, boundary_value
@@ -224,202 +832,117 @@ cdef class Determination(list):
             self._determine(until, value, in_range=not bounded or overlapped)
             # prepare the next iteration.
             if method == EV_ADD:
-                velocities.append(momentum.velocity)
+                ADD_VELOCITY(&positive, &negative, momentum.velocity)
             elif method == EV_REMOVE:
-                velocities.remove(momentum.velocity)
+                REMOVE_VELOCITY(&positive, &negative, momentum.velocity)
             since = until
+        # all events have been walked.
+        self._next = len(events)
+        self._complete = True
+        PyMem_Free(self._sweep)
+        self._sweep = NULL
+        self._compact()
+
+    cdef Lines _boundary_lines(self):
+        """The lines of this determination as a boundary of the limited
+        gauges.  They are made once and shared by all the limited gauges.
+        """
+        cdef:
+            Lines lines
+            Py_ssize_t last
+            Py_ssize_t x
+        if self._lines is not None:
+            return self._lines
+        self._extend(+INF)
+        last = self._length - 1
+        lines = Lines(last + 1)
+        for x in range(last):
+            lines._append(LN_SEGMENT, self._times[x], self._times[x + 1],
+                          self._values[x], self._values[x + 1])
+        lines._append(LN_HORIZON, self._times[last], +INF, self._values[last])
+        self._lines = lines
+        return lines
 
 
 cdef class Line:
-    """An abstract class to represent lines between 2 times which start from
-    `value`.  Subclasses should describe where lines end.
-
-    .. note::
-
-       Each subclass must implement :meth:`_get`, :meth:`_earlier`,
-       :meth:`_later`, and :attr:`velocity` property.
-
+    """A line between 2 times which starts from `value`.  The type describes
+    where the line ends.  It wraps a :c:type:`LineData` struct which the
+    determination uses internally.
     """
 
-    cdef:
-        public int type
-        public double since
-        public double until
-        public double value
-        public double extra
+    cdef LineData _line
 
     def __cinit__(self, int type,
                   double since, double until, double value,
                   double extra=0):
         assert type in (LN_HORIZON, LN_RAY, LN_SEGMENT)
-        self.type = type
-        self.since = since
-        self.until = until
-        self.value = value
-        self.extra = extra
-
-    cdef (bint, (double, double)) _intersect(self, Line line):
-        """Gets the intersection with the given line.
-
-        :returns: (ok, (time, value))
-
-        """
-        cdef:
-            double time
-            double value
-            double since
-            double until
-            double velocity_delta
-            double intercept_delta
-            Line left
-            Line right
-        # right is more reliable.
-        if self.type < line.type:
-            left, right = self, line
-        else:
-            left, right = line, self
-        if math.isinf(right.velocity()):
-            # right is almost vertical.
-            time = (right.since + right.until) / 2
-        else:
-            velocity_delta = left.velocity() - right.velocity()
-            if velocity_delta == 0:
-                # parallel line given.
-                return (False, (0, 0))
-            intercept_delta = right.intercept() - left.intercept()
-            time = intercept_delta / velocity_delta
-        since = max(left.since, right.since)
-        until = min(left.until, right.until)
-        if not since <= time <= until:
-            # intersection not in the time range.
-            return (False, (0, 0))
-        ok, value = left._get(time)
-        if not ok:
-            return (False, (0, 0))
-        return (True, (time, value))
+        self._line = LINE(type, since, until, value, extra)
+
+    property type:
+        def __get__(self):
+            return self._line.type
+        def __set__(self, int type):
+            self._line.type = type
+
+    property since:
+        def __get__(self):
+            return self._line.since
+        def __set__(self, double since):
+            self._line.since = since
+
+    property until:
+        def __get__(self):
+            return self._line.until
+        def __set__(self, double until):
+            self._line.until = until
+
+    property value:
+        def __get__(self):
+            return self._line.value
+        def __set__(self, double value):
+            self._line.value = value
+
+    property extra:
+        def __get__(self):
+            return self._line.extra
+        def __set__(self, double extra):
+            self._line.extra = extra
 
     def intersect(self, Line line):
         cdef bint ok
         cdef (double, double) intersection
-        ok, intersection = self._intersect(line)
+        ok, intersection = LINE_INTERSECT(&self._line, &line._line)
         if not ok:
             raise ValueError('intersection not available')
         return intersection
 
     cpdef double intercept(self):
         """Gets the value-intercept. (Y-intercept)"""
-        return self.value - self.velocity() * self.since
-
-    cdef (bint, double) _get(self, double at):
-        if not self.since <= at <= self.until:
-            return False, 0
-        if self.type == LN_HORIZON:
-            return self._get_horizon(at)
-        elif self.type == LN_RAY:
-            return self._get_ray(at)
-        elif self.type == LN_SEGMENT:
-            return self._get_segment(at)
-        assert 0
+        return LINE_INTERCEPT(&self._line)
 
     def get(self, double at):
         """Returns the value at the given time."""
         cdef bint ok
         cdef double value
-        ok, value = self._get(at)
+        ok, value = LINE_GET(&self._line, at)
         if not ok:
             raise ValueError('out of the time range: {0:.2f}~{1:.2f}'
-                             ''.format(self.since, self.until))
+                             ''.format(self._line.since, self._line.until))
         return value
 
-    cdef (bint, double) _guess(self, double at):
+    def guess(self, double at):
         """Returns the value at the given time even the time it out of the time
         range.
         """
-        if at < self.since:
-            if self.type == LN_HORIZON:
-                return self._earlier_horizon(at)
-            elif self.type == LN_RAY:
-                return self._earlier_ray(at)
-            elif self.type == LN_SEGMENT:
-                return self._earlier_segment(at)
-        elif at > self.until:
-            if self.type == LN_HORIZON:
-                return self._later_horizon(at)
-            elif self.type == LN_RAY:
-                return self._later_ray(at)
-            elif self.type == LN_SEGMENT:
-                return self._later_segment(at)
-        else:
-            return self._get(at)
-        assert 0
-
-    def guess(self, double at):
         cdef bint ok
         cdef double value
-        ok, value = self._guess(at)
+        ok, value = LINE_GUESS(&self._line, at)
         if not ok:
             raise AssertionError('unexpected failure')
         return value
 
     cpdef double velocity(self):
-        if self.type == LN_HORIZON:
-            return self._velocity_horizon()
-        elif self.type == LN_RAY:
-            return self._velocity_ray()
-        elif self.type == LN_SEGMENT:
-            return self._velocity_segment()
-        assert 0
-
-    # HORIZON
-
-    cdef inline (bint, double) _get_horizon(self, double at):
-        return True, self.value
-
-    cdef inline (bint, double) _earlier_horizon(self, double at):
-        return True, self.value
-
-    cdef inline (bint, double) _later_horizon(self, double at):
-        return True, self.value
-
-    cdef inline double _velocity_horizon(self):
-        return 0
-
-    # RAY
-
-    cdef inline (bint, double) _get_ray(self, double at):
-        cdef double velocity = self.extra
-        cdef double value = self.value + velocity * (at - self.since)
-        return True, value
-
-    cdef inline (bint, double) _earlier_ray(self, double at):
-        return True, self.value
-
-    cdef inline (bint, double) _later_ray(self, double at):
-        return self._get(self.until)
-
-    cdef inline double _velocity_ray(self):
-        return self.extra
-
-    # SEGMENT
-
-    cdef inline (bint, double) _get_segment(self, double at):
-        cdef double value
-        cdef double final = self.extra
-        value = SEGMENT_VALUE(at, self.since, self.until, self.value, final)
-        return True, value
-
-    cdef inline (bint, double) _earlier_segment(self, double at):
-        return True, self.value
-
-    cdef inline (bint, double) _later_segment(self, double at):
-        cdef double final = self.extra
-        return True, final
-
-    cdef inline double _velocity_segment(self):
-        cdef double final = self.extra
-        return SEGMENT_VELOCITY(self.since, self.until, self.value, final)
-
-    # __repr__
+        return LINE_VELOCITY(&self._line)
 
     def __repr__(self):
         cdef str string
@@ -448,29 +971,43 @@ cpdef Line Segment(double since, double until, double value, double final):
 
 
 cdef class Boundary:
+    """A cursor on the lines of a boundary.  The direction is the ceil if
+    `cmp` is :func:`operator.lt` or the floor if it is :func:`operator.gt`.
+    """
 
     cdef:
         public Line line
-        public lines_iter
-        public cmp
-        public best
+        public list lines
+        public Py_ssize_t index
+        Direction _direction
 
-    def __init__(self, list lines, cmp=operator.lt):
+    def __init__(self, list lines, cmp=operator.lt, Py_ssize_t index=0):
         assert cmp in [operator.lt, operator.gt]
-        self.lines_iter = iter(lines)
-        self.cmp = cmp
-        self.best = {operator.lt: min, operator.gt: max}[cmp]
+        self.lines = lines
+        self.index = index - 1
+        self._direction = CEIL if cmp is operator.lt else FLOOR
         self.walk()
 
+    @property
+    def cmp(self):
+        return operator.lt if self._direction == CEIL else operator.gt
+
+    @property
+    def best(self):
+        return min if self._direction == CEIL else max
+
     cpdef walk(self):
         """Choose the next line."""
-        self.line = next(self.lines_iter)
+        if self.index + 1 >= len(self.lines):
+            raise StopIteration
+        self.index += 1
+        self.line = self.lines[self.index]
 
     cpdef bint cmp_eq(self, double x, double y):
-        return x == y or self.cmp(x, y)
+        return CMP_EQ(self._direction, x, y)
 
     cpdef bint cmp_inv(self, double x, double y):
-        return x != y and not self.cmp(x, y)
+        return x != y and not CMP(self._direction, x, y)
 
     def __repr__(self):
         return '<{0} line={1}, cmp={2}>'.format(CLASS_NAME(self),
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+   gauge.registry
+   ~~~~~~~~~~~~~~
+
+   Keeps many gauges by keys to checkpoint only the changed ones.
+
+   :copyright: (c) 2013-2017 by What! Studio
+   :license: BSD, see LICENSE for more details.
+
+"""
+from __future__ import absolute_import
+
+from operator import methodcaller
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+__all__ = ['GaugeRegistry']
+
+
+def stamp(gauge):
+    """The numbers of the changes of the gauge and its limit gauges.  The
+    encoding of a gauge includes its limit gauges.
+    """
+    max_gauge, min_gauge = gauge.max_gauge, gauge.min_gauge
+    return (gauge.changes,
+            None if max_gauge is None else stamp(max_gauge),
+            None if min_gauge is None else stamp(min_gauge))
+
+
+class GaugeRegistry(MutableMapping):
+    """A mapping of keys to gauges which collects the changes since the last
+    checkpoint::
+
+       registry = GaugeRegistry()
+       registry['stamina'] = stamina
+       registry['life'] = life
+       while True:
+          for key, data in registry.collect_dirty().items():
+             if data is None:
+                storage.delete(key)
+             else:
+                storage.put(key, data)
+          time.sleep(5)
+
+    :param encode: the function to serialize a gauge.
+                   (default: :meth:`gauge.Gauge.to_bytes`)
+    """
+
+    def __init__(self, gauges=(), encode=None):
+        self._gauges = {}
+        #: The stamps of the gauges at the last collection by the keys.
+        self._stamps = {}
+        #: The keys removed since the last collection.
+        self._removed = set()
+        self.encode = methodcaller('to_bytes') if encode is None else encode
+        self.update(gauges)
+
+    def __getitem__(self, key):
+        return self._gauges[key]
+
+    def __setitem__(self, key, gauge):
+        if gauge is not self._gauges.get(key):
+            # a gauge not registered yet has never been collected here.
+            self._stamps.pop(key, None)
+        self._gauges[key] = gauge
+        self._removed.discard(key)
+
+    def __delitem__(self, key):
+        del self._gauges[key]
+        self._stamps.pop(key, None)
+        self._removed.add(key)
+
+    def __iter__(self):
+        return iter(self._gauges)
+
+    def __len__(self):
+        return len(self._gauges)
+
+    def dirty_keys(self):
+        """The keys of the gauges changed since the last collection."""
+        stamps = self._stamps
+        return [key for key, gauge in self._gauges.items()
+                if stamp(gauge) != stamps.get(key)]
+
+    def collect_dirty(self):
+        """Serializes only the gauges changed since the last collection.  A
+        gauge is changed also when one of its limit gauges is changed.  The
+        collection doesn't affect the other collectors of the same gauges.
+
+        :returns: a dictionary of the keys to the serialized gauges.  The
+                  removed keys are mapped to ``None``.
+        """
+        encode, stamps = self.encode, self._stamps
+        collected = dict.fromkeys(self._removed)
+        for key, gauge in self._gauges.items():
+            gauge_stamp = stamp(gauge)
+            if gauge_stamp != stamps.get(key):
+                collected[key] = encode(gauge)
+                stamps[key] = gauge_stamp
+        self._removed.clear()
+        return collected
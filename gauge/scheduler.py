@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+   gauge.scheduler
+   ~~~~~~~~~~~~~~~
+
+   Calls back when gauges reach the watched values instead of polling them.
+
+   :copyright: (c) 2013-2017 by What! Studio
+   :license: BSD, see LICENSE for more details.
+
+"""
+from __future__ import absolute_import
+
+from heapq import heapify, heappop, heappush
+import itertools
+from time import time as now
+import weakref
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+__all__ = ['Scheduler', 'AsyncioScheduler', 'Watch', 'wait_until']
+
+
+def now_or(at=None):
+    return now() if at is None else float(at)
+
+
+def crossing(gauge, value, since):
+    """Finds the first time not earlier than `since` when the gauge reaches
+    the value.
+
+    :returns: the time or ``None`` if the gauge will not reach the value.
+    """
+    since = max(since, gauge.base[0])
+    if gauge.get(since) == value:
+        return since
+    for time in gauge.whenever(value):
+        if time >= since:
+            return time
+
+
+class Watch(object):
+    """A watch registered by :meth:`Scheduler.watch`."""
+
+    __slots__ = ('gauge', 'value', 'callback', 'since', 'time')
+
+    def __init__(self, gauge, value, callback, since):
+        self.gauge = gauge
+        self.value = value
+        self.callback = callback
+        self.since = since
+        #: The next crossing time.  ``None`` if the gauge will not reach the
+        #: value.
+        self.time = None
+
+    def __repr__(self):
+        return '<{0} {1!r} reaches {2} at {3}>'.format(
+            type(self).__name__, self.gauge, self.value, self.time)
+
+
+class Scheduler(object):
+    """Calls back when gauges reach the watched values::
+
+       scheduler = Scheduler()
+       scheduler.watch(stamina, stamina.get_max(), on_stamina_full)
+       while True:
+          scheduler.run_pending()
+          time.sleep(scheduler.next_time() - time.time())
+
+    The crossing times of all watches are kept in a heap so the earliest one
+    is found at once.  A change of a watched gauge or of its limit gauges
+    makes the watches on it scheduled again.  A watch is called back only
+    once.
+    """
+
+    def __init__(self):
+        #: A heap of ``(time, sequence, watch)``.  The entries of
+        #: rescheduled or removed watches are skipped when popped.
+        self._heap = []
+        self._sequence = itertools.count()
+        #: The watches by the watched gauges.
+        self._watches = {}
+        #: The limit gauges which each watched gauge depends on including
+        #: itself.
+        self._subscriptions = {}
+        #: The watched gauges which depend on each subscribed gauge.
+        self._dependents = {}
+        #: The watched gauges which have been invalidated.
+        self._stale = set()
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def watch(self, gauge, value, callback, since=None):
+        """Registers a watch.  The callback is called with the gauge, the
+        value and the time when the gauge reaches the value.
+
+        :param gauge: the gauge to watch.
+        :param value: the goal value.
+        :param callback: the function to call back.
+        :param since: the time to watch from.  (default: now)
+
+        :returns: a :class:`Watch` object.  Use this to remove the watch by
+                  :meth:`unwatch`.
+        """
+        watch = Watch(gauge, value, callback, now_or(since))
+        try:
+            self._watches[gauge].add(watch)
+        except KeyError:
+            self._watches[gauge] = set([watch])
+            self._subscribe(gauge)
+        self._length += 1
+        self._schedule(watch)
+        return watch
+
+    def unwatch(self, watch):
+        """Removes a watch.
+
+        :returns: whether the watch has been removed.  ``False`` if it has
+                  been called back or removed already.
+        """
+        gauge = watch.gauge
+        watches = self._watches.get(gauge)
+        if not watches or watch not in watches:
+            return False
+        watches.remove(watch)
+        watch.time = None
+        self._length -= 1
+        if not watches:
+            del self._watches[gauge]
+            self._stale.discard(gauge)
+            self._unsubscribe(gauge)
+        return True
+
+    def next_time(self):
+        """The earliest crossing time of the watches.  ``None`` if no watched
+        gauge will reach the value.
+        """
+        self._refresh()
+        heap = self._heap
+        while heap:
+            time, __, watch = heap[0]
+            if self._scheduled(watch, time):
+                return time
+            heappop(heap)
+
+    def run_pending(self, at=None):
+        """Calls back the watches which have been reached until the given
+        time in order.
+
+        :param at: the time to run until.  (default: now)
+
+        :returns: the number of the called back watches.
+        """
+        at = now_or(at)
+        count = 0
+        while True:
+            time = self.next_time()
+            if time is None or time > at:
+                break
+            __, __, watch = heappop(self._heap)
+            self.unwatch(watch)
+            watch.callback(watch.gauge, watch.value, time)
+            count += 1
+        return count
+
+    def gauge_invalidated(self, gauge):
+        """Called by the gauges when they are invalidated.  The watches are
+        scheduled again later because the gauge is in the middle of a change.
+        """
+        self._stale.update(self._dependents.get(gauge, ()))
+
+    def _schedule(self, watch):
+        watch.time = crossing(watch.gauge, watch.value, watch.since)
+        if watch.time is None:
+            return
+        heappush(self._heap, (watch.time, next(self._sequence), watch))
+        if len(self._heap) > 4 * self._length + 64:
+            # drop the skipped entries.
+            self._heap = [entry for entry in self._heap
+                          if self._scheduled(entry[2], entry[0])]
+            heapify(self._heap)
+
+    def _scheduled(self, watch, time):
+        """Whether a heap entry is the current schedule of the watch."""
+        return watch.time == time and \
+            watch in self._watches.get(watch.gauge, ())
+
+    def _refresh(self):
+        """Schedules the watches on the invalidated gauges again."""
+        while self._stale:
+            gauge = self._stale.pop()
+            # the limit gauges may have been replaced.
+            self._unsubscribe(gauge)
+            self._subscribe(gauge)
+            for watch in self._watches[gauge]:
+                self._schedule(watch)
+
+    def _subscribe(self, gauge):
+        """Subscribes the invalidations of the gauge and its limit gauges."""
+        subscriptions = []
+        limit_gauges = [gauge]
+        while limit_gauges:
+            limit_gauge = limit_gauges.pop()
+            if limit_gauge in subscriptions:
+                continue
+            subscriptions.append(limit_gauge)
+            try:
+                self._dependents[limit_gauge].add(gauge)
+            except KeyError:
+                self._dependents[limit_gauge] = set([gauge])
+                limit_gauge._add_watcher(self)
+            for deeper in [limit_gauge.max_gauge, limit_gauge.min_gauge]:
+                if deeper is not None:
+                    limit_gauges.append(deeper)
+        self._subscriptions[gauge] = subscriptions
+
+    def _unsubscribe(self, gauge):
+        for limit_gauge in self._subscriptions.pop(gauge, ()):
+            dependents = self._dependents[limit_gauge]
+            dependents.discard(gauge)
+            if not dependents:
+                del self._dependents[limit_gauge]
+                limit_gauge._discard_watcher(self)
+
+
+class AsyncioScheduler(Scheduler):
+    """A scheduler which calls back on time in an :mod:`asyncio` event loop.
+
+    :param loop: the event loop.  (default: the current event loop)
+    """
+
+    def __init__(self, loop=None):
+        if asyncio is None:
+            raise ImportError('asyncio is required')
+        super(AsyncioScheduler, self).__init__()
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        # the event loop may keep the scheduler in a callback.
+        self._loop = weakref.ref(loop)
+        self._timer = None
+        self._waking = False
+
+    @property
+    def loop(self):
+        return self._loop()
+
+    def watch(self, gauge, value, callback, since=None):
+        watch = super(AsyncioScheduler, self).watch(gauge, value, callback,
+                                                    since=since)
+        self._wake_soon()
+        return watch
+
+    def unwatch(self, watch):
+        removed = super(AsyncioScheduler, self).unwatch(watch)
+        if removed:
+            self._wake_soon()
+        return removed
+
+    def gauge_invalidated(self, gauge):
+        super(AsyncioScheduler, self).gauge_invalidated(gauge)
+        if self._stale:
+            self._wake_soon()
+
+    def _wake_soon(self):
+        if not self._waking:
+            self._waking = True
+            self.loop.call_soon(self._wake)
+
+    def _wake(self):
+        """Calls back the reached watches and sets the timer to the next
+        crossing time.
+        """
+        self._waking = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.run_pending()
+        time = self.next_time()
+        if time is not None:
+            self._timer = self.loop.call_later(max(0, time - now()),
+                                               self._wake)
+
+
+#: The schedulers of :func:`wait_until` by the event loops.
+_schedulers = weakref.WeakKeyDictionary()
+
+
+def wait_until(gauge, value, loop=None):
+    """Makes a future which is done when the gauge reaches the given value.
+    See :meth:`gauge.Gauge.wait_until`.
+    """
+    if asyncio is None:
+        raise ImportError('asyncio is required')
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    try:
+        scheduler = _schedulers[loop]
+    except KeyError:
+        scheduler = _schedulers[loop] = AsyncioScheduler(loop)
+    future = loop.create_future()
+
+    def reached(gauge, value, time):
+        if not future.done():
+            future.set_result(time)
+
+    def done(future):
+        if future.cancelled():
+            scheduler.unwatch(watch)
+
+    watch = scheduler.watch(gauge, value, reached)
+    future.add_done_callback(done)
+    return future
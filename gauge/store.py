@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+   gauge.store
+   ~~~~~~~~~~~
+
+   Persists gauges by keys into SQLite and keeps only the recently used ones
+   in memory.
+
+   :copyright: (c) 2013-2017 by What! Studio
+   :license: BSD, see LICENSE for more details.
+
+"""
+from __future__ import absolute_import
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import sqlite3
+import weakref
+
+from gauge.core import Gauge
+
+
+__all__ = ['GaugeStore']
+
+
+#: The number of keys in a query.  SQLite limits the number of variables.
+CHUNK_SIZE = 500
+
+
+def chunks(keys):
+    keys = list(keys)
+    for x in range(0, len(keys), CHUNK_SIZE):
+        yield keys[x:x + CHUNK_SIZE]
+
+
+@contextmanager
+def transaction(connection):
+    """Runs the statements in a transaction.  The queries in it read the same
+    snapshot.  It joins the transaction in progress if there is.
+    """
+    if getattr(connection, 'in_transaction', False):
+        yield
+        return
+    connection.execute('BEGIN')
+    done = False
+    try:
+        yield
+        done = True
+    finally:
+        if done:
+            connection.commit()
+        else:
+            connection.rollback()
+
+
+class GaugeStore(object):
+    """Persists gauges by keys into an SQLite database::
+
+       store = GaugeStore('gauges.db', capacity=10000)
+       store['stamina'] = Gauge(10, 10)
+       store['life'] = Gauge(100, store['max_life'])
+       ...
+       stamina = store['stamina']
+       stamina.decr(1)
+       store.flush()
+
+    The gauges are encoded by :meth:`gauge.Gauge.to_bytes`.  The limit
+    gauges are not encoded in the limited gauges.  They should be in the
+    store too and are stored as their keys.  They are loaded together with
+    the limited gauges.
+
+    At most `capacity` gauges are kept in memory.  The least recently used
+    gauges are evicted and written back if they have been changed.  A loaded
+    gauge is never loaded twice while it is alive.  An evicted gauge which is
+    still referred to is kept by the store again when it is changed until the
+    change is written by :meth:`flush` or the next eviction.
+
+    :param database: the path to the database file or an
+                     :class:`sqlite3.Connection`.  (default: in memory)
+    :param capacity: the maximum number of the gauges in memory.
+                     (default: 1024)
+    :param table: the name of the table.  (default: ``'gauges'``)
+    :param gauge_class: the class to decode the gauges.  (default:
+                        :class:`gauge.Gauge`)
+    """
+
+    def __init__(self, database=':memory:', capacity=1024, table='gauges',
+                 gauge_class=Gauge):
+        if isinstance(database, sqlite3.Connection):
+            self.connection = database
+        else:
+            self.connection = sqlite3.connect(database)
+        self.capacity = capacity
+        self.table = table
+        self.gauge_class = gauge_class
+        #: The recently used gauges by the keys in order.
+        self._recent = OrderedDict()
+        #: All loaded gauges which are alive by the keys.
+        self._alive = weakref.WeakValueDictionary()
+        #: The keys of the loaded gauges.
+        self._keys = weakref.WeakKeyDictionary()
+        #: The numbers of the changes of the gauges when they were stored.
+        self._stored_changes = weakref.WeakKeyDictionary()
+        #: The evicted gauges which have been invalidated since they were
+        #: evicted.  They are kept until written back.
+        self._dirty = set()
+        with transaction(self.connection):
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS {0} ('
+                'id PRIMARY KEY, data BLOB NOT NULL, max_id, min_id'
+                ')'.format(table))
+
+    def __getitem__(self, key):
+        return self.load_many([key])[key]
+
+    def __setitem__(self, key, gauge):
+        self.save_many([(key, gauge)])
+
+    def __delitem__(self, key):
+        with transaction(self.connection):
+            cursor = self.connection.execute(
+                'DELETE FROM {0} WHERE id = ?'.format(self.table), (key,))
+        gauge = self._alive.pop(key, None)
+        self._recent.pop(key, None)
+        if gauge is not None:
+            del self._keys[gauge]
+            self._stored_changes.pop(gauge, None)
+            self._dirty.discard(gauge)
+        if not cursor.rowcount and gauge is None:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._alive:
+            return True
+        cursor = self.connection.execute(
+            'SELECT 1 FROM {0} WHERE id = ?'.format(self.table), (key,))
+        return cursor.fetchone() is not None
+
+    def __len__(self):
+        cursor = self.connection.execute(
+            'SELECT COUNT(*) FROM {0}'.format(self.table))
+        return cursor.fetchone()[0]
+
+    def get(self, key, default=None):
+        return self.load_many([key]).get(key, default)
+
+    def key_of(self, gauge):
+        """The key of the gauge.  ``None`` if the gauge is not in the
+        store.
+        """
+        return self._keys.get(gauge)
+
+    def load_many(self, keys):
+        """Loads the gauges in one transaction.  The limit gauges are loaded
+        together.
+
+        :returns: a dictionary of the keys to the gauges.  The keys not in the
+                  store are omitted.
+        """
+        loaded = {}
+        rows = {}
+        missing = set()
+        for key in keys:
+            gauge = self._alive.get(key)
+            if gauge is None:
+                missing.add(key)
+            else:
+                loaded[key] = gauge
+        with transaction(self.connection):
+            while missing:
+                referred = set()
+                for chunk in chunks(missing):
+                    cursor = self.connection.execute(
+                        'SELECT id, data, max_id, min_id FROM {0} '
+                        'WHERE id IN ({1})'.format(
+                            self.table, ', '.join('?' * len(chunk))), chunk)
+                    for row in cursor:
+                        rows[row[0]] = row[1:]
+                        referred.update(key for key in row[2:]
+                                        if key is not None)
+                missing = set(key for key in referred
+                              if key not in rows and key not in self._alive)
+        gauges = {}
+        for key in keys:
+            if key in rows:
+                loaded[key] = self._decode(key, rows, gauges)
+        for key in loaded:
+            self._use(key, loaded[key])
+        self._evict()
+        return loaded
+
+    def save_many(self, items):
+        """Saves the gauges by the keys in one transaction.  The limit gauges
+        should have been saved in the store.
+
+        :param items: ``(key, gauge)`` pairs or a dictionary.
+
+        :raises ValueError: a limit gauge is not in the store.
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        items = list(items)
+        # the limit gauges may be saved together.
+        self._write(items, dict((gauge, key) for key, gauge in items))
+        for key, gauge in items:
+            prev_gauge = self._alive.get(key)
+            if prev_gauge is not None and prev_gauge is not gauge:
+                del self._keys[prev_gauge]
+                self._stored_changes.pop(prev_gauge, None)
+                self._dirty.discard(prev_gauge)
+            prev_key = self._keys.get(gauge)
+            if prev_key is not None and prev_key != key:
+                # moved to the new key.
+                del self._alive[prev_key]
+                self._recent.pop(prev_key, None)
+            self._alive[key] = gauge
+            self._keys[gauge] = key
+            self._use(key, gauge)
+        self._evict()
+
+    def flush(self):
+        """Writes back all changed gauges in memory in one transaction.
+
+        :returns: the number of the written gauges.
+        """
+        items = [(key, gauge) for key, gauge in self._alive.items()
+                 if self._changed(gauge)]
+        self._write(items)
+        self._dirty.clear()
+        return len(items)
+
+    def close(self):
+        """Writes back the changed gauges and closes the database."""
+        self.flush()
+        self._recent.clear()
+        self.connection.close()
+
+    def _decode(self, key, rows, gauges):
+        """Decodes a gauge after its limit gauges."""
+        gauge = self._alive.get(key)
+        if gauge is not None:
+            return gauge
+        try:
+            return gauges[key]
+        except KeyError:
+            pass
+        data, max_id, min_id = rows[key]
+        limit_gauges = []
+        for limit_key in [max_id, min_id]:
+            if limit_key is None:
+                limit_gauges.append(None)
+            elif limit_key in rows or limit_key in self._alive:
+                limit_gauges.append(self._decode(limit_key, rows, gauges))
+            else:
+                raise KeyError(limit_key)
+        gauge = self.gauge_class.from_buffer(bytes(data), *limit_gauges)
+        # it is the same with the stored one.
+        self._stored_changes[gauge] = gauge.changes
+        gauges[key] = self._alive[key] = gauge
+        self._keys[gauge] = key
+        return gauge
+
+    def _encode(self, gauge, keys):
+        limit_keys = []
+        for limit_gauge in [gauge.max_gauge, gauge.min_gauge]:
+            if limit_gauge is None:
+                limit_keys.append(None)
+                continue
+            try:
+                limit_key = keys[limit_gauge]
+            except KeyError:
+                limit_key = self._keys.get(limit_gauge)
+            if limit_key is None:
+                raise ValueError('the limit gauge is not in the store: '
+                                 '{0!r}'.format(limit_gauge))
+            limit_keys.append(limit_key)
+        data = gauge.to_bytes(limit_gauges=False)
+        return (sqlite3.Binary(data),) + tuple(limit_keys)
+
+    def _changed(self, gauge):
+        """Whether the gauge has been changed since it was stored."""
+        return gauge.changes != self._stored_changes.get(gauge)
+
+    def _write(self, items, keys=None):
+        """Writes the gauges in one transaction.
+
+        :param keys: the keys of the gauges not registered yet.
+        """
+        if not items:
+            return
+        if keys is None:
+            keys = {}
+        changes = [gauge.changes for key, gauge in items]
+        rows = [(key,) + self._encode(gauge, keys) for key, gauge in items]
+        with transaction(self.connection):
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO {0} (id, data, max_id, min_id) '
+                'VALUES (?, ?, ?, ?)'.format(self.table), rows)
+        for (key, gauge), count in zip(items, changes):
+            self._stored_changes[gauge] = count
+            self._dirty.discard(gauge)
+
+    def _use(self, key, gauge):
+        """Marks the gauge as the most recently used."""
+        self._recent.pop(key, None)
+        self._recent[key] = gauge
+
+    def _evict(self):
+        """Evicts the least recently used gauges over the capacity and writes
+        back the changed ones at once with the dirty ones.
+        """
+        items = []
+        while len(self._recent) > self.capacity:
+            key, gauge = self._recent.popitem(last=False)
+            # it may be changed while it is still referred to.
+            gauge._add_watcher(self)
+            items.append((key, gauge))
+        items.extend((self._keys[gauge], gauge) for gauge in self._dirty)
+        self._write([(key, gauge) for key, gauge in items
+                     if self._changed(gauge)])
+        self._dirty.clear()
+
+    def gauge_invalidated(self, gauge):
+        """Called by an evicted gauge when it is invalidated.  The gauge is
+        kept until it is written back because it may have been changed.
+        """
+        key = self._keys.get(gauge)
+        if key is not None and key not in self._recent:
+            self._dirty.add(gauge)
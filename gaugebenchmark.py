@@ -4,9 +4,11 @@ try:
 except ImportError:
     import pickle
 from random import Random
+import sys
 
 import pytest
 
+import gauge
 from gauge import CLAMP, Gauge
 from gauge.deterministic import Determination
 
@@ -41,8 +43,51 @@ def test_pickle_load(benchmark, pickle_protocol, g):
     benchmark(lambda: pickle.loads(d))
 
 
+@pytest.fixture(scope='module', params=[100, 1000])
+def hyper_g(request):
+    length = request.param
+    max_g = Gauge(10, 20, at=0)
+    g = Gauge(0, max_g, at=0)
+    for x in range(length):
+        add_random_momentum(max_g)
+        add_random_momentum(g)
+    return g
+
+
+def test_pickle_load_and_get(benchmark, hyper_g):
+    d = pickle.dumps(hyper_g, pickle.HIGHEST_PROTOCOL)
+    benchmark(lambda: pickle.loads(d).get(500))
+
+
+def test_warm_pickle_load_and_get(benchmark, hyper_g):
+    with gauge.warm_pickling():
+        d = pickle.dumps(hyper_g, pickle.HIGHEST_PROTOCOL)
+    benchmark(lambda: pickle.loads(d).get(500))
+
+
+def test_to_bytes(benchmark, g):
+    benchmark(g.to_bytes)
+
+
+def test_from_buffer(benchmark, g):
+    data = memoryview(g.to_bytes())
+    benchmark(lambda: Gauge.from_buffer(data))
+
+
 def test_determination(benchmark, g):
-    benchmark(lambda: Determination(g))
+    # a determination is resolved lazily.  Resolve the whole one.
+    benchmark(lambda: len(Determination(g)))
+
+
+def test_determination_memory(benchmark, g):
+    # a complete determination keeps only the points and the sparse
+    # checkpoints.
+    def determine():
+        determination = Determination(g)
+        len(determination)
+        return determination
+    determination = benchmark(determine)
+    assert sys.getsizeof(determination) <= 256 + 48 * len(determination)
 
 
 def test_incr(benchmark, g):
@@ -62,3 +107,480 @@ def test_add_momentum(benchmark, g):
 def test_get(benchmark, g):
     g.determination
     benchmark(lambda: g.get(r.randrange(1000)))
+
+
+def test_get_1000_times(benchmark, g):
+    times = [r.randrange(1000) for x in range(1000)]
+    g.determination
+    benchmark(lambda: [g.get(t) for t in times])
+
+
+def test_get_many_1000_times(benchmark, g):
+    numpy = pytest.importorskip('numpy')
+    times = numpy.array([r.randrange(1000) for x in range(1000)], dtype=float)
+    g.determination
+    benchmark(lambda: g.get_many(times))
+
+
+@pytest.fixture(scope='module', params=[10, 100, 1000])
+def long_g(request):
+    length = request.param
+    g = Gauge(0, 10, at=0)
+    for x in range(length):
+        g.add_momentum(r.uniform(-10, +10), since=x, until=x + 2)
+    return g
+
+
+def test_add_far_momentum(benchmark, long_g):
+    """Adds a momentum after the whole determination and redetermines."""
+    since = len(long_g.momenta) + 1
+
+    def add_far_momentum():
+        m = long_g.add_momentum(+1, since=since, until=since + 1)
+        long_g.determination
+        long_g.remove_momentum(m)
+        long_g.determination
+    benchmark(add_far_momentum)
+
+
+def test_get_now_with_future_momenta(benchmark, long_g):
+    """Reads the first part after adding a momentum.  Only the part until the
+    time should be determined.
+    """
+    def add_momentum_and_get():
+        m = long_g.add_momentum(+1, since=0, until=1)
+        long_g.get(0.5)
+        long_g.remove_momentum(m)
+        long_g.get(0.5)
+    benchmark(add_momentum_and_get)
+
+
+@pytest.fixture(scope='module', params=[10, 100, 1000])
+def buffed_g(request):
+    """A gauge affected by many momenta at the same time."""
+    length = request.param
+    g = Gauge(0, 1e9, -1e9, at=0)
+    for x in range(length):
+        since = r.uniform(0, 10)
+        g.add_momentum(r.uniform(-10, +10), since=since, until=since + 1000)
+    return g
+
+
+def test_determine_overlapping_momenta(benchmark, buffed_g):
+    benchmark(lambda: len(Determination(buffed_g)))
+
+
+@pytest.fixture(scope='module', params=[1000, 100000])
+def gauge_array(request):
+    pytest.importorskip('numpy')
+    from gauge.array import GaugeArray
+    size = request.param
+    a = GaugeArray([r.uniform(0, 10) for x in range(size)], max=10, at=0)
+    for x in range(3):
+        sinces = [r.randrange(1000) for y in range(size)]
+        untils = [since + 1 + r.randrange(1000) for since in sinces]
+        a.add_momentum([r.uniform(-10, +10) for y in range(size)],
+                       sinces, untils)
+    return a
+
+
+def test_gauge_array_get(benchmark, gauge_array):
+    benchmark(gauge_array.get, 500)
+
+
+def test_gauge_array_incr(benchmark, gauge_array):
+    benchmark(gauge_array.incr, 1, outbound=CLAMP, at=500)
+
+
+def test_read_1000_ticks(benchmark, long_g):
+    @benchmark
+    def read():
+        reader = long_g.reader()
+        for t in range(1000):
+            reader.get(t)
+
+
+def test_incr_and_get_regen(benchmark):
+    g = Gauge(0, 100, at=0)
+    g.add_momentum(+1)
+
+    @benchmark
+    def incr_and_get():
+        g.incr(0, at=10)
+        g.get(20)
+
+
+@pytest.fixture
+def fan_out():
+    max_ = Gauge(100, 1e9, at=0)
+    gauges = [Gauge(r.uniform(0, 100), max_, at=0) for x in range(100)]
+    for g in gauges:
+        g.add_momentum(+1)
+        g.get(0)
+    return max_, gauges
+
+
+@pytest.mark.parametrize('at', [10, None], ids=['same_time', 'now'])
+def test_reward_bundle(benchmark, fan_out, at):
+    max_, gauges = fan_out
+
+    @benchmark
+    def reward():
+        for x in range(5):
+            max_.incr(1, at=at)
+        for g in gauges:
+            g.get(at)
+
+
+@pytest.mark.parametrize('at', [10, None], ids=['same_time', 'now'])
+def test_reward_bundle_in_batch(benchmark, fan_out, at):
+    max_, gauges = fan_out
+
+    @benchmark
+    def reward():
+        with gauge.batch():
+            for x in range(5):
+                max_.incr(1, at=at)
+        for g in gauges:
+            g.get(at)
+
+
+@pytest.fixture(params=[False, True], ids=['eager', 'lazy'])
+def wide_fan_out(request):
+    max_ = Gauge(100, 1e9, at=0)
+    max_.lazy_rebase = request.param
+    gauges = [Gauge(r.uniform(0, 100), max_, at=0) for x in range(1000)]
+    for g in gauges:
+        g.add_momentum(+1)
+        g.get(0)
+    return max_, gauges
+
+
+def test_rebase_wide_limit_gauge(benchmark, wide_fan_out):
+    max_, gauges = wide_fan_out
+    benchmark(max_.incr, 1, at=10)
+
+
+def zigzag():
+    g = Gauge(1, Gauge(2, 3, 2, at=0), Gauge(1, 1, 0, at=0), at=0)
+    for x in range(6):
+        g.max_gauge.add_momentum(+1, since=x * 2, until=x * 2 + 1)
+        g.max_gauge.add_momentum(-1, since=x * 2 + 1, until=x * 2 + 2)
+        g.min_gauge.add_momentum(-1, since=x * 2, until=x * 2 + 1)
+        g.min_gauge.add_momentum(+1, since=x * 2 + 1, until=x * 2 + 2)
+    for x in range(3):
+        t = sum(y * 2 for y in range(x + 1))
+        g.add_momentum(+1, since=t, until=t + (x + 1))
+        g.add_momentum(-1, since=t + (x + 1), until=t + 2 * (x + 1))
+    return g.max_gauge, [g]
+
+
+def bidir():
+    g = Gauge(5, Gauge(10, 10, at=0), Gauge(0, 10, at=0), at=0)
+    g.add_momentum(+1, since=0, until=3)
+    g.add_momentum(-1, since=3, until=6)
+    g.add_momentum(+1, since=6, until=9)
+    g.add_momentum(-1, since=9, until=12)
+    g.max_gauge.add_momentum(-1, since=0, until=4)
+    g.max_gauge.add_momentum(+1, since=6, until=7)
+    g.min_gauge.add_momentum(+1, since=1, until=6)
+    g.min_gauge.add_momentum(-1, since=6, until=8)
+    return g.max_gauge, [g]
+
+
+def deep():
+    root = g = Gauge(100, 1e9, at=0)
+    gauges = []
+    for x in range(100):
+        g = Gauge(r.uniform(0, 100), g, at=0)
+        g.add_momentum(+1)
+        gauges.append(g)
+    return root, gauges
+
+
+def wide():
+    root = Gauge(100, 1e9, at=0)
+    gauges = [Gauge(r.uniform(0, 100), root, at=0) for x in range(1000)]
+    for g in gauges:
+        g.add_momentum(+1)
+    return root, gauges
+
+
+@pytest.fixture(params=[zigzag, bidir, deep, wide],
+                ids=['zigzag', 'bidir', 'deep', 'wide'])
+def hyper_graph(request):
+    root, gauges = request.param()
+    for g in gauges:
+        g.get(0)
+    return root, gauges
+
+
+def test_change_hyper_graph_root(benchmark, hyper_graph):
+    """Changes the root limit gauge which is not rebased.  The limited gauges
+    are not touched until they are observed.
+    """
+    root, gauges = hyper_graph
+
+    @benchmark
+    def change():
+        m = root.add_momentum(+1, since=100, until=101)
+        root.remove_momentum(m)
+
+
+def test_change_hyper_graph_root_and_read(benchmark, hyper_graph):
+    root, gauges = hyper_graph
+    leaf = gauges[-1]
+
+    @benchmark
+    def change_and_read():
+        m = root.add_momentum(+1, since=100, until=101)
+        root.remove_momentum(m)
+        leaf.get(10)
+
+
+@pytest.fixture(scope='module', params=[1000, 10000])
+def long_limited_g(request):
+    """A gauge limited by gauges which have thousands of segments."""
+    length = request.param
+    max_ = Gauge(10, 1e9, at=0)
+    min_ = Gauge(0, 10, -1e9, at=0)
+    for x in range(length):
+        max_.add_momentum(r.uniform(-1, +1), since=x, until=x + 1)
+        min_.add_momentum(r.uniform(-1, +1), since=x, until=x + 1)
+    g = Gauge(5, max_, min_, at=0)
+    for x in range(0, length, 10):
+        g.add_momentum(r.uniform(-10, +10), since=x, until=x + 10)
+    max_.determination
+    min_.determination
+    return g
+
+
+def test_determine_under_long_limit_gauges(benchmark, long_limited_g):
+    benchmark(lambda: len(Determination(long_limited_g)))
+
+
+@pytest.fixture(scope='module')
+def gauges_under_long_limit_gauge():
+    """Many gauges which share a limit gauge with thousands of segments."""
+    max_ = Gauge(10, 1e9, at=0)
+    for x in range(1000):
+        max_.add_momentum(r.uniform(-1, +1), since=x, until=x + 1)
+    gauges = [Gauge(r.uniform(0, 10), max_, at=r.uniform(0, 10))
+              for x in range(100)]
+    for g in gauges:
+        g.add_momentum(+1)
+    max_.determination
+    return gauges
+
+
+def test_determine_gauges_under_shared_limit_gauge(
+        benchmark, gauges_under_long_limit_gauge):
+    @benchmark
+    def determine():
+        for g in gauges_under_long_limit_gauge:
+            g.invalidate()
+            g.determination
+
+
+@pytest.fixture(params=['constant', 'gauge'])
+def mutated_g(request):
+    """A regenerating gauge limited by a constant or a gauge."""
+    if request.param == 'constant':
+        max_ = 100
+    else:
+        max_ = Gauge(100, 1e9, at=0)
+        max_.add_momentum(+1, since=0, until=1000)
+    g = Gauge(50, max_, at=0)
+    g.add_momentum(+1)
+    g.add_momentum(-0.5, since=0, until=1000)
+    g.get(0)
+    times = iter(range(1, 1000000))
+    return g, times
+
+
+def test_incr_per_call(benchmark, mutated_g):
+    g, times = mutated_g
+    benchmark(lambda: g.incr(1, CLAMP, at=next(times)))
+
+
+def test_decr_per_call(benchmark, mutated_g):
+    g, times = mutated_g
+    benchmark(lambda: g.decr(1, CLAMP, at=next(times)))
+
+
+def test_set_per_call(benchmark, mutated_g):
+    g, times = mutated_g
+    benchmark(lambda: g.set(50, CLAMP, at=next(times)))
+
+
+@pytest.fixture
+def crowded_g():
+    """A gauge under 1000 active momenta."""
+    g = Gauge(0, 1e9, -1e9, at=0)
+    for x in range(1000):
+        g.add_momentum(+0.001, since=0, until=1e9 + x)
+    g.get(0)
+    return g
+
+
+def test_apply_timed_operations(benchmark, crowded_g):
+    times = iter(range(1, 100000000, 100))
+
+    def apply_operations():
+        at = next(times)
+        crowded_g.apply([(at + x, 'incr', (1,)) for x in range(100)])
+
+    benchmark(apply_operations)
+
+
+@pytest.fixture
+def bucket():
+    """A regenerating rate limiter."""
+    g = Gauge(10, 10, at=0)
+    g.add_momentum(+1)
+    times = iter(range(1, 1000000))
+    return g, times
+
+
+def test_consume_by_get_and_decr(benchmark, bucket):
+    g, times = bucket
+
+    def consume():
+        at = next(times)
+        if g.get(at) >= 1:
+            g.decr(1, at=at)
+    benchmark(consume)
+
+
+def test_try_consume(benchmark, bucket):
+    g, times = bucket
+    benchmark(lambda: g.try_consume(1, at=next(times)))
+
+
+@pytest.fixture
+def scheduler_with_many_watches():
+    """A scheduler which watches 1000 regenerating gauges."""
+    from gauge.scheduler import Scheduler
+    scheduler = Scheduler()
+    gauges = []
+    for x in range(1000):
+        g = Gauge(x % 10, 100, at=0)
+        g.add_momentum(+1)
+        scheduler.watch(g, 100, lambda *args: None, since=0)
+        gauges.append(g)
+    return scheduler, gauges
+
+
+def test_reschedule_after_change(benchmark, scheduler_with_many_watches):
+    scheduler, gauges = scheduler_with_many_watches
+    times = iter(range(1, 1000000))
+
+    def change_and_reschedule():
+        at = next(times) / 1000.
+        gauges[int(at * 1000) % 1000].decr(1, CLAMP, at=at)
+        scheduler.next_time()
+    benchmark(change_and_reschedule)
+
+
+@pytest.fixture
+def charging_g():
+    """A gauge charging slowly through many momenta."""
+    g = Gauge(0, 100, at=0)
+    for x in range(1000):
+        g.add_momentum(+0.2 if x % 2 else -0.1, since=x, until=x + 1)
+    g.determination
+    return g
+
+
+def test_when_100_goals(benchmark, charging_g):
+    goals = [x / 2. for x in range(1, 101)]
+    benchmark(lambda: [charging_g.when(goal) for goal in goals])
+
+
+def test_when_many_100_goals(benchmark, charging_g):
+    goals = [x / 2. for x in range(1, 101)]
+    benchmark(lambda: charging_g.when_many(goals))
+
+
+def test_when_many_1000_goals_with_numpy(benchmark, charging_g):
+    numpy = pytest.importorskip('numpy')
+    goals = numpy.linspace(0, 50, 1000)
+    benchmark(lambda: charging_g.when_many(goals))
+
+
+@pytest.fixture(scope='module', params=[1000, 10000])
+def crowded_pickle(request):
+    g = Gauge(0, 10, at=0)
+    for x in range(request.param):
+        add_random_momentum(g)
+    return pickle.dumps(g, pickle.HIGHEST_PROTOCOL)
+
+
+def test_pickle_load_many_momenta(benchmark, crowded_pickle):
+    benchmark(lambda: pickle.loads(crowded_pickle))
+
+
+@pytest.fixture
+def registry():
+    from gauge.registry import GaugeRegistry
+    registry = GaugeRegistry()
+    for x in range(10000):
+        g = Gauge(0, 10, at=0)
+        add_random_momentum(g)
+        registry[x] = g
+    registry.collect_dirty()
+    return registry
+
+
+def test_checkpoint_all(benchmark, registry):
+    def checkpoint():
+        for x in range(0, 10000, 100):
+            registry[x].incr(1, CLAMP, at=1000)
+        return dict((key, g.to_bytes()) for key, g in registry.items())
+    benchmark(checkpoint)
+
+
+def test_checkpoint_dirty(benchmark, registry):
+    def checkpoint():
+        for x in range(0, 10000, 100):
+            registry[x].incr(1, CLAMP, at=1000)
+        return registry.collect_dirty()
+    benchmark(checkpoint)
+
+
+@pytest.fixture
+def store():
+    from gauge.store import GaugeStore
+    store = GaugeStore(capacity=100)
+    max_g = Gauge(10, 20, at=0)
+    store['max'] = max_g
+    gauges = []
+    for x in range(1000):
+        g = Gauge(0, max_g, at=0)
+        add_random_momentum(g)
+        gauges.append((x, g))
+    store.save_many(gauges)
+    return store
+
+
+def test_store_save_one_by_one(benchmark, store):
+    gauges = [(x, Gauge(0, 10, at=0)) for x in range(1000)]
+
+    def save():
+        for x, g in gauges:
+            store[x] = g
+    benchmark(save)
+
+
+def test_store_save_many(benchmark, store):
+    gauges = [(x, Gauge(0, 10, at=0)) for x in range(1000)]
+    benchmark(lambda: store.save_many(gauges))
+
+
+def test_store_load_one_by_one(benchmark, store):
+    # the gauges have been evicted.
+    benchmark(lambda: [store[x] for x in range(100, 1000)])
+
+
+def test_store_load_many(benchmark, store):
+    benchmark(lambda: store.load_many(range(100, 1000)))
@@ -3,10 +3,15 @@ from contextlib import contextmanager
 import gc
 import math
 import operator
+import os
 import pickle
 import random
 from random import Random
+import subprocess
+import sys
+import threading
 import time
+import weakref
 
 import pytest
 from pytest import approx
@@ -81,6 +86,18 @@ def test_momenta_in_range():
         (0, 12), (1, 12), (3, 14), (6, 14), (8, 12)]
 
 
+def test_overlapping_momenta():
+    g = Gauge(500, 1000, at=0)
+    for x in range(100):
+        g.add_momentum(+1, since=0, until=10)
+        g.add_momentum(-1, since=0, until=5)
+    g.add_momentum(-0.1, since=0, until=20)
+    assert g.determination == [(0, 500), (5, 499.5), (10, 999), (20, 998)]
+    assert g.velocity(at=7) == approx(99.9)
+    assert g.velocity(at=15) == -0.1
+    assert g.velocity(at=25) == 0
+
+
 def test_over_max():
     g = Gauge(8, 10, at=0)
     g.add_momentum(+1, since=0, until=4)
@@ -211,6 +228,213 @@ def test_clamp_outbound():
     assert g.get() == 96
 
 
+def test_outbound_with_limit_gauges():
+    max_g = Gauge(10, 100, at=0)
+    max_g.add_momentum(+1, since=0, until=10)
+    min_g = Gauge(0, 100, at=0)
+    g = Gauge(5, max_g, min_g, at=0)
+    g.add_momentum(+1)
+    # the limits are evaluated at the given time.
+    assert g.incr(100, outbound=CLAMP, at=5) == 15
+    with pytest.raises(ValueError):
+        g.incr(1, at=5)
+    assert g.set(20, outbound=CLAMP, at=10) == 20
+    with pytest.raises(ValueError):
+        g.set(-1, at=10)
+    assert g.decr(100, outbound=CLAMP, at=10) == 0
+    # out of the range.
+    g.set(50, outbound=OK, at=10)
+    assert not g.in_range(10)
+    with pytest.raises(ValueError):
+        g.incr(1, outbound=ONCE, at=10)
+    assert g.decr(1, outbound=ONCE, at=10) == 49
+    assert g.decr(100, outbound=CLAMP, at=10) == 0
+    assert g.in_range(10)
+    assert g.incr(1, outbound=ONCE, at=10) == 1
+    # a limited gauge is rebased together.
+    h = Gauge(0, g, at=10)
+    h.add_momentum(+1)
+    assert h.get(12) == 2
+    g.set(1, at=12)
+    assert h.get(12) == 1
+    assert h.get(15) == 4
+
+
+def test_rebase_resumes_determination():
+    g = Gauge(0, 100, at=0)
+    for x in range(10):
+        g.add_momentum(+1, since=x, until=x + 5)
+    g.add_momentum(-3, since=20)
+    g.incr(1, at=7)
+    # the expired momenta are removed.
+    assert len(g.momenta) == 9
+    resumed = list(g.determination)
+    g.invalidate()
+    assert list(g.determination) == resumed
+    # a partial redetermination before the rebase walks again from the base.
+    g.add_momentum(+1, since=3, until=8)
+    resumed = list(g.determination)
+    g.invalidate()
+    assert list(g.determination) == resumed
+    # the limits are changed.
+    g.set_max(Gauge(5, 5, at=8), at=8)
+    g.incr(0, at=9)
+    resumed = list(g.determination)
+    g.invalidate()
+    assert list(g.determination) == resumed
+
+
+def test_limit_change_rebases_limited_gauges():
+    # a limited gauge is rebased with the history of the limit gauge before
+    # its limits change.
+    g1 = Gauge(14, 20, 2, at=0)
+    g2 = Gauge(5.5, 10, 0, at=0)
+    g3 = Gauge(9.7, g2, 0, at=0)
+    g2.add_momentum(+1.8, since=0, until=6)
+    g2.set_max(7.6, at=6.5)
+    g2.set(0.1, CLAMP, at=11)
+    g1.forget_past(at=15)
+    g3.incr(0.8, CLAMP, at=19)
+    g2.set(5.3, CLAMP, at=25)
+    g2.set_min(-0.9, at=28)
+    assert g3.get(28) == approx(0.1)
+    assert g3.get(100) == approx(0.1)
+    # a chain of three gauges.
+    g1 = Gauge(11.6242, 20, 2, at=0)
+    g2 = Gauge(2.8528, 10, 0, at=0)
+    g3 = Gauge(1.5607, g2, 0, at=0)
+    g3.add_momentum(+1.7756, since=-4.399)
+    g2.add_momentum(+2.2649)
+    g3.set_max(g2, at=10.6141)
+    g1.set(2.9425, at=10.6141)
+    g2.set_max(g1, at=14.9534)
+    assert g3.get_max(20) == approx(2.9425)
+    assert g3.get(20) == approx(2.9425)
+    assert g3.get(100) == approx(2.9425)
+
+
+def test_replaced_limit_gauge_rebases_limited_gauges():
+    g1 = Gauge(9.66, 20, 2, at=0)
+    g2 = Gauge(9, 10, 0, at=0)
+    g3 = Gauge(5.37, g2, 0, at=0)
+    g3.set_min(1.96, at=4.38)
+    g3.set(4.88, CLAMP, at=6.17)
+    g2.add_momentum(+1.85, since=12.1)
+    g1.add_momentum(-1.41, since=10.42)
+    g1.forget_past(at=14.91)
+    g2.add_momentum(+2.39, since=23.14)
+    g3.set_min(-2.86, at=20)
+    # g3 is rebased with the history of g2 before the max gauge is replaced.
+    g2.set_max(g1, at=24.68)
+    assert g3.get_max(30) == 2
+    assert g3.get(30) == 2
+
+
+def test_apply():
+    def operations():
+        m = Momentum(-2, since=10, until=20)
+        return [
+            (0, 'add_momentum', (+1,)),
+            (2, 'incr', (3,)),
+            (3, 'add_momentum', (m,)),
+            (4, 'incr', (100,)),
+            (5, 'incr', (100, CLAMP)),
+            (12, 'decr', (1,)),
+            (12, 'remove_momentum', (m,)),
+            (15, 'set_max', (50,)),
+            (16, 'set', (60, OK)),
+            (30, 'forget_past'),
+        ]
+    g = Gauge(0, 10, at=0)
+    results = g.apply(operations())
+    h = Gauge(0, 10, at=0)
+    expected = []
+    for at, name, args in [op if len(op) == 3 else op + ((),)
+                           for op in operations()]:
+        method = getattr(h, name)
+        try:
+            if name == 'add_momentum' and not isinstance(args[0], Momentum):
+                expected.append(method(*args, since=at))
+            elif name.endswith('_momentum'):
+                expected.append(method(*args))
+            else:
+                expected.append(method(*args, at=at))
+        except ValueError as exc:
+            expected.append(exc)
+    # the failed operation doesn't stop the later ones.
+    assert isinstance(results[3], ValueError)
+    assert results[4] == 10
+    assert [type(r) for r in results] == [type(r) for r in expected]
+    assert [r for r in results if not isinstance(r, ValueError)] == \
+        [r for r in expected if not isinstance(r, ValueError)]
+    assert g.momenta == h.momenta
+    assert list(g.determination) == list(h.determination)
+    assert g.get(40) == 60
+    # a momentum added by an operation starts at the time.
+    assert g.momenta[0].since == 0
+    # invalid operations.
+    with pytest.raises(ValueError):
+        g.apply([(50, 'incr', (1,)), (40, 'incr', (1,))])
+    with pytest.raises(ValueError):
+        g.apply([(50, 'get', ())])
+    assert g.get(40) == 60
+
+
+def test_try_consume():
+    bucket = Gauge(3, 5, at=0)
+    bucket.add_momentum(+1)
+    assert bucket.try_consume(2, at=0) == (True, 0)
+    assert bucket.try_consume(2, at=0) == (False, 1)
+    assert bucket.get(0) == 1
+    assert bucket.try_consume(2, at=1) == (True, 1)
+    assert bucket.get(1) == 0
+    # more than the maximum.
+    assert bucket.try_consume(10, at=2) == (False, None)
+    # many buckets at once.
+    other = Gauge(1, 5, at=0)
+    other.add_momentum(+1, since=2)
+    assert gauge.try_consume_many([(bucket, 1), (other, 2)], at=2) == \
+        [(True, 2), (False, 3)]
+    assert bucket.get(2) == 0
+    assert other.get(2) == 1
+    # a limit gauge as the minimum.
+    floor = Gauge(2, 10, at=0)
+    floor.add_momentum(-1, since=0, until=2)
+    g = Gauge(5, 10, floor, at=0)
+    assert g.try_consume(4, at=0) == (False, None)
+    assert g.try_consume(4, at=2) == (True, 2)
+    assert g.get(2) == 1
+
+
+@pytest.mark.skipif(not hasattr(sys, 'setswitchinterval'),
+                    reason='the switch interval is not adjustable')
+def test_try_consume_in_threads():
+    def consume(bucket, consumed):
+        for x in range(50):
+            if bucket.try_consume(1, at=0)[0]:
+                consumed.append(x)
+    # switch threads as often as possible.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for x in range(5):
+            bucket = Gauge(100, 100, at=0)
+            for y in range(50):
+                bucket.add_momentum(+1, since=y, until=y + 1)
+            consumed = []
+            threads = [threading.Thread(target=consume,
+                                        args=(bucket, consumed))
+                       for y in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert len(consumed) == 100
+            assert bucket.get(0) == 0
+    finally:
+        sys.setswitchinterval(interval)
+
+
 def test_set_min_max():
     # without momentum
     g = Gauge(5, 10)
@@ -246,9 +470,327 @@ def test_pickle():
         since = r.randrange(1000)
         until = since + 1 + r.randrange(1000)
         g.add_momentum(r.uniform(-10, +10), since=since, until=until)
+    # duplicated and endless momenta.
+    g.add_momentum(+1, since=10, until=20)
+    g.add_momentum(+1, since=10, until=20)
+    g.add_momentum(-1, since=10)
     data = pickle.dumps(g)
     g2 = pickle.loads(data)
     assert g.determination == g2.determination
+    assert list(g.momenta) == list(g2.momenta)
+    assert g.momentum_events() == g2.momentum_events()
+
+
+def test_warm_pickling():
+    g = Gauge(12, 100, at=0)
+    g.add_momentum(+1, since=1, until=6)
+    g.add_momentum(-1, since=3, until=8)
+    g.set_max(Gauge(15, 15, at=0), at=0)
+    g.max_gauge.add_momentum(-1, until=5)
+    determination = list(g.determination)
+    # cold
+    g2 = pickle.loads(pickle.dumps(g))
+    assert g2._determination is None
+    # warm
+    with gauge.warm_pickling():
+        data = pickle.dumps(g)
+    g2 = pickle.loads(data)
+    assert g2._determination is not None
+    assert g2.max_gauge._determination is not None
+    assert g2.determination.complete
+    assert list(g2.determination) == determination
+    assert g2.determination.in_range_since == 0
+    assert g2.get(5) == 10
+    # the cache is discarded when the inputs are different.
+    restore_gauge, args = g.__reduce__()
+    with gauge.warm_pickling():
+        __, warm_args = g.__reduce__()
+    args = args[:2] + ([(+1, 1, 6)],) + args[3:]
+    g3 = restore_gauge(*(args + (warm_args[-1],)))
+    assert g3._determination is None
+    assert list(g3.determination) != determination
+    # the cache works as the determination.
+    g2.add_momentum(+1, since=8)
+    g.add_momentum(+1, since=8)
+    assert list(g2.determination) == list(g.determination)
+    g2.incr(1, at=9)
+    g.incr(1, at=9)
+    assert list(g2.determination) == list(g.determination)
+    # the context is not active in another thread.
+    with gauge.warm_pickling():
+        dumped = []
+        thread = threading.Thread(
+            target=lambda: dumped.append(pickle.dumps(g)))
+        thread.start()
+        thread.join()
+    assert pickle.loads(dumped[0])._determination is None
+
+
+def test_warm_pickling_in_another_process():
+    g = Gauge(12, 100, at=0)
+    g.add_momentum(+1, since=1, until=6)
+    g.set_max(Gauge(15, 15, at=0), at=0)
+    with gauge.warm_pickling():
+        data = pickle.dumps(g, protocol=2)
+    code = '\n'.join([
+        'import pickle, sys',
+        'stdin = getattr(sys.stdin, "buffer", sys.stdin)',
+        'g = pickle.loads(stdin.read())',
+        'print(g._determination is not None)',
+    ])
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    # the checksum doesn't depend on the hash seed.
+    for seed in ['1', '2']:
+        env['PYTHONHASHSEED'] = seed
+        process = subprocess.Popen([sys.executable, '-c', code], env=env,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE)
+        out, __ = process.communicate(data)
+        assert process.returncode == 0
+        assert out.strip() == b'True'
+
+
+def test_to_bytes():
+    g = Gauge(0, 10, at=1500000000)
+    r = Random(17171771)
+    for x in range(1000):
+        since = 1500000000 + r.randrange(1000)
+        until = since + 1 + r.randrange(1000)
+        g.add_momentum(r.uniform(-10, +10), since=since, until=until)
+    g.add_momentum(+1)
+    g.add_momentum(-1, until=1500000500)
+    data = g.to_bytes()
+    # the integer times are encoded in 32 bits.
+    assert len(data) == 40 + 1002 * 16
+    g2 = Gauge.from_buffer(memoryview(data))
+    assert g2.base == g.base
+    assert list(g2.momenta) == list(g.momenta)
+    assert g2.momentum_events() == g.momentum_events()
+    assert g.determination == g2.determination
+    # float times.
+    g.add_momentum(+1, since=1500000000.5, until=1500000001.5)
+    data2 = g.to_bytes()
+    assert len(data2) > len(data)
+    g2 = Gauge.from_buffer(data2)
+    assert list(g2.momenta) == list(g.momenta)
+    assert g.determination == g2.determination
+    # not a gauge.
+    with pytest.raises(ValueError):
+        Gauge.from_buffer(b'')
+    with pytest.raises(ValueError):
+        Gauge.from_buffer(b'XX' + data[2:])
+    with pytest.raises(ValueError):
+        Gauge.from_buffer(data[:-1])
+
+
+def test_to_bytes_hypergauge():
+    g = Gauge(12, 100, at=0)
+    g.add_momentum(+1, since=1, until=6)
+    g.add_momentum(-1, since=3, until=8)
+    g.set_range(Gauge(15, 15, at=0), Gauge(0, 10, at=0), at=0)
+    g.max_gauge.add_momentum(-1, until=5)
+    g.min_gauge.add_momentum(+1, since=7)
+    g2 = Gauge.from_buffer(g.to_bytes())
+    assert g2.determination == g.determination
+    assert g2.max_gauge.determination == [(0, 15), (5, 10)]
+    assert g2 in g2.max_gauge.limited_gauges()
+    assert g2 in g2.min_gauge.limited_gauges()
+    assert g2.get_min(9) == 2
+    # without the limit gauges.
+    data = g.to_bytes(limit_gauges=False)
+    assert len(data) < len(g.to_bytes())
+    with pytest.raises(ValueError):
+        Gauge.from_buffer(data)
+    with pytest.raises(ValueError):
+        Gauge.from_buffer(data, max_gauge=g.max_gauge)
+    g3 = Gauge.from_buffer(data, g.max_gauge, g.min_gauge)
+    assert g3.max_gauge is g.max_gauge
+    assert g3 in g.max_gauge.limited_gauges()
+    assert g3.determination == g.determination
+
+
+def test_to_bytes_shared_limit_gauge():
+    shared = Gauge(10, 10, at=0)
+    shared.add_momentum(-1, until=5)
+    g = Gauge(3, Gauge(8, shared, at=0), Gauge(0, shared, at=0), at=0)
+    g.add_momentum(+1)
+    data = g.to_bytes()
+    # the shared gauge is encoded once.
+    size = len(g.max_gauge.to_bytes())
+    assert len(data) == 40 + 16 + 4 + size + 4 + 40 + 4
+    g2 = Gauge.from_buffer(data)
+    assert g2.max_gauge.max_gauge is g2.min_gauge.max_gauge
+    assert g2.determination == g.determination
+    # the same gauge as both limits.
+    g = Gauge(3, shared, shared, at=0)
+    g2 = Gauge.from_buffer(g.to_bytes())
+    assert g2.max_gauge is g2.min_gauge
+    assert len(g2.max_gauge.limited_gauges()) == 1
+    # a reference to a gauge which has not been decoded.
+    data = bytearray(g.to_bytes())
+    data[-4:] = b'\x07\x00\x00\x00'
+    with pytest.raises(ValueError):
+        Gauge.from_buffer(data)
+
+
+def test_restore_unordered_momenta():
+    g = gauge.core.restore_gauge(Gauge, (0, 0), [(+1, 0, 5), (-1, 0, 3)],
+                                 10, None, 0, None)
+    assert [m.until for m in g.momenta] == [3, 5]
+    assert g.get(3) == 0
+    assert g.get(5) == 2
+
+
+def test_changes():
+    g = Gauge(0, 10, at=0)
+    for mutate in [lambda: g.incr(1, at=1),
+                   lambda: g.set(5, at=2),
+                   lambda: g.add_momentum(+1, since=3, until=4),
+                   lambda: g.remove_momentum(+1, since=3, until=4),
+                   lambda: g.set_max(20, at=5),
+                   lambda: g.forget_past(at=6),
+                   lambda: g.clear_momenta(at=7)]:
+        changes = g.changes
+        mutate()
+        assert g.changes > changes
+    # observing doesn't change a gauge.
+    changes = g.changes
+    g.get(10)
+    g.determination
+    g.when(5)
+    g.to_bytes()
+    assert g.changes == changes
+    # a rebase by a limit gauge changes the base of the limited gauge.
+    max_g = Gauge(10, 10, at=0)
+    g = Gauge(10, max_g, at=0)
+    changes, max_changes = g.changes, max_g.changes
+    max_g.decr(5, at=1)
+    assert max_g.changes > max_changes
+    assert g.changes > changes
+    # even if the rebase is applied lazily.
+    max_g.lazy_rebase = True
+    changes = g.changes
+    max_g.decr(1, at=2)
+    assert g.changes > changes
+
+
+def test_registry_collect_dirty():
+    from gauge.registry import GaugeRegistry
+    max_g = Gauge(10, 20, at=0)
+    registry = GaugeRegistry()
+    registry['a'] = Gauge(0, 10, at=0)
+    registry['b'] = Gauge(0, max_g, at=0)
+    registry['c'] = Gauge(0, 10, at=0)
+    collected = registry.collect_dirty()
+    assert sorted(collected) == ['a', 'b', 'c']
+    assert collected['a'] == registry['a'].to_bytes()
+    # nothing changed.
+    assert registry.collect_dirty() == {}
+    # only the changed gauges are collected.
+    other_registry = GaugeRegistry({'a': registry['a']})
+    assert list(other_registry.collect_dirty()) == ['a']
+    registry['a'].incr(1, at=1)
+    collected = registry.collect_dirty()
+    assert list(collected) == ['a']
+    assert Gauge.from_buffer(collected['a']).get(1) == 1
+    # a collection doesn't hide the change from another registry.
+    assert list(other_registry.collect_dirty()) == ['a']
+    # a change of a limit gauge is included in the limited gauge.
+    max_g.add_momentum(+1, since=2, until=3)
+    assert registry.dirty_keys() == ['b']
+    collected = registry.collect_dirty()
+    assert list(collected) == ['b']
+    assert Gauge.from_buffer(collected['b']).get_max(3) == 11
+    # removed and replaced keys.
+    del registry['c']
+    registry['a'] = Gauge(1, 10, at=0)
+    assert registry.collect_dirty() == {'a': registry['a'].to_bytes(),
+                                        'c': None}
+    assert len(registry) == 2
+    # a custom encoding.
+    registry = GaugeRegistry({'a': Gauge(0, 10, at=0)}, encode=pickle.dumps)
+    assert pickle.loads(registry.collect_dirty()['a']).get(0) == 0
+
+
+def test_store():
+    from gauge.store import GaugeStore
+    store = GaugeStore(capacity=2)
+    max_g = Gauge(10, 20, at=0)
+    store['max'] = max_g
+    g = Gauge(5, max_g, at=0)
+    g.add_momentum(+1, since=0, until=3)
+    store['g'] = g
+    # the limit gauge should be in the store.
+    with pytest.raises(ValueError):
+        store['h'] = Gauge(0, Gauge(10, 10, at=0), at=0)
+    assert 'h' not in store
+    # the limit gauges are stored as the keys.
+    rows = store.connection.execute(
+        'SELECT id, max_id, min_id FROM gauges ORDER BY id').fetchall()
+    assert rows == [('g', 'max', None), ('max', None, None)]
+    # a gauge alive is not loaded twice.
+    assert store['g'] is g
+    assert store.key_of(g) == 'g'
+    # evict.
+    store.save_many((x, Gauge(x, 10, at=0)) for x in range(10))
+    assert len(store) == 12
+    assert len(store._recent) == 2
+    del g, max_g
+    gc.collect()
+    g = store['g']
+    assert store.key_of(g) == 'g'
+    assert g.max_gauge is store['max']
+    assert g.get(10) == 8
+    assert not store._changed(g)
+    # the changed gauges are written back by eviction or flush.
+    store[1].incr(1, at=1)
+    store['max'].incr(5, at=1)
+    assert store._changed(g)
+    # another collector doesn't hide the changes from the store.
+    from gauge.registry import GaugeRegistry
+    assert list(GaugeRegistry({'g': g}).collect_dirty()) == ['g']
+    assert store.flush() == 3
+    assert store.flush() == 0
+    store.load_many(range(10))
+    # load by another store.
+    store2 = GaugeStore(store.connection)
+    g2 = store2['g']
+    assert g2.get_max(2) == 15
+    assert g2.max_gauge is store2['max']
+    assert store2[1].get(1) == 2
+    assert sorted(store2.load_many(['g', 'max', 'nope']).keys()) == \
+        ['g', 'max']
+    with pytest.raises(KeyError):
+        store2['nope']
+    del store2['g']
+    assert 'g' not in store2
+    with pytest.raises(KeyError):
+        del store2['g']
+    # a dangling limit gauge.
+    del store2['max']
+    store3 = GaugeStore(store.connection)
+    store3.connection.execute(
+        "INSERT INTO gauges VALUES ('h', ?, 'max', NULL)",
+        (g.to_bytes(limit_gauges=False),))
+    with pytest.raises(KeyError):
+        store3['h']
+    # a limit gauge saved together.
+    store4 = GaugeStore()
+    limit_g = Gauge(3, 3, at=0)
+    store4.save_many([('g', Gauge(0, limit_g, at=0)), (0, limit_g)])
+    assert store4.connection.execute(
+        "SELECT max_id FROM gauges WHERE id = 'g'").fetchone() == (0,)
+    # an evicted gauge changed while it is referred to.
+    store5 = GaugeStore(capacity=1)
+    store5['a'] = Gauge(1, 10, at=0)
+    g = store5['a']
+    store5['b'] = Gauge(2, 10, at=0)
+    assert 'a' not in store5._recent
+    g.incr(5, at=1)
+    del g
+    gc.collect()
+    assert store5['a'].get(1) == 6
 
 
 def test_make_momentum():
@@ -327,6 +869,135 @@ def test_whenever():
     assert g.when(7, after=1) == 5
 
 
+def test_when_many():
+    g = Gauge(0, 10, at=0)
+    g.add_momentum(+1)
+    g.add_momentum(-2, since=3, until=4)
+    g.add_momentum(-2, since=5, until=6)
+    g.add_momentum(-2, since=7, until=8)
+    assert g.when_many([3, 0, 10, 2, 11, 2.5, -1]) == \
+        [3, 0, 16, 2, None, 2.5, None]
+    assert g.when_many([]) == []
+    # the same as when().
+    goals = [x / 4. for x in range(-4, 48)]
+    for goal, at in zip(goals, g.when_many(goals)):
+        if at is None:
+            with pytest.raises(ValueError):
+                g.when(goal)
+        else:
+            assert at == g.when(goal)
+    # linear
+    g = Gauge(10, 10, at=0)
+    g.add_momentum(-1)
+    assert g.when_many([5, 0, 10, 11]) == [5, 10, 0, None]
+
+
+def test_when_many_with_numpy():
+    numpy = pytest.importorskip('numpy')
+    g = Gauge(0, 10, at=0)
+    g.add_momentum(+1, since=0, until=5)
+    g.add_momentum(-1, since=5)
+    at = g.when_many(numpy.array([4, 20, 5, 3]))
+    assert isinstance(at, numpy.ndarray)
+    assert list(at[[0, 2, 3]]) == [4, 5, 3]
+    assert numpy.isnan(at[1])
+
+
+def test_scheduler():
+    from gauge.scheduler import Scheduler
+    called = []
+
+    def callback(gauge, value, at):
+        called.append((gauge, value, at))
+
+    scheduler = Scheduler()
+    g = Gauge(0, 10, at=0)
+    g.add_momentum(+1)
+    h = Gauge(10, 10, at=0)
+    h.add_momentum(-2)
+    scheduler.watch(g, 10, callback, since=0)
+    scheduler.watch(g, 5, callback, since=0)
+    watch = scheduler.watch(h, 0, callback, since=0)
+    scheduler.watch(h, 100, callback, since=0)
+    assert len(scheduler) == 4
+    assert scheduler.next_time() == 5
+    assert scheduler.run_pending(at=4) == 0
+    assert scheduler.run_pending(at=5) == 2
+    assert called == [(g, 5, 5), (h, 0, 5)] or \
+        called == [(h, 0, 5), (g, 5, 5)]
+    assert not scheduler.unwatch(watch)
+    assert len(scheduler) == 2
+    # a change reschedules.
+    g.incr(3, at=6)
+    assert scheduler.next_time() == 7
+    g.add_momentum(-1, since=6, until=8)
+    assert scheduler.next_time() == 9
+    assert scheduler.run_pending(at=100) == 1
+    assert called[-1] == (g, 10, 9)
+    # never reaches.
+    assert scheduler.next_time() is None
+    h.incr(200, outbound=OK, at=10)
+    assert scheduler.next_time() == 60
+
+
+def test_scheduler_with_limit_gauges():
+    from gauge.scheduler import Scheduler
+    called = []
+    scheduler = Scheduler()
+    max_g = Gauge(10, 100, at=0)
+    g = Gauge(0, max_g, at=0)
+    g.add_momentum(+1)
+    scheduler.watch(g, 10, lambda *args: called.append(args), since=0)
+    assert scheduler.next_time() == 10
+    # a change of the limit gauge reschedules.
+    max_g.decr(5, at=2)
+    assert scheduler.next_time() is None
+    max_g.add_momentum(+0.5, since=2)
+    assert scheduler.next_time() == 12
+    # the new limit gauge is watched.
+    new_max_g = Gauge(20, 100, at=3)
+    g.set_max(new_max_g, at=3)
+    assert scheduler.next_time() == 10
+    new_max_g.set(5, at=4)
+    assert scheduler.next_time() is None
+    assert scheduler.run_pending(at=100) == 0
+    assert not called
+    # the watched gauges don't keep the scheduler.
+    scheduler_ref = weakref.ref(scheduler)
+    del scheduler
+    gc.collect()
+    assert scheduler_ref() is None
+    g.decr(1, at=5)
+
+
+def test_wait_until():
+    asyncio = pytest.importorskip('asyncio')
+    from gauge.scheduler import _schedulers
+    loop = asyncio.new_event_loop()
+    try:
+        now = time.time()
+        g = Gauge(0, 10, at=now)
+        g.add_momentum(+100)
+        future = g.wait_until(3, loop=loop)
+        assert loop.run_until_complete(future) == approx(now + 0.03)
+        assert time.time() >= now + 0.03
+        # a change reschedules the future.
+        now = time.time()
+        g = Gauge(0, 10, at=now)
+        g.add_momentum(+1)
+        future = g.wait_until(10, loop=loop)
+        loop.call_soon(lambda: g.add_momentum(+100, since=now))
+        assert loop.run_until_complete(future) == approx(now + 10 / 101.)
+        # a cancelled future is unwatched.
+        future = g.wait_until(100, loop=loop)
+        assert len(_schedulers[loop]) == 1
+        future.cancel()
+        loop.run_until_complete(asyncio.sleep(0))
+        assert len(_schedulers[loop]) == 0
+    finally:
+        loop.close()
+
+
 def test_since_gte_until():
     g = Gauge(0, 10, at=0)
     with pytest.raises(ValueError):
@@ -583,6 +1254,15 @@ def test_lines():
     assert seg.get(10) == 12.780503036230357
     assert seg.guess(100) == 12.780503036230357
     assert seg.guess(-100) == -50.05804016454045
+    # attributes
+    ray = Ray(10, 20, 5, velocity=-1)
+    assert (ray.since, ray.until, ray.value, ray.extra) == (10, 20, 5, -1)
+    assert ray.velocity() == -1
+    assert ray.intercept() == 15
+    ray.extra = +2
+    assert ray.velocity() == +2
+    assert ray.get(15) == 15
+    assert Segment(0, 10, 0, 5).velocity() == 0.5
 
 
 def test_boundary():
@@ -613,6 +1293,9 @@ def test_boundary():
     floor = Boundary([zero_line], operator.gt)
     assert ceil.best is min
     assert floor.best is max
+    assert floor.cmp is operator.gt
+    assert floor.cmp_eq(2, 1)
+    assert floor.cmp_inv(1, 2)
     # repr
     assert repr(ceil) == ('<Boundary line={0}, cmp=<built-in function lt>>'
                           ''.format(zero_line))
@@ -785,6 +1468,58 @@ def test_hypergauge_with_different_base_time():
     assert g.get(110) == 10
 
 
+def test_hypergauge_under_long_limit_gauges():
+    # limit gauges which have thousands of segments.
+    max_g = Gauge(10, 100, at=0)
+    min_g = Gauge(0, 10, -100, at=0)
+    for x in range(1000):
+        velocity = +1 if x % 2 else -1
+        max_g.add_momentum(velocity, since=x, until=x + 1)
+        min_g.add_momentum(-velocity, since=x, until=x + 1)
+    assert len(max_g.determination) == 1001
+    g = Gauge(5, max_g, min_g, at=0)
+    g.add_momentum(+10, since=0, until=100)
+    g.add_momentum(-10, since=500, until=600)
+    g.add_momentum(+0.1, since=700)
+    # follows the limit gauges only toward the range.
+    assert g.get(50) == 10
+    assert g.get(50.5) == 9.5
+    assert g.get(300) == 9
+    assert g.get(550) == 0
+    assert g.get(550.5) == 0.5
+    assert g.get(650) == 1
+    assert g.get(750) == approx(6)
+    assert g.get(2000) == 10
+    for t in range(0, 1100, 7):
+        assert min_g.get(t) <= g.get(t) <= max_g.get(t)
+    # redetermine from the middle.
+    g.add_momentum(+1, since=650, until=660)
+    assert g.get(660) == 10
+    assert g.determination == Determination(g)
+
+
+def test_gauges_sharing_limit_gauge():
+    max_g = Gauge(10, 100, at=0)
+    max_g.add_momentum(-1, since=0, until=5)
+    max_g.add_momentum(+1, since=10, until=15)
+    # different base times before, on and after the breakpoints.
+    gauges = [Gauge(0, max_g, at=t) for t in [-10, 0, 3, 5, 12, 20]]
+    for g in gauges:
+        g.add_momentum(+10)
+    for g in gauges:
+        for t in range(int(g.base[TIME]) + 1, 30):
+            assert g.get(t) == approx(max_g.get(t))
+    assert gauges[0].determination == \
+        [(-10, 0), (-9, 10), (0, 10), (5, 5), (10, 5), (15, 10)]
+    assert gauges[3].determination == [(5, 0), (5.5, 5), (10, 5), (15, 10)]
+    assert gauges[5].determination == [(20, 0), (21, 10)]
+    # change the limit gauge.
+    max_g.add_momentum(-1, since=20, until=25)
+    for g in gauges:
+        assert g.get(30) == 5
+        assert g.determination == Determination(g)
+
+
 def test_limited_gauges():
     max_g = Gauge(10, 100, at=0)
     g = Gauge(0, max_g, at=0)
@@ -858,6 +1593,23 @@ def test_clear_momentum_events():
     # assert len(g._events) == 0
 
 
+def test_momentum_events_after_rebase():
+    g = Gauge(0, 10, at=0)
+    m1 = g.add_momentum(+1, since=0, until=5)
+    m2 = g.add_momentum(+1, since=3, until=8)
+    events = g.momentum_events()
+    assert events == [(0, NONE, None), (0, ADD, m1), (3, ADD, m2),
+                      (5, REMOVE, m1), (8, REMOVE, m2), (+inf, NONE, None)]
+    # the events of the forgotten momenta are removed at once.
+    g.forget_past(at=6)
+    assert g.momentum_events() == [
+        (6, NONE, None), (3, ADD, m2), (8, REMOVE, m2), (+inf, NONE, None)]
+    # the shared events are not modified.
+    assert len(events) == 6
+    g.clear_momenta(at=7)
+    assert g.momentum_events() == [(7, NONE, None), (+inf, NONE, None)]
+
+
 def test_decr_max_normal():
     g = Gauge(0, 10, at=0)
     g.add_momentum(+2)
@@ -1141,6 +1893,19 @@ def test_set_range():
     assert g.determination == [(30, 30), (40, 40)]
 
 
+def test_set_range_failed():
+    g = Gauge(0, Gauge(5, 5, at=0), at=0)
+    g.incr(1, at=1)
+    g.add_momentum(+1, since=1)
+    assert g.get(100) == 5
+    # the new max gauge is based earlier than the gauge.
+    with pytest.raises(ValueError):
+        g.set_max(Gauge(8, 8, at=0), at=2)
+    # the determination of the previous max gauge is not reused.
+    g.add_momentum(+1, since=3)
+    assert g.get(100) == 8
+
+
 def test_in_range():
     g = Gauge(20, 10, at=0)
     assert not g.in_range(0)
@@ -1278,6 +2043,503 @@ def test_intersection_of_vertical_segment_reversed():
 def test_invalidate_returns():
     g = Gauge(0, 100, at=0)
     assert not g.invalidate()
-    g.get(0)
+    g.determination
     assert g.invalidate()
     assert not g.invalidate()
+
+
+def test_versioned_determination():
+    max_ = Gauge(10, 100, at=0)
+    g = Gauge(5, max_, at=0)
+    g.add_momentum(+1)
+    h = Gauge(0, g, at=0)
+    h.add_momentum(+1)
+    determination = g.determination
+    h.determination
+    max_.add_momentum(-1, since=5)
+    # the limited gauges are not invalidated by the change.
+    assert g._determination is determination
+    # but they are redetermined when they are observed.
+    assert h.get(10) == 5
+    assert g._determination is not determination
+    assert g.determination == [(0, 5), (5, 10), (15, 0)]
+    # the cached determinations are reused while nothing is changed.
+    determination = g.determination
+    assert h.get(20) == 0
+    assert g.determination is determination
+
+
+def test_incremental_redetermination():
+    g = Gauge(0, 100, at=0)
+    for x in range(10):
+        g.add_momentum(+1, since=x * 10, until=x * 10 + 5)
+    determination = g.determination
+    assert len(determination) == 20
+    assert determination[-1] == (95, 50)
+    g.add_momentum(+2, since=72, until=74)
+    redetermined = g.determination
+    assert redetermined == Determination(g)
+    assert g.get(74) == 43
+    # the prefix before the new momentum is reused.
+    x = list(determination).index((70, 35))
+    assert redetermined[:x] == determination[:x]
+    # the previous determination is not changed.
+    assert len(determination) == 20
+    g.remove_momentum(+2, since=72, until=74)
+    assert g.determination == determination
+    assert g.get(74) == 39
+
+
+def test_incremental_redetermination_randomly():
+    r = Random(1234)
+    for y in range(30):
+        g = random_gauge1(r) if y % 2 else Gauge(r.uniform(-5, 15), 10, at=0)
+        momenta = []
+        for x in range(20):
+            g.determination
+            if momenta and r.random() < 0.3:
+                g.remove_momentum(momenta.pop(r.randrange(len(momenta))))
+            else:
+                since = r.uniform(-5, 30)
+                until = since + r.uniform(0.1, 10)
+                momenta.append(g.add_momentum(r.uniform(-3, 3), since, until))
+            determination = Determination(g)
+            assert g.determination == determination
+            assert \
+                g.determination.in_range_since == determination.in_range_since
+
+
+def test_determination_sequence():
+    g = Gauge(0, 10, at=0)
+    g.add_momentum(+1, since=0, until=5)
+    g.add_momentum(-1, since=5, until=10)
+    d = g.determination
+    assert len(d) == 3
+    assert d[0] == (0, 0)
+    assert d[-1] == (10, 0)
+    assert d[1:] == [(5, 5), (10, 0)]
+    assert list(d) == [(0, 0), (5, 5), (10, 0)]
+    assert d == [(0, 0), (5, 5), (10, 0)]
+    assert d != [(0, 0), (5, 5)]
+    assert d == Determination(g)
+    with pytest.raises(IndexError):
+        d[3]
+    with pytest.raises(IndexError):
+        d[-4]
+    d = Determination.__new__(Determination)
+    assert not d
+    d.extend([(0, 1), (1, 2)])
+    d.append((2, 3))
+    assert d == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_get_many():
+    numpy = pytest.importorskip('numpy')
+    g = Gauge(0, 10, at=0)
+    g.add_momentum(+1, since=2)
+    g.add_momentum(+1, since=4, until=6)
+    times = [9, 0, 2, 3, 4, 5, 6, 7, -1, 8, 10, 100]
+    assert g.get_many(times).tolist() == [g.get(t) for t in times]
+    assert g.velocity_many(times).tolist() == [g.velocity(t) for t in times]
+    assert isinstance(g.get_many(numpy.array(times)), numpy.ndarray)
+    # static gauge
+    g = Gauge(3, 10, at=0)
+    assert g.get_many([-1, 0, 1]).tolist() == [3, 3, 3]
+    assert g.velocity_many([-1, 0, 1]).tolist() == [0, 0, 0]
+
+
+def test_get_many_randomly():
+    numpy = pytest.importorskip('numpy')
+    r = Random(4321)
+    for x in range(30):
+        g = random_gauge1(r) if x % 2 else random_gauge2(r)
+        times = [r.uniform(-5, 25) for y in range(100)]
+        times.extend(t for t, v in g.determination)
+        values = g.get_many(numpy.array(times))
+        velocities = g.velocity_many(numpy.array(times))
+        assert values.tolist() == [g.get(t) for t in times]
+        assert velocities.tolist() == [g.velocity(t) for t in times]
+
+
+def test_lazy_determination():
+    g = Gauge(0, 100, at=0)
+    for x in range(100):
+        g.add_momentum(+1, since=x * 10, until=x * 10 + 5)
+    assert g.get(12) == 7
+    assert not g.determination.complete
+    assert g.velocity(13) == 1
+    assert g.in_range(14)
+    assert not g.determination.complete
+    assert g.when(10) == 15
+    assert not g.determination.complete
+    # a momentum after the resolved part doesn't require to walk again.
+    g.add_momentum(-1, since=500, until=510)
+    assert g.get(12) == 7
+    assert not g.determination.complete
+    assert g.goal() == 100
+    assert g.determination.complete
+    assert g.determination == Determination(g)
+    # public sequence operations resolve all.
+    g.add_momentum(-1, since=600, until=610)
+    assert g.get(0) == 0
+    assert not g.determination.complete
+    assert len(g.determination) == len(Determination(g))
+    assert g.determination.complete
+
+
+def test_gauge_array():
+    pytest.importorskip('numpy')
+    from gauge.array import GaugeArray
+    a = GaugeArray([0, 5, 12], max=10, at=0)
+    a.add_momentum(+1, since=0, until=20, rows=[0, 2])
+    a.add_momentum(-1, since=5, rows=[1, 2])
+    assert a.get(3).tolist() == [3, 5, 12]
+    assert a.get(8).tolist() == [8, 2, 10]
+    assert a.get(30).tolist() == [10, 0, 0]
+    assert a.velocity(8).tolist() == [1, -1, 0]
+    assert a.in_range(4).tolist() == [True, True, False]
+    assert a.in_range(7).tolist() == [True, True, True]
+    with pytest.raises(ValueError):
+        a.incr(5, at=8)
+    assert a.get(8).tolist() == [8, 2, 10]
+    assert a.incr(5, outbound=CLAMP, at=8).tolist() == [10, 7, 10]
+    assert a.decr(3, at=10, rows=[True, False, False]).tolist() == [7]
+    assert a.get(10).tolist() == [7, 5, 10]
+    with pytest.raises(ValueError):
+        a.add_momentum(+1, since=10, until=10)
+    with pytest.raises(TypeError):
+        GaugeArray.from_gauges([Gauge(0, Gauge(10, 10))])
+
+
+def test_gauge_array_randomly():
+    pytest.importorskip('numpy')
+    from gauge.array import GaugeArray
+    r = Random(42)
+    gauges = []
+    for x in range(30):
+        g = Gauge(r.uniform(-20, 120), 100, r.choice([0, -50]), at=0)
+        for y in range(r.randrange(5)):
+            since = r.randrange(100)
+            until = r.choice([since + 1 + r.randrange(100), inf])
+            g.add_momentum(r.uniform(-3, 3), since=since, until=until)
+        gauges.append(g)
+    a = GaugeArray.from_gauges(gauges)
+    for at in [0, 10, 50, 100, 250]:
+        assert a.get(at).tolist() == \
+            approx([g.get(at) for g in gauges])
+        assert a.velocity(at).tolist() == \
+            approx([g.velocity(at) for g in gauges])
+        assert a.in_range(at).tolist() == [g.in_range(at) for g in gauges]
+    # modifications keep the rows same with the gauges.
+    a.incr(10, outbound=CLAMP, at=20)
+    for g in gauges:
+        g.incr(10, outbound=CLAMP, at=20)
+    a.add_momentum(-1, since=30, until=60)
+    for g in gauges:
+        g.add_momentum(-1, since=30, until=60)
+    for at in [20, 45, 80]:
+        assert a.get(at).tolist() == \
+            approx([g.get(at) for g in gauges])
+    for x, g in enumerate(gauges):
+        assert a.gauge(x).get(45) == approx(g.get(45))
+
+
+def test_reader():
+    g = Gauge(0, 10, at=0)
+    g.add_momentum(+1, since=0, until=5)
+    g.add_momentum(-1, since=8)
+    reader = g.reader()
+    assert reader.gauge is g
+    assert [reader.get(t) for t in range(0, 20, 2)] == \
+        [0, 2, 4, 5, 5, 3, 1, 0, 0, 0]
+    assert reader.velocity(9) == -1
+    # the time went back.
+    assert reader.get(3) == 3
+    assert reader.velocity(3) == 1
+    # the determination has been changed.
+    g.add_momentum(+2, since=10, until=12)
+    assert reader.get(11) == 4
+    g.incr(5, at=11)
+    assert reader.get(11) == 9
+    assert reader.get(13) == 9
+
+
+def test_reader_randomly():
+    r = Random(42)
+    for x in range(20):
+        g = Gauge(r.uniform(0, 10), Gauge(10, 20, at=0), at=0)
+        reader = g.reader()
+        t = 0
+        for y in range(100):
+            if r.random() < 0.1:
+                since = t + r.uniform(-10, 10)
+                g.add_momentum(r.uniform(-2, 2), since=since,
+                               until=since + r.uniform(1, 20))
+            if r.random() < 0.02:
+                g.max_gauge.incr(1, outbound=OK, at=t)
+            t += r.choice([0, r.uniform(0, 3)])
+            assert reader.get(t) == g.get(t)
+            assert reader.velocity(t) == g.velocity(t)
+
+
+def test_linear_gauge():
+    g = Gauge(5, 10, at=0)
+    g.add_momentum(+1)
+    assert g.get(3) == 8
+    assert g.velocity(3) == 1
+    assert g.get(100) == 10
+    assert g.velocity(100) == 0
+    assert g.when(7) == 2
+    assert g.goal() == 10
+    assert g.in_range(0)
+    assert not g.in_range(-1)
+    # no determination has been allocated.
+    assert g._determination is None
+    # limit gauges or more momenta require a determination.
+    g.add_momentum(-1, since=3, until=4)
+    assert g.get(3) == 8
+    assert g._determination is not None
+
+
+def test_linear_gauge_randomly():
+    r = Random(42)
+    for x in range(1000):
+        base = r.choice([0, r.uniform(-1e9, 1e9)])
+        max_ = r.choice([10, r.uniform(0, 100)])
+        min_ = r.choice([0, r.uniform(-100, max_)])
+        g = Gauge(r.uniform(min_, max_), max_, min_, at=base)
+        if r.random() < 0.9:
+            g.add_momentum(r.choice([-1, +1, r.uniform(-10, 10)]),
+                           since=r.choice([None, base - 1, base]))
+        g2 = Gauge(g.base[VALUE], max_, min_, at=base)
+        g2.add_momenta(g.momenta)
+        g2.determination
+        for t in [base - 1, base, base + 0.5, base + 5, base + 1e3]:
+            assert g.get(t) == g2.get(t)
+            assert g.velocity(t) == g2.velocity(t)
+            assert g.in_range(t) == g2.in_range(t)
+        assert g.goal() == g2.goal()
+        value = r.uniform(min_, max_)
+        assert list(g.whenever(value)) == list(g2.whenever(value))
+        assert g._determination is None
+
+
+def random_hyper_gauges(random=random, lazy=False):
+    # the first gauge limits the others directly or indirectly.
+    max_ = Gauge(random.uniform(5, 15), 20, at=0)
+    max_.lazy_rebase = lazy
+    gauges = [max_]
+    for x in range(random.randrange(1, 8)):
+        limit = random.choice(gauges)
+        if random.random() < 0.7:
+            gauges.append(Gauge(random.uniform(0, 15), limit, at=0))
+        else:
+            gauges.append(Gauge(random.uniform(0, 15), 30, limit, at=0))
+        limit.lazy_rebase = lazy
+    for g in gauges:
+        for x in range(random.randrange(3)):
+            since = random.uniform(0, 50)
+            g.add_momentum(random.uniform(-2, 2), since=since,
+                           until=since + random.uniform(1, 30))
+        if random.random() < 0.5:
+            g.get(5)
+    return gauges
+
+
+def mutate_hyper_gauges(random, gauges):
+    at = 10
+    for x in range(random.randrange(1, 10)):
+        index = random.randrange(len(gauges))
+        g = gauges[index]
+        at += random.choice([0, 0, 1, 2.5])
+        method = random.choice(['incr', 'clamp', 'add_momentum', 'get',
+                                'forget_past', 'set_max', 'set_range'])
+        delta = random.uniform(-5, 5)
+        # a limit gauge should be an earlier one not to make a cycle.  Both
+        # limits of a gauge are not hyper-gauges because the order of the
+        # rebases by the two limit gauges would matter then.
+        limit = random.choice(gauges[:index] or [None])
+        if limit is None or method == 'set_max' and g.min_gauge is not None:
+            limit = 20.
+        if method == 'incr':
+            g.incr(delta, outbound=OK, at=at)
+        elif method == 'clamp':
+            g.incr(delta, outbound=CLAMP, at=at)
+        elif method == 'add_momentum':
+            g.add_momentum(delta, since=at - 3, until=at + 5)
+        elif method == 'get':
+            g.get(at + 1)
+        elif method == 'forget_past':
+            g.forget_past(at=at)
+        elif method in ['set_max', 'set_range']:
+            args = [limit] if method == 'set_max' else \
+                   [limit, random.uniform(-5, 0)]
+            try:
+                getattr(g, method)(*args, at=at)
+            except ValueError:
+                # the limit gauge has been rebased before the base time.
+                pass
+
+
+def test_batch():
+    max_ = Gauge(10, 100, at=0)
+    g = Gauge(8, max_, at=0)
+    g.add_momentum(+1)
+    assert g.get(1) == 9
+    with gauge.batch():
+        max_.decr(2, at=1)
+        max_.decr(2, at=1)
+        # observing a hyper-gauge in the batch applies the deferred work.
+        assert g.get(1) == 6
+        max_.incr(1, at=1)
+        max_.add_momentum(+1, since=1, until=3)
+        with gauge.batch():
+            max_.incr(1, at=1)
+    assert g.base == (1, 6)
+    assert g.get(2) == 7
+    assert g.get(5) == 10
+    # the deferred rebase is applied at the end of the batch.
+    with gauge.batch():
+        max_.set(5, at=5)
+        max_.set(4, at=5)
+        assert g.base == (5, 4)
+    assert g.get(5) == 4
+    # a merged rebase sees the range at the base as a determination does.
+    max_ = Gauge(15, 20, at=0)
+    g1 = Gauge(4, max_, at=0)
+    g2 = Gauge(12, max_, at=0)
+    g2.add_momentum(-1, since=14, until=24)
+    g3 = Gauge(6, g2, at=0)
+    with gauge.batch():
+        max_.set_max(20, at=10)
+        g2.set_max(g1, at=15)
+    assert g3.base == (10, 4)
+
+
+def test_batch_at_different_times():
+    def build():
+        max_ = Gauge(10, 100, at=0)
+        g = Gauge(5, max_, at=0)
+        g.add_momentum(+1, since=0, until=8)
+        g.add_momentum(-1, since=2, until=3)
+        return max_, g
+    max_, g = build()
+    max_.decr(4, at=1)
+    max_.incr(3, at=2.5)
+    max_.decr(2, at=4)
+    batched_max, batched_g = build()
+    changes = batched_g.changes
+    with gauge.batch():
+        batched_max.decr(4, at=1)
+        batched_max.incr(3, at=2.5)
+        batched_max.decr(2, at=4)
+    # the rebases at different times are applied at once.
+    assert batched_g.changes == changes + 1
+    assert batched_g.base == approx(g.base)
+    for at in [4, 5, 7, 10, 20]:
+        assert batched_g.get(at) == approx(g.get(at))
+
+
+def test_batch_in_thread():
+    max_ = Gauge(10, 100, at=0)
+    g = Gauge(8, max_, at=0)
+    with gauge.batch():
+        # the batch is not active in another thread.
+        thread = threading.Thread(target=max_.set, args=(5,), kwargs={'at': 1})
+        thread.start()
+        thread.join()
+        assert g.base == (1, 5)
+        max_.set(4, at=2)
+    assert g.base == (2, 4)
+
+
+def test_batch_randomly():
+    for seed in range(200):
+        gauges = random_hyper_gauges(Random(seed))
+        mutate_hyper_gauges(Random(-seed), gauges)
+        batched_gauges = random_hyper_gauges(Random(seed))
+        with gauge.batch():
+            mutate_hyper_gauges(Random(-seed), batched_gauges)
+        for g, batched_g in zip(gauges, batched_gauges):
+            for at in [10, 11, 13, 20, 40, 100]:
+                assert batched_g.get(at) == approx(g.get(at))
+
+
+def test_lazy_rebase():
+    max_ = Gauge(10, 100, at=0)
+    max_.lazy_rebase = True
+    g = Gauge(8, max_, at=0)
+    g.add_momentum(+1)
+    assert g.get(1) == 9
+    max_.set(5, at=1)
+    max_.set(20, at=2)
+    # the rebases are applied in order at the next access.
+    assert g.base == (2, 5)
+    assert g.get(3) == 6
+    # a gauge which limits others rebases right away.
+    h = Gauge(0, g, at=0)
+    max_.set(1, at=3)
+    assert g.base == (3, 1)
+    assert h.get(3) == 0
+    # a later change of the limit gauges of the limit gauge doesn't affect
+    # the logged rebases.
+    g0 = Gauge(12.7, 20, at=0)
+    g1 = Gauge(7.6, 30, g0, at=0)
+    g1.add_momentum(+1.9, since=10.7, until=28.7)
+    g2 = Gauge(7.8, 30, g1, at=0)
+    g2.add_momentum(-1.8, since=1.8, until=31)
+    g2.lazy_rebase = True
+    g3 = Gauge(11.5, 30, g2, at=0)
+    g3.forget_past(at=13)
+    g1.set_range(g0, 0, at=13)
+    assert g3.base == (13, approx(11.97))
+
+
+def test_lazy_rebase_log():
+    def build(lazy):
+        max_ = Gauge(10, 100, at=0)
+        max_.lazy_rebase = lazy
+        gauges = [Gauge(x, max_, at=0) for x in range(3)]
+        for g in gauges:
+            g.add_momentum(+1)
+        return max_, gauges
+    max_, gauges = build(False)
+    lazy_max, lazy_gauges = build(True)
+    for at in range(300):
+        for m, gs in [(max_, gauges), (lazy_max, lazy_gauges)]:
+            m.set(10 + at % 7, at=at)
+            # the first gauge is read often but the last one is idle.
+            if at % 3 == 0:
+                gs[0].get(at)
+            if at == 150:
+                # stops following the log.
+                gs[1].set_max(12, at=at)
+    for g, lazy_g in zip(gauges, lazy_gauges):
+        assert lazy_g.base == approx(g.base)
+        assert lazy_g.get(400) == approx(g.get(400))
+
+
+def test_lazy_rebase_without_replay():
+    max_ = Gauge(10, 100, at=0)
+    max_.lazy_rebase = True
+    g = Gauge(5, max_, at=0)
+    g.add_momentum(+1, since=0, until=1)
+    for at in range(1, 1000):
+        max_.set(10 + at % 7, at=at)
+    # the idle gauge hasn't applied the rebases even if the log has grown.
+    assert len(g.momenta) == 1
+    assert g.base == (999, 6)
+    assert len(g.momenta) == 0
+    max_.set(5, at=1000)
+    assert g.get(1000) == 5
+
+
+def test_lazy_rebase_randomly():
+    for seed in range(300):
+        gauges = random_hyper_gauges(Random(seed))
+        mutate_hyper_gauges(Random(-seed), gauges)
+        lazy_gauges = random_hyper_gauges(Random(seed), lazy=True)
+        mutate_hyper_gauges(Random(-seed), lazy_gauges)
+        for g, lazy_g in zip(gauges, lazy_gauges):
+            for at in [20, 21, 30, 50, 100]:
+                assert lazy_g.get(at) == approx(g.get(at))
@@ -11,7 +11,7 @@ class StaticGauge(Gauge):
     @property
     def determination(self):
         d = Determination.__new__(Determination)
-        list.__init__(d, [self.base])
+        d.append(self.base)
         return d
 
     def add_momentum(self, *args, **kwargs):
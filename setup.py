@@ -90,6 +90,7 @@ setup(
                  'Programming Language :: Python :: Implementation :: PyPy',
                  'Topic :: Games/Entertainment'],
     install_requires=install_requires,
+    extras_require={'numpy': ['numpy']},
     tests_require=['pytest'],
     test_suite='...',
     cmdclass={'build_ext': build_ext, 'benchmark': Benchmark},